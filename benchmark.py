@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""
+Benchmark del daemon con bibliotecas de medios sintéticas.
+
+Genera árboles VIDEO_DIR de N archivos MP4 sintéticos (estructura válida, contenido
+disperso para los tamaños grandes), mide cada etapa del refresco por separado y como
+un ciclo completo, y escribe los resultados en JSON para comparar entre versiones:
+
+    python benchmark.py --archivos 10,100,1000 --tamanos 64K,10M --salida bench.json
+    python benchmark.py --archivos 10 --tamanos 4G --sin-copia
+    python benchmark.py --comparar bench_anterior.json --salida bench.json
+
+El estímulo externo de OneDrive (PowerShell) no se ejecuta: se mide solo el código del daemon.
+Con --sin-copia no se miden copiar_archivos ni el ciclo completo (útil para tamaños de varios GB,
+cuya copia al staging ocuparía espacio real en disco).
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import struct
+import argparse
+import platform
+import statistics
+import subprocess
+import tempfile
+
+# config.py construye sus rutas con TEMP; fuera de Windows puede no existir
+os.environ.setdefault("TEMP", tempfile.gettempdir())
+
+from config import Config
+import sync_utils
+from file_utils import validar_dir, calcular_hash, copiar_archivos, generar_playlist
+from sync_utils import estimular_onedrive
+from vlc_utils import validar_playlist
+
+VERSION_RESULTADOS = 1
+
+# Porcentaje de aumento de la mediana a partir del cual --comparar marca una regresión
+UMBRAL_REGRESION = 10.0
+# Diferencias absolutas menores a esto (segundos) se consideran ruido de medición
+RUIDO_MINIMO = 0.001
+
+_UNIDADES = {'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+
+# ============================================================================
+# GENERACIÓN DE BIBLIOTECAS SINTÉTICAS
+# ============================================================================
+
+def _leer_tamano(texto):
+    """'64K', '10M', '4G' o bytes -> bytes"""
+    texto = texto.strip().upper()
+    if texto[-1:] in _UNIDADES:
+        return int(float(texto[:-1]) * _UNIDADES[texto[-1]])
+    return int(texto)
+
+def _caja(tipo, contenido=b''):
+    return struct.pack('>I4s', 8 + len(contenido), tipo) + contenido
+
+def escribir_mp4_sintetico(path, size):
+    """
+    Escribe un MP4 con cajas ftyp, moov y mdat que ocupa exactamente size bytes.
+    El mdat se extiende con truncate(): en sistemas de archivos con soporte queda disperso
+    y un archivo de varios GB se crea al instante sin ocupar disco.
+    """
+    cabecera = _caja(b'ftyp', b'isom' + struct.pack('>I', 512) + b'isomiso2mp41')
+    cabecera += _caja(b'moov', _caja(b'mvhd', bytes(100)))
+    # mdat con tamaño de 64 bits para que sirva igual con archivos de más de 4 GB
+    mdat = size - len(cabecera)
+    if mdat < 16:
+        raise ValueError(f"Tamaño mínimo del MP4 sintético: {len(cabecera) + 16} bytes")
+    with open(path, "wb") as f:
+        f.write(cabecera)
+        f.write(struct.pack('>I4sQ', 1, b'mdat', mdat))
+        # Bloques de datos reales al inicio y al final del mdat: verificar_archivo()
+        # deja pendiente un final en ceros hasta confirmar que el archivo ya no cambia
+        f.write(os.urandom(min(mdat - 16, 4096)))
+        f.truncate(size)
+        cola = min(mdat - 16, Config.SYNC_CONFIG['FILE_CHECK_BLOCK_SIZE'])
+        f.seek(size - cola)
+        f.write(os.urandom(cola))
+
+def generar_biblioteca(video_dir, archivos, size):
+    os.makedirs(video_dir, exist_ok=True)
+    nombres = []
+    for i in range(archivos):
+        nombre = f"video_{i:05d}.mp4"
+        escribir_mp4_sintetico(os.path.join(video_dir, nombre), size)
+        nombres.append(nombre)
+    return nombres
+
+# ============================================================================
+# MEDICIÓN
+# ============================================================================
+
+def _medir(funcion, *args):
+    inicio = time.perf_counter()
+    funcion(*args)
+    return time.perf_counter() - inicio
+
+def _ciclo_completo(video_dir, staging_dir, playlist_path):
+    """Un refresco completo en el orden del daemon, con las mismas funciones medidas por separado"""
+    files = validar_dir(video_dir)
+    calcular_hash(files, video_dir)
+    estimular_onedrive(files, video_dir)
+    copiar_archivos(files, video_dir, staging_dir)
+    generar_playlist(files, staging_dir, playlist_path)
+    validar_playlist(playlist_path)
+
+def _vaciar(directorio):
+    shutil.rmtree(directorio, ignore_errors=True)
+    os.makedirs(directorio, exist_ok=True)
+
+def medir_biblioteca(base_dir, archivos, size, repeticiones, copiar=True):
+    """
+    Genera una biblioteca y mide cada etapa `repeticiones` veces.
+    La primera repetición es en frío (sin cachés de validación/huellas del proceso).
+    Returns:
+        dict: nombre de etapa -> lista de segundos
+    """
+    video_dir = os.path.join(base_dir, "videos")
+    staging_dir = os.path.join(base_dir, "staging")
+    playlist_path = os.path.join(base_dir, "playlist.m3u")
+    files = generar_biblioteca(video_dir, archivos, size)
+    # La playlist de validar_playlist debe apuntar a archivos existentes
+    generar_playlist(files, video_dir, playlist_path)
+
+    tiempos = {}
+    def registrar(etapa, segundos):
+        tiempos.setdefault(etapa, []).append(segundos)
+
+    for _ in range(repeticiones):
+        registrar('validar_dir', _medir(validar_dir, video_dir))
+        registrar('calcular_hash', _medir(calcular_hash, files, video_dir))
+        registrar('estimular_onedrive', _medir(estimular_onedrive, files, video_dir))
+        if copiar:
+            _vaciar(staging_dir)
+            registrar('copiar_archivos', _medir(copiar_archivos, files, video_dir, staging_dir))
+        registrar('generar_playlist', _medir(generar_playlist, files, video_dir, playlist_path))
+        registrar('validar_playlist', _medir(validar_playlist, playlist_path))
+        if copiar:
+            _vaciar(staging_dir)
+            registrar('ciclo_completo', _medir(_ciclo_completo, video_dir, staging_dir, playlist_path))
+
+    shutil.rmtree(video_dir, ignore_errors=True)
+    shutil.rmtree(staging_dir, ignore_errors=True)
+    return tiempos
+
+# ============================================================================
+# RESULTADOS
+# ============================================================================
+
+def _version_repo():
+    try:
+        salida = subprocess.run(["git", "describe", "--always", "--dirty"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5)
+        return salida.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+def _resumen(archivos, size, etapa, muestras):
+    return {
+        'etapa': etapa,
+        'archivos': archivos,
+        'tamano_bytes': size,
+        'muestras': muestras,
+        'mediana': statistics.median(muestras),
+        'minimo': min(muestras),
+        'maximo': max(muestras),
+        'por_archivo_ms': statistics.median(muestras) / archivos * 1000
+    }
+
+def comparar(anterior, actual, umbral=UMBRAL_REGRESION):
+    """
+    Compara las medianas de dos resultados (misma etapa, archivos y tamaño).
+    Returns:
+        list: (clave, mediana anterior, mediana actual, % de cambio, es regresión)
+    """
+    def indexar(datos):
+        return {(r['etapa'], r['archivos'], r['tamano_bytes']): r['mediana'] for r in datos['resultados']}
+    previos, nuevos = indexar(anterior), indexar(actual)
+    filas = []
+    for clave in sorted(set(previos) & set(nuevos)):
+        cambio = ((nuevos[clave] - previos[clave]) / previos[clave] * 100) if previos[clave] > 0 else 0.0
+        regresion = cambio > umbral and nuevos[clave] - previos[clave] > RUIDO_MINIMO
+        filas.append((clave, previos[clave], nuevos[clave], cambio, regresion))
+    return filas
+
+def _lista(texto, conversion):
+    return [conversion(v) for v in texto.split(',') if v.strip()]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark de MediaSync-Daemon con bibliotecas sintéticas")
+    parser.add_argument('--archivos', default='10,100,1000,10000',
+                        help="Cantidades de archivos, separadas por comas (default: %(default)s)")
+    parser.add_argument('--tamanos', default='64K,10M',
+                        help="Tamaños por archivo: bytes o con sufijo K/M/G (default: %(default)s)")
+    parser.add_argument('--repeticiones', type=int, default=3)
+    parser.add_argument('--dir', default=None, help="Directorio de trabajo (default: uno temporal)")
+    parser.add_argument('--salida', default='benchmark_resultados.json')
+    parser.add_argument('--comparar', default=None, help="Resultados anteriores para detectar regresiones")
+    parser.add_argument('--umbral', type=float, default=UMBRAL_REGRESION,
+                        help="Aumento de la mediana (%%) que cuenta como regresión (default: %(default)s)")
+    parser.add_argument('--sin-copia', action='store_true',
+                        help="No medir copiar_archivos ni el ciclo completo")
+    args = parser.parse_args(argv)
+
+    # Solo se mide el daemon: el estímulo externo de OneDrive se sustituye por una operación vacía
+    sync_utils.forzar_sync_powershell = lambda: None
+
+    base_dir = args.dir or tempfile.mkdtemp(prefix="mediasync_bench_")
+    resultados = []
+    try:
+        for size in _lista(args.tamanos, _leer_tamano):
+            for archivos in _lista(args.archivos, int):
+                tiempos = medir_biblioteca(base_dir, archivos, size, args.repeticiones, copiar=not args.sin_copia)
+                for etapa, muestras in tiempos.items():
+                    fila = _resumen(archivos, size, etapa, muestras)
+                    resultados.append(fila)
+                    print(f"{etapa:<20} {archivos:>6} archivos x {size:>12} B: "
+                          f"mediana {fila['mediana']:.4f} s ({fila['por_archivo_ms']:.3f} ms/archivo)")
+    finally:
+        if args.dir is None:
+            shutil.rmtree(base_dir, ignore_errors=True)
+
+    datos = {
+        'version_resultados': VERSION_RESULTADOS,
+        'version_repo': _version_repo(),
+        'fecha': time.strftime("%Y-%m-%dT%H:%M:%S"),
+        'python': platform.python_version(),
+        'plataforma': platform.platform(),
+        'repeticiones': args.repeticiones,
+        'resultados': resultados
+    }
+    with open(args.salida, "w", encoding="utf-8") as f:
+        json.dump(datos, f, indent=2)
+    print(f"Resultados escritos en {args.salida}")
+
+    if args.comparar:
+        with open(args.comparar, "r", encoding="utf-8") as f:
+            anterior = json.load(f)
+        regresiones = 0
+        for (etapa, archivos, size), previa, actual, cambio, regresion in comparar(anterior, datos, args.umbral):
+            regresiones += regresion
+            marca = "  REGRESIÓN" if regresion else ""
+            print(f"{etapa:<20} {archivos:>6} x {size:>12} B: {previa:.4f} s -> {actual:.4f} s "
+                  f"({cambio:+.1f}%){marca}")
+        return 1 if regresiones else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,5 +1,6 @@
 import os
-# to-do: previsto, mover el config.py al mismo directorio de sharepoint para facilitar la configuración remota
+# Los valores de este archivo son los de fábrica: PATHS['CONFIG_FILE'] (en la carpeta de SharePoint) puede
+# sobrescribir cualquier clave y se recarga sin reiniciar el daemon ni VLC (ver config_utils.py)
 
 class Config:
     
@@ -13,8 +14,21 @@ class Config:
         # Se pueden agregar más extensiones según sea necesario
         # Ejemplo: ['.mp4', '.mkv', '.avi']
         'FORMATOS_DE_VIDEO_ADMITIDOS': ['.mp4'],
+        # Incluir videos de subcarpetas de VIDEO_DIR (las carpetas ocultas, que empiezan con '.', se omiten)
+        # La playlist se ordena por carpeta y nombre; el staging replica las subcarpetas.
+        'RECURSIVE_SCAN': False,
         # Tamaño máximo de archivo permitido en MB (0 = sin límite)
-        'MAX_FILE_SIZE_MB': 0
+        # Un video más grande queda fuera de la playlist (con un aviso en el log) y no ocupa el almacén
+        'MAX_FILE_SIZE_MB': 0,
+        # Validar la estructura de los MP4 (cajas ftyp/moov y tamaños) antes de incluirlos en la playlist
+        # Excluye descargas parciales o truncadas hasta que estén completas; solo lee encabezados.
+        'MP4_STRUCTURE_CHECK': True,
+        # Faststart: los MP4 nuevos con el índice (caja moov) al final se reescriben con el índice al inicio
+        # Sin él, VLC lee hasta el final del archivo antes del primer cuadro y se nota una pausa entre videos.
+        # Se hace una sola vez por contenido, al entrar al almacén; el archivo de OneDrive no se modifica.
+        'MP4_FASTSTART': False,
+        # Procesos que reescriben en paralelo (se aplica al reiniciar el daemon)
+        'MP4_FASTSTART_WORKERS': 2
     }
 
     VLC_CONFIG = {
@@ -31,32 +45,142 @@ class Config:
         # Tiempo máximo de espera para matar proceso VLC (segundos)
         # Si VLC no se cierra en este tiempo, se forzará su cierre.
         # Nota: Este valor debe ser mayor que el tiempo de espera en _esperar_cierre_vlc (1 segundos por defecto)
-        'VLC_KILL_TIMEOUT': 3
+        'VLC_KILL_TIMEOUT': 3,
+        # Tiempo máximo de espera para confirmar que VLC inició (segundos)
+        # Con la interfaz HTTP habilitada la espera termina en cuanto VLC responde.
+        'VLC_START_TIMEOUT': 5,
+        # Interfaz HTTP de control de VLC: permite actualizar la playlist sin detener la reproducción
+        'VLC_HTTP_ENABLED': True,
+        # Solo escuchar en la máquina local
+        'VLC_HTTP_HOST': '127.0.0.1',
+        'VLC_HTTP_PORT': 8080,
+        # VLC exige contraseña para la interfaz HTTP (el usuario va vacío)
+        'VLC_HTTP_PASSWORD': 'mediasync',
+        # Tiempo máximo de espera por respuesta de la interfaz HTTP (segundos)
+        'VLC_HTTP_TIMEOUT': 2,
+        # Reinicio de VLC tras un cierre inesperado: el primero es inmediato, los siguientes
+        # esperan desde VLC_RESTART_BACKOFF_MIN duplicando hasta VLC_RESTART_BACKOFF_MAX (segundos)
+        'VLC_RESTART_BACKOFF_MIN': 2,
+        'VLC_RESTART_BACKOFF_MAX': 60,
+        # Si VLC se mantiene en ejecución este tiempo (segundos), el backoff vuelve a cero
+        'VLC_RESTART_STABLE': 30,
+        # Cada cuánto la sonda de reproducción consulta estado y posición por la interfaz HTTP (segundos, 0 = sin sonda)
+        'VLC_HEALTH_INTERVAL': 2,
+        # Segundos sin que la posición avance para considerar la reproducción detenida (imagen congelada,
+        # diálogo de error, cola vacía). Primero se salta el elemento o se reanuda; si sigue igual, se reinicia VLC.
+        'VLC_STALL_TIMEOUT': 8
     }
 
+    # Modo multipantalla: un solo daemon gestiona varias pantallas, cada una con su carpeta fuente,
+    # su playlist y su VLC. Lista vacía = una sola pantalla con VIDEO_DIR, PATHS y VLC_CONFIG.
+    # Cada perfil es un dict con 'NOMBRE' (único, sin espacios) y 'VIDEO_DIR'; opcionales:
+    #   'VLC_ARGS': se agregan a VLC_ARGS, p. ej. ['--qt-fullscreen-screennumber=1']
+    #   'VLC_HTTP_PORT': por defecto VLC_HTTP_PORT + posición del perfil
+    #   'TEMP_VIDEO_DIR', 'PLAYLIST_PATH', 'MANIFEST_FILE', 'FLAG_FILE': por defecto con el nombre del perfil
+    # Ejemplo:
+    #   SCREEN_PROFILES = [
+    #       {'NOMBRE': 'recepcion', 'VIDEO_DIR': r"C:\VideosRecepcion"},
+    #       {'NOMBRE': 'comedor', 'VIDEO_DIR': r"C:\VideosComedor", 'VLC_ARGS': ['--qt-fullscreen-screennumber=1']},
+    #   ]
+    SCREEN_PROFILES = []
+
+    # Carpeta sincronizada por omisión de CONFIG_FILE y LOG_SHARED_DIR: VIDEO_DIR, o la del primer perfil
+    # en modo multipantalla (ahí VIDEO_DIR no se usa y puede no existir)
+    _CARPETA_COMPARTIDA = (SCREEN_PROFILES[0].get('VIDEO_DIR') if SCREEN_PROFILES else None) or VIDEO_CONFIG['VIDEO_DIR']
+
     SYNC_CONFIG = {
-        # Espera para descargar contenido después de estimular la sincronización (segundos)
-        # Este valor determina cuánto tiempo esperar después de estimular OneDrive, suponiendo que se descarga contenido.
-        'DOWNLOAD_FINISH_DELAY': 2,
+        # Tiempo que un archivo debe mantener tamaño y fecha sin cambios para publicarse (segundos)
+        # Reemplaza la espera fija tras estimular OneDrive: cada archivo se publica en cuanto se estabiliza.
+        'STABILITY_WINDOW': 10,
+
+        # Backoff entre revisiones de archivos que siguen llegando y de archivos pendientes en OneDrive
+        # (segundos): empieza en STABILITY_POLL_MIN y se duplica hasta STABILITY_POLL_MAX
+        'STABILITY_POLL_MIN': 2,
+        'STABILITY_POLL_MAX': 60,
 
         # Intervalo de ejecución del bucle principal (segundos) 30 minutos por defecto (1800 segundos) 1 hora(3600)
         # Este valor determina cada cuánto tiempo se revisa el directorio de videos
         'REFRESH_CYCLE_DELAY': 3600,
 
-        # Intervalo para verificar que existe un proceso VLC ejecutandose (segundos) 2 minutos por defecto (120 segundos)
-        # Esto para relanzar VLC en caso de cierre accidental o crash del VLC.
-        'VLC_PS_CHECK_TIME': 180,
-
-        # Número máximo de errores consecutivos antes de detener el script (int)
-        # Este valor determina cuántos errores consecutivos se toleran antes de considerar
-        # que hay un problema grave y detener el script
+        # Número de errores consecutivos antes de abrir el circuito de reintentos (int)
+        # Con el circuito abierto el daemon NO se detiene: sigue reproduciendo el último contenido
+        # válido y reintenta en segundo plano hasta que vuelva a haber contenido
         'MAX_CONSECUTIVE_ERRORS': 3,
 
-        # Tiempo de espera entre reintentos cuando hay errores (segundos)
-        # Este valor determina cuánto tiempo esperar antes de reintentar una operación fallida
-        # como la estimulación de OneDrive o la verificación de archivos
+        # Espera inicial entre reintentos cuando hay errores (segundos)
+        # Se duplica en cada fallo consecutivo hasta RETRY_MAX_DELAY
         'ERROR_RETRY_DELAY': 10,
 
+        # Espera máxima entre reintentos (segundos)
+        'RETRY_MAX_DELAY': 300,
+
+        # Fracción aleatoria (0 a 1) que se resta de cada espera para que varias pantallas
+        # no reintenten al mismo tiempo contra OneDrive/SharePoint
+        'RETRY_JITTER': 0.5,
+
+        # Estrategia de "toque" para estimular OneDrive cuando hay archivos pendientes:
+        # 'pendientes' toca solo los archivos pendientes o deshidratados, 'centinela' toca solo
+        # ONEDRIVE_SENTINEL_FILE (un único archivo pequeño en VIDEO_DIR) y 'ninguno' no toca nada.
+        # Los archivos válidos y sincronizados nunca se tocan.
+        'ONEDRIVE_TOUCH_MODE': 'pendientes',
+
+        # Tiempo mínimo entre dos toques del mismo archivo (segundos)
+        'ONEDRIVE_TOUCH_INTERVAL': 900,
+
+        # Nombre del archivo centinela dentro de VIDEO_DIR (modo 'centinela')
+        'ONEDRIVE_SENTINEL_FILE': '.mediasync_centinela',
+
+        # Backend para detectar cambios en VIDEO_DIR: 'auto', 'inotify', 'windows', 'watchdog' o 'sondeo'
+        # 'auto' usa inotify en Linux y ReadDirectoryChangesW en Windows; si fallan, usa sondeo.
+        'WATCHER_BACKEND': 'auto',
+
+        # Segundos sin eventos nuevos antes de considerar que el contenido cambió (debounce)
+        # Agrupa las ráfagas de eventos de una descarga de OneDrive en un solo refresco.
+        'WATCHER_DEBOUNCE': 5,
+
+        # Intervalo del backend de sondeo (segundos), solo se usa como respaldo
+        'WATCHER_POLL_INTERVAL': 60,
+
+        # Calcular huella de contenido en el manifiesto (detecta reemplazos con mismo tamaño y fecha)
+        # Tiene costo de lectura por cada archivo nuevo o modificado; la caché evita repetirla.
+        'MANIFEST_FINGERPRINT': True,
+
+        # Modo de huella de contenido: 'completo' (todo el archivo), 'muestreo' (bloques repartidos)
+        # o 'auto' (completo hasta FINGERPRINT_FULL_MAX_MB, muestreo por encima)
+        'FINGERPRINT_MODE': 'auto',
+        'FINGERPRINT_FULL_MAX_MB': 1024,
+
+        # Tamaño de cada tramo hasheado del archivo mapeado en memoria (MB)
+        'FINGERPRINT_CHUNK_MB': 16,
+
+        # Modo muestreo: número de bloques (incluidos el primero y el último) y tamaño de cada uno (KB)
+        'FINGERPRINT_SAMPLES': 16,
+        'FINGERPRINT_SAMPLE_KB': 256,
+
+        # Cada cuánto se revisa si cambió la configuración externa PATHS['CONFIG_FILE'] (segundos)
+        # Es un solo stat del archivo; los cambios se aplican sin reiniciar el daemon ni VLC.
+        'CONFIG_POLL_INTERVAL': 30,
+
+        # Archivos que revisa como máximo la validación inicial buscando el primer video de VIDEO_DIR
+        # Acota el arranque con RECURSIVE_SCAN en carpetas muy grandes (se detiene en el primer video).
+        'VALIDATION_SCAN_LIMIT': 5000,
+
+        # Entradas máximas de la caché de huellas (tamaño, mtime_ns, inode) -> huella
+        'FINGERPRINT_CACHE_MAX': 10000,
+
+        # Generaciones de staging que se conservan en TEMP_VIDEO_DIR (la activa incluida)
+        # Con 2 queda la anterior para revertir al instante y para el archivo que VLC esté reproduciendo
+        'STAGING_GENERATIONS_KEEP': 2,
+
+        # Cuota total del almacén local de contenido (STORE_DIR) en MB (0 = sin límite)
+        # Al llegar al tope se desaloja primero el contenido retenido que hace más tiempo no se reproduce;
+        # lo que está en reproducción nunca se desaloja, y lo nuevo que no cabe espera al siguiente ciclo.
+        'STORE_MAX_SIZE_MB': 0,
+
+        # Horas que se conserva el contenido que ya ninguna pantalla usa (0 = eliminarlo al instante)
+        # Si un cambio en SharePoint se revierte, el clip vuelve a la playlist desde el disco local sin copiarlo otra vez.
+        'STORE_RETENTION_HOURS': 72,
+
         # Tamaño mínimo para que un archivo sea verificado tanto al inicio como al final (bytes)
         'MIN_FILE_SIZE_FOR_TAIL_CHECK': 16384,
 
@@ -64,22 +188,81 @@ class Config:
         'FILE_CHECK_BLOCK_SIZE': 8192
     }
 
+    # Configuración del motor de copia al directorio temporal (copy_utils.py)
+    COPY_CONFIG = {
+        # Número de hilos que copian en paralelo (int)
+        # En discos mecánicos conviene un valor bajo (1-2); en SSD/NVMe 4 o más.
+        'COPY_WORKERS': 4,
+        # Tamaño del bloque de lectura/escritura cuando no hay copia en el kernel (MB)
+        # Se usa en Windows y en Linux cuando copy_file_range/sendfile no están disponibles.
+        'COPY_CHUNK_SIZE_MB': 8,
+        # Intentar reflink (clonado sin copiar datos) en Linux si el sistema de archivos lo soporta
+        'COPY_REFLINK': True,
+        # Cada cuántos MB una copia grande hace fsync y registra su avance en el diario de estado (0 = no reanudar)
+        # Si el daemon se detiene a mitad de un video de varios GB, la copia continúa desde el último registro.
+        'COPY_CHECKPOINT_MB': 64,
+        # Límite de lectura del staging en MB/s, compartido por copias y huellas (0 = sin límite)
+        # Con VLC leyendo del mismo disco, un valor por debajo de la velocidad del disco evita cortes en la reproducción.
+        'IO_MAX_MB_S': 0,
+        # Copias y huellas con prioridad de E/S de segundo plano (ionice idle en Linux, modo background en Windows)
+        'IO_BACKGROUND_PRIORITY': True
+    }
+
+    # Métricas por fase y endpoint local de estado (metrics_utils.py)
+    METRICS_CONFIG = {
+        # Endpoint HTTP con /metrics (formato Prometheus) y /estado (JSON)
+        'METRICS_ENABLED': True,
+        # Solo escuchar en la máquina local; el recolector de la flota consulta a través del equipo
+        'METRICS_HOST': '127.0.0.1',
+        'METRICS_PORT': 9108,
+        # Cada cuánto se reescribe el archivo de estado JSON aunque no haya cambios (segundos)
+        # También se escribe al terminar cada ciclo de staging.
+        'STATUS_INTERVAL': 60
+    }
+
     # Configuraciones de directorios temporales y archivos de sistema
     PATHS = {
         # Directorio temporal desde donde se hace la reproducción de medios
         'TEMP_VIDEO_DIR': os.path.join(os.getenv("TEMP"), "daemon_temp_media"),
         # Archivo de playlist
         'PLAYLIST_PATH': os.path.join(os.getenv("TEMP"), "playlistVLC.m3u"),
-        # Archivo para detectar cambios en contenido
-        'HASH_FILE': os.path.join(os.getenv("TEMP"), "daemon_media.hash"),
+        # Manifiesto por archivo (tamaño, mtime, file-id, huella) para calcular diffs de contenido
+        'MANIFEST_FILE': os.path.join(os.getenv("TEMP"), "daemon_media_manifest.json"),
+        # Caché persistente de huellas de contenido por (tamaño, mtime_ns, inode)
+        'FINGERPRINT_CACHE_FILE': os.path.join(os.getenv("TEMP"), "daemon_media_fingerprints.json"),
+        # Almacén local direccionado por contenido: cada video se copia y verifica una sola vez y se
+        # enlaza (hardlink) en el staging de cada pantalla. Debe estar en el mismo volumen que los TEMP_VIDEO_DIR
+        'STORE_DIR': os.path.join(os.getenv("TEMP"), "daemon_media_store"),
+        # Diario de estado (SQLite): copias en curso con su avance, generación en construcción y VLC de cada
+        # pantalla. Tras un corte permite reanudar copias parciales en lugar de empezarlas de nuevo
+        'JOURNAL_FILE': os.path.join(os.getenv("TEMP"), "daemon_media_journal.sqlite3"),
+        # Configuración externa (JSON, o TOML con Python 3.11+) que sobrescribe los valores de este archivo.
+        # En VIDEO_DIR (el del primer perfil en modo multipantalla) llega por OneDrive/SharePoint a toda
+        # la flota; '' para no usarla
+        'CONFIG_FILE': os.path.join(_CARPETA_COMPARTIDA, "MediaSync_config.json"),
+        # Archivo de estado JSON con las métricas; local como el log en vivo (reescribirlo en VIDEO_DIR
+        # provocaba una re-subida de OneDrive en cada ciclo). Para monitorear la flota se publica una
+        # copia en LOG_SHARED_DIR junto a los segmentos del log, solo cuando cambia
+        'STATUS_FILE': os.path.join(os.getenv("TEMP"), "MediaSync_estado.json"),
         # Indicador de estado del script
         'FLAG_FILE': os.path.join(os.path.dirname(__file__), "stream_active.flag"),
     }
 
     # Configuración de logging
     LOG_CONFIG = {
-        # Ruta del archivo de log
-        'LOG_PATH': os.path.join(VIDEO_CONFIG['VIDEO_DIR'], "MediaSync.log"),
+        # Ruta del archivo de log en vivo: local, fuera de la carpeta sincronizada
+        # (escribir en VIDEO_DIR en cada línea provocaba una re-subida del log que competía con las descargas)
+        'LOG_PATH': os.path.join(os.getenv("TEMP"), "MediaSync.log"),
+        # Carpeta compartida donde se publican segmentos comprimidos del log para monitorearlo remotamente
+        # ('' o None para no publicar). Cada segmento: MediaSync_<equipo>_<fecha>.log.gz
+        # Por omisión VIDEO_DIR, o el del primer perfil en modo multipantalla
+        'LOG_SHARED_DIR': _CARPETA_COMPARTIDA,
+        # Intervalo mínimo entre publicaciones (segundos); se intenta al terminar cada ciclo
+        'LOG_PUSH_INTERVAL': 900,
+        # Segmentos de este equipo que se conservan en LOG_SHARED_DIR
+        'LOG_SHARED_KEEP': 48,
+        # Líneas máximas pendientes de publicar en memoria (las más antiguas se omiten del segmento)
+        'LOG_SEGMENT_MAX_LINES': 50000,
         # Nivel de logging (DEBUG, INFO, WARNING, ERROR, CRITICAL)
         'LOG_LEVEL': 'INFO',
         # Formato del mensaje de log
@@ -97,45 +280,179 @@ class Config:
     }
 
     @classmethod
-    def validate(cls):
-        """Valida la configuración actual y retorna lista de errores si los hay"""
+    def perfiles(cls):
+        """Perfiles de pantalla con todas sus rutas resueltas; uno solo ('principal') sin SCREEN_PROFILES"""
+        if not cls.SCREEN_PROFILES:
+            return [{
+                'NOMBRE': 'principal',
+                'VIDEO_DIR': cls.VIDEO_CONFIG['VIDEO_DIR'],
+                'TEMP_VIDEO_DIR': cls.PATHS['TEMP_VIDEO_DIR'],
+                'PLAYLIST_PATH': cls.PATHS['PLAYLIST_PATH'],
+                'MANIFEST_FILE': cls.PATHS['MANIFEST_FILE'],
+                'FLAG_FILE': cls.PATHS['FLAG_FILE'],
+                'VLC_HTTP_PORT': cls.VLC_CONFIG['VLC_HTTP_PORT'],
+                'VLC_ARGS': []
+            }]
+        temp = os.getenv("TEMP")
+        perfiles = []
+        for posicion, perfil in enumerate(cls.SCREEN_PROFILES):
+            nombre = perfil['NOMBRE']
+            perfiles.append({
+                'NOMBRE': nombre,
+                'VIDEO_DIR': perfil['VIDEO_DIR'],
+                'TEMP_VIDEO_DIR': perfil.get('TEMP_VIDEO_DIR') or os.path.join(temp, f"daemon_temp_media_{nombre}"),
+                'PLAYLIST_PATH': perfil.get('PLAYLIST_PATH') or os.path.join(temp, f"playlistVLC_{nombre}.m3u"),
+                'MANIFEST_FILE': perfil.get('MANIFEST_FILE') or os.path.join(temp, f"daemon_media_manifest_{nombre}.json"),
+                'FLAG_FILE': perfil.get('FLAG_FILE') or os.path.join(os.path.dirname(__file__),
+                                                                     f"stream_active_{nombre}.flag"),
+                'VLC_HTTP_PORT': perfil.get('VLC_HTTP_PORT') or cls.VLC_CONFIG['VLC_HTTP_PORT'] + posicion,
+                'VLC_ARGS': list(perfil.get('VLC_ARGS', []))
+            })
+        return perfiles
+
+    @classmethod
+    def validate(cls, revisar_contenido=True):
+        """
+        Valida la configuración actual y retorna lista de errores si los hay.
+        Con revisar_contenido se busca además el primer video de cada VIDEO_DIR (acotado por
+        VALIDATION_SCAN_LIMIT); al recargar la configuración externa se omite.
+        """
         errors = []
         
-        # Validar directorio de videos
-        if not os.path.isdir(cls.VIDEO_CONFIG['VIDEO_DIR']):
-            errors.append(f"Directorio de videos no existe: {cls.VIDEO_CONFIG['VIDEO_DIR']}")
-        
-        # Validar que hay al menos un archivo de video válido
-        video_encontrado = False
-        for root, dirs, files in os.walk(cls.VIDEO_CONFIG['VIDEO_DIR']):
-            for filename in files:
-                # Solo verificar archivos que podrían ser videos (ignorar logs, etc.)
-                if any(filename.lower().endswith(ext.lower()) for ext in cls.VIDEO_CONFIG['FORMATOS_DE_VIDEO_ADMITIDOS']):
-                    video_encontrado = True
-                    break
-            if video_encontrado:
-                break
-        
-        if not video_encontrado:
-            errors.append(f"No se encontraron archivos de video válidos en: {cls.VIDEO_CONFIG['VIDEO_DIR']}")
+        # Validar perfiles de pantalla (modo multipantalla)
+        nombres, puertos = set(), set()
+        for perfil in cls.SCREEN_PROFILES:
+            if not perfil.get('NOMBRE') or not perfil.get('VIDEO_DIR'):
+                errors.append("Cada perfil de SCREEN_PROFILES requiere 'NOMBRE' y 'VIDEO_DIR'")
+                return errors
+            if not perfil['NOMBRE'].replace('-', '').replace('_', '').isalnum():
+                errors.append(f"Nombre de pantalla no válido (solo letras, números, '-' y '_'): {perfil['NOMBRE']}")
+            if perfil['NOMBRE'] in nombres:
+                errors.append(f"Nombre de pantalla repetido: {perfil['NOMBRE']}")
+            nombres.add(perfil['NOMBRE'])
+        for perfil in cls.perfiles():
+            if perfil['VLC_HTTP_PORT'] in puertos:
+                errors.append(f"Puerto HTTP de VLC repetido entre pantallas: {perfil['VLC_HTTP_PORT']}")
+            puertos.add(perfil['VLC_HTTP_PORT'])
+
+            # Validar directorio de videos
+            if not os.path.isdir(perfil['VIDEO_DIR']):
+                errors.append(f"Directorio de videos no existe: {perfil['VIDEO_DIR']}")
+
+            # Validar que hay al menos un archivo de video válido (el mismo escáner que usa el daemon)
+            # Se detiene en el primero; si el límite se agota sin concluir no es un error
+            if not revisar_contenido:
+                continue
+            # Import local: file_utils importa Config
+            from file_utils import hay_video
+            try:
+                video_encontrado = hay_video(perfil['VIDEO_DIR'], cls.SYNC_CONFIG['VALIDATION_SCAN_LIMIT'])
+            except OSError:
+                video_encontrado = False
+
+            if video_encontrado is False:
+                errors.append(f"No se encontraron archivos de video válidos en: {perfil['VIDEO_DIR']}")
 
         # Validar ejecutable VLC
         if not os.path.isfile(cls.VLC_CONFIG['VLC_EXE']):
             errors.append(f"Ejecutable de VLC no encontrado: {cls.VLC_CONFIG['VLC_EXE']}")
         
         # ...resto del código de validaciones numéricas...
-        if cls.SYNC_CONFIG['DOWNLOAD_FINISH_DELAY'] < 0:
-            errors.append("El tiempo de espera para descarga no puede ser negativo")
+        if cls.SYNC_CONFIG['STABILITY_WINDOW'] < 0:
+            errors.append("La ventana de estabilidad de archivos no puede ser negativa")
+        if not 0 < cls.SYNC_CONFIG['STABILITY_POLL_MIN'] <= cls.SYNC_CONFIG['STABILITY_POLL_MAX']:
+            errors.append("El backoff de estabilidad debe cumplir 0 < STABILITY_POLL_MIN <= STABILITY_POLL_MAX")
         if cls.SYNC_CONFIG['REFRESH_CYCLE_DELAY'] < 0:
             errors.append("El tiempo de ciclo de refresco no puede ser negativo")
         if cls.SYNC_CONFIG['MAX_CONSECUTIVE_ERRORS'] < 0:
             errors.append("El número máximo de errores consecutivos no puede ser negativo")
         if cls.SYNC_CONFIG['ERROR_RETRY_DELAY'] < 0:
             errors.append("El tiempo de espera entre reintentos no puede ser negativo")
+        if cls.SYNC_CONFIG['RETRY_MAX_DELAY'] < cls.SYNC_CONFIG['ERROR_RETRY_DELAY']:
+            errors.append("RETRY_MAX_DELAY no puede ser menor que ERROR_RETRY_DELAY")
+        if not 0 <= cls.SYNC_CONFIG['RETRY_JITTER'] <= 1:
+            errors.append("RETRY_JITTER debe estar entre 0 y 1")
         if cls.SYNC_CONFIG['MIN_FILE_SIZE_FOR_TAIL_CHECK'] < 0:
             errors.append("El tamaño mínimo de archivo para verificación no puede ser negativo")
         if cls.SYNC_CONFIG['FILE_CHECK_BLOCK_SIZE'] <= 0:
             errors.append("El tamaño del bloque de lectura para verificación debe ser mayor que cero")
+        if cls.SYNC_CONFIG['ONEDRIVE_TOUCH_MODE'] not in ['pendientes', 'centinela', 'ninguno']:
+            errors.append(f"Modo de toque de OneDrive no válido: {cls.SYNC_CONFIG['ONEDRIVE_TOUCH_MODE']}")
+        if cls.SYNC_CONFIG['ONEDRIVE_TOUCH_INTERVAL'] < 0:
+            errors.append("El intervalo entre toques de OneDrive no puede ser negativo")
+        if not cls.SYNC_CONFIG['ONEDRIVE_SENTINEL_FILE'] or os.sep in cls.SYNC_CONFIG['ONEDRIVE_SENTINEL_FILE']:
+            errors.append("El archivo centinela de OneDrive debe ser un nombre de archivo sin ruta")
+        if cls.SYNC_CONFIG['WATCHER_BACKEND'] not in ['auto', 'inotify', 'windows', 'watchdog', 'sondeo']:
+            errors.append(f"Backend de vigilancia no válido: {cls.SYNC_CONFIG['WATCHER_BACKEND']}")
+        if cls.SYNC_CONFIG['WATCHER_DEBOUNCE'] < 0:
+            errors.append("El tiempo de debounce de la vigilancia no puede ser negativo")
+        if cls.SYNC_CONFIG['WATCHER_POLL_INTERVAL'] <= 0:
+            errors.append("El intervalo de sondeo de la vigilancia debe ser mayor que cero")
+        if cls.SYNC_CONFIG['FINGERPRINT_MODE'] not in ['auto', 'completo', 'muestreo']:
+            errors.append(f"Modo de huella no válido: {cls.SYNC_CONFIG['FINGERPRINT_MODE']}")
+        if cls.SYNC_CONFIG['FINGERPRINT_FULL_MAX_MB'] < 0:
+            errors.append("El tamaño máximo para huella completa no puede ser negativo")
+        if cls.SYNC_CONFIG['FINGERPRINT_CHUNK_MB'] <= 0:
+            errors.append("El tamaño de tramo de la huella debe ser mayor que cero")
+        if cls.SYNC_CONFIG['FINGERPRINT_SAMPLES'] < 2:
+            errors.append("El modo muestreo de la huella necesita al menos 2 bloques")
+        if cls.SYNC_CONFIG['FINGERPRINT_SAMPLE_KB'] <= 0:
+            errors.append("El tamaño de bloque de muestreo de la huella debe ser mayor que cero")
+        if cls.SYNC_CONFIG['FINGERPRINT_CACHE_MAX'] <= 0:
+            errors.append("El tamaño de la caché de huellas debe ser mayor que cero")
+        if cls.SYNC_CONFIG['CONFIG_POLL_INTERVAL'] <= 0:
+            errors.append("El intervalo de revisión de la configuración externa debe ser mayor que cero")
+        if cls.SYNC_CONFIG['VALIDATION_SCAN_LIMIT'] <= 0:
+            errors.append("El límite de archivos de la validación inicial debe ser mayor que cero")
+        if cls.SYNC_CONFIG['STAGING_GENERATIONS_KEEP'] < 1:
+            errors.append("Se debe conservar al menos una generación de staging")
+        if cls.VIDEO_CONFIG['MAX_FILE_SIZE_MB'] < 0:
+            errors.append("El tamaño máximo de archivo no puede ser negativo (0 = sin límite)")
+        if cls.SYNC_CONFIG['STORE_MAX_SIZE_MB'] < 0:
+            errors.append("La cuota del almacén no puede ser negativa (0 = sin límite)")
+        if (cls.SYNC_CONFIG['STORE_MAX_SIZE_MB'] and cls.VIDEO_CONFIG['MAX_FILE_SIZE_MB']
+                and cls.VIDEO_CONFIG['MAX_FILE_SIZE_MB'] > cls.SYNC_CONFIG['STORE_MAX_SIZE_MB']):
+            errors.append("El tamaño máximo de archivo no puede superar la cuota del almacén")
+        if cls.SYNC_CONFIG['STORE_RETENTION_HOURS'] < 0:
+            errors.append("La retención del almacén no puede ser negativa")
+        if cls.LOG_CONFIG['LOG_LEVEL'] not in ('DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL'):
+            errors.append(f"Nivel de log no válido: {cls.LOG_CONFIG['LOG_LEVEL']}")
+        if cls.LOG_CONFIG['LOG_PUSH_INTERVAL'] < 0:
+            errors.append("El intervalo de publicación del log no puede ser negativo")
+        if cls.LOG_CONFIG['LOG_SHARED_KEEP'] < 1:
+            errors.append("Se debe conservar al menos un segmento de log publicado")
+        if cls.LOG_CONFIG['LOG_SEGMENT_MAX_LINES'] <= 0:
+            errors.append("El máximo de líneas pendientes del log debe ser mayor que cero")
+        if cls.LOG_CONFIG['LOG_SHARED_DIR'] and not os.path.isdir(cls.LOG_CONFIG['LOG_SHARED_DIR']):
+            errors.append(f"La carpeta compartida del log no existe: {cls.LOG_CONFIG['LOG_SHARED_DIR']}")
+        if not 0 < cls.METRICS_CONFIG['METRICS_PORT'] < 65536:
+            errors.append(f"Puerto de métricas no válido: {cls.METRICS_CONFIG['METRICS_PORT']}")
+        if (cls.METRICS_CONFIG['METRICS_ENABLED'] and cls.VLC_CONFIG['VLC_HTTP_ENABLED']
+                and cls.METRICS_CONFIG['METRICS_PORT'] in {p['VLC_HTTP_PORT'] for p in cls.perfiles()}):
+            errors.append("El puerto de métricas no puede ser el mismo que el de la interfaz HTTP de VLC")
+        if cls.METRICS_CONFIG['STATUS_INTERVAL'] <= 0:
+            errors.append("El intervalo del archivo de estado debe ser mayor que cero")
+        if cls.VLC_CONFIG['VLC_START_TIMEOUT'] <= 0:
+            errors.append("El tiempo de espera de inicio de VLC debe ser mayor que cero")
+        if cls.VLC_CONFIG['VLC_HEALTH_INTERVAL'] < 0:
+            errors.append("El intervalo de la sonda de reproducción no puede ser negativo")
+        if (cls.VLC_CONFIG['VLC_HEALTH_INTERVAL']
+                and cls.VLC_CONFIG['VLC_STALL_TIMEOUT'] <= cls.VLC_CONFIG['VLC_HEALTH_INTERVAL']):
+            errors.append("VLC_STALL_TIMEOUT debe ser mayor que VLC_HEALTH_INTERVAL")
+        if cls.VLC_CONFIG['VLC_HTTP_ENABLED'] and not cls.VLC_CONFIG['VLC_HTTP_PASSWORD']:
+            errors.append("La interfaz HTTP de VLC requiere una contraseña (VLC_HTTP_PASSWORD)")
+        if not 0 < cls.VLC_CONFIG['VLC_HTTP_PORT'] < 65536:
+            errors.append(f"Puerto HTTP de VLC no válido: {cls.VLC_CONFIG['VLC_HTTP_PORT']}")
+        if cls.VIDEO_CONFIG['MP4_FASTSTART_WORKERS'] <= 0:
+            errors.append("El número de procesos de faststart debe ser mayor que cero")
+        if cls.COPY_CONFIG['COPY_WORKERS'] <= 0:
+            errors.append("El número de hilos de copia debe ser mayor que cero")
+        if cls.COPY_CONFIG['COPY_CHUNK_SIZE_MB'] <= 0:
+            errors.append("El tamaño de bloque de copia debe ser mayor que cero")
+        if cls.COPY_CONFIG['COPY_CHECKPOINT_MB'] < 0:
+            errors.append("El intervalo de registro de avance de copia no puede ser negativo")
+        if cls.COPY_CONFIG['IO_MAX_MB_S'] < 0:
+            errors.append("El límite de lectura del staging (IO_MAX_MB_S) no puede ser negativo")
         if cls.VLC_CONFIG['VLC_KILL_TIMEOUT'] <= 0:
             errors.append("El tiempo de espera para matar VLC debe ser mayor que cero")
         if cls.LOG_CONFIG['MAX_LOG_SIZE_MB'] <= 0:
@@ -144,15 +461,18 @@ class Config:
             errors.append("El número de archivos de backup del log no puede ser negativo")
         if cls.LOG_CONFIG['LOG_ENCODING'] not in ['utf-8', 'latin-1', 'ascii']:
             errors.append(f"Código de codificación del log no válido: {cls.LOG_CONFIG['LOG_ENCODING']}")
-        if cls.SYNC_CONFIG['VLC_PS_CHECK_TIME'] > cls.SYNC_CONFIG['REFRESH_CYCLE_DELAY'] * 0.5:
-            errors.append("El tiempo de verificación de VLC (VLC_PS_CHECK_TIME) debe ser igual o menor a 0.5 veces el REFRESH_CYCLE_DELAY para permitir al menos dos chequeos por ciclo.")      
+        if not 0 < cls.VLC_CONFIG['VLC_RESTART_BACKOFF_MIN'] <= cls.VLC_CONFIG['VLC_RESTART_BACKOFF_MAX']:
+            errors.append("El backoff de reinicio de VLC debe cumplir 0 < VLC_RESTART_BACKOFF_MIN <= VLC_RESTART_BACKOFF_MAX")
+        if cls.VLC_CONFIG['VLC_RESTART_STABLE'] < 0:
+            errors.append("El tiempo de ejecución estable de VLC no puede ser negativo")
         
         # Validar ruta de log válida
         if not cls.LOG_CONFIG['LOG_PATH'] or not os.path.isdir(os.path.dirname(cls.LOG_CONFIG['LOG_PATH'])):
             errors.append("La ruta del archivo de log no es válida o el directorio no existe")
         
-        # Validar ruta de video válida  
-        if not cls.VIDEO_CONFIG['VIDEO_DIR'] or not os.path.isdir(cls.VIDEO_CONFIG['VIDEO_DIR']):
+        # Validar ruta de video válida (en modo multipantalla cada perfil tiene la suya, validada arriba)
+        if not cls.SCREEN_PROFILES and (not cls.VIDEO_CONFIG['VIDEO_DIR']
+                                        or not os.path.isdir(cls.VIDEO_CONFIG['VIDEO_DIR'])):
             errors.append("La ruta del directorio de videos no es válida o no existe")
 
         return errors
\ No newline at end of file
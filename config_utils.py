@@ -0,0 +1,270 @@
+import os
+import json
+import copy
+import socket
+import threading
+from logging_utils import log
+from config import Config
+from metrics_utils import incrementar
+
+try:
+    # TOML en la biblioteca estándar desde Python 3.11; sin él solo se acepta JSON
+    import tomllib
+except ImportError:
+    tomllib = None
+
+# Secciones de Config que el archivo externo puede sobrescribir, clave por clave
+SECCIONES = ('VIDEO_CONFIG', 'VLC_CONFIG', 'SYNC_CONFIG', 'COPY_CONFIG', 'METRICS_CONFIG', 'LOG_CONFIG', 'PATHS')
+
+# Sección del archivo con ajustes por equipo: {"EQUIPOS": {"<nombre del equipo>": {"SYNC_CONFIG": {...}}}}
+# Se aplican sobre los generales, así un solo archivo en la carpeta compartida configura toda la flota
+SECCION_EQUIPOS = 'EQUIPOS'
+
+# Claves que solo se aplican al iniciar el daemon: las capturan procesos o recursos ya creados
+# (proceso VLC con su interfaz HTTP, vigilante, pool de copia, servidor de métricas, archivo de log).
+# 'SECCION.*' = toda la sección
+REQUIEREN_REINICIO = {
+    'SCREEN_PROFILES', 'PATHS.*',
+    'VIDEO_CONFIG.VIDEO_DIR', 'VIDEO_CONFIG.RECURSIVE_SCAN',
+    'VLC_CONFIG.VLC_HTTP_ENABLED', 'VLC_CONFIG.VLC_HTTP_HOST', 'VLC_CONFIG.VLC_HTTP_PORT',
+    'VLC_CONFIG.VLC_HTTP_PASSWORD',
+    'SYNC_CONFIG.WATCHER_BACKEND', 'SYNC_CONFIG.WATCHER_POLL_INTERVAL',
+    'VIDEO_CONFIG.MP4_FASTSTART_WORKERS', 'COPY_CONFIG.COPY_WORKERS',
+    'METRICS_CONFIG.METRICS_ENABLED', 'METRICS_CONFIG.METRICS_HOST', 'METRICS_CONFIG.METRICS_PORT',
+    'LOG_CONFIG.LOG_PATH', 'LOG_CONFIG.LOG_SHARED_DIR', 'LOG_CONFIG.LOG_FORMAT', 'LOG_CONFIG.DATE_FORMAT',
+    'LOG_CONFIG.MAX_LOG_SIZE_MB', 'LOG_CONFIG.LOG_BACKUP_COUNT', 'LOG_CONFIG.LOG_ENCODING',
+    'LOG_CONFIG.LOG_SEGMENT_MAX_LINES',
+}
+
+# Claves cuyo valor no se escribe en el log
+SENSIBLES = {'VLC_CONFIG.VLC_HTTP_PASSWORD'}
+
+# Valores de config.py antes de aplicar el archivo: una clave que se quita del archivo vuelve a ellos
+_valores_base = None
+# (mtime_ns, tamaño) del archivo ya aplicado; None si no existe
+_firma = None
+# Claves del archivo que esperan un reinicio (ya avisadas)
+_pendientes = set()
+_lock = threading.Lock()
+
+# ============================================================================
+# FUNCIONES HELPER PRIVADAS
+# ============================================================================
+
+def _ruta():
+    return Config.PATHS.get('CONFIG_FILE')
+
+def _capturar_base():
+    global _valores_base
+    if _valores_base is None:
+        _valores_base = {seccion: copy.deepcopy(getattr(Config, seccion)) for seccion in SECCIONES}
+        _valores_base['SCREEN_PROFILES'] = copy.deepcopy(Config.SCREEN_PROFILES)
+
+def _valor_actual(clave):
+    if clave == 'SCREEN_PROFILES':
+        return Config.SCREEN_PROFILES
+    seccion, nombre = clave.split('.', 1)
+    return getattr(Config, seccion)[nombre]
+
+def _fijar_valor(clave, valor):
+    if clave == 'SCREEN_PROFILES':
+        Config.SCREEN_PROFILES = copy.deepcopy(valor)
+        return
+    seccion, nombre = clave.split('.', 1)
+    getattr(Config, seccion)[nombre] = copy.deepcopy(valor)
+
+def _valor_base(clave):
+    if clave == 'SCREEN_PROFILES':
+        return _valores_base['SCREEN_PROFILES']
+    seccion, nombre = clave.split('.', 1)
+    return _valores_base[seccion][nombre]
+
+def _requiere_reinicio(clave):
+    return clave in REQUIEREN_REINICIO or f"{clave.split('.', 1)[0]}.*" in REQUIEREN_REINICIO
+
+def _claves_sobrescritas():
+    """Claves cuyo valor actual difiere de config.py (aplicadas antes desde el archivo)"""
+    claves = set()
+    for seccion in SECCIONES:
+        for nombre, valor in getattr(Config, seccion).items():
+            if nombre in _valores_base[seccion] and _valores_base[seccion][nombre] != valor:
+                claves.add(f"{seccion}.{nombre}")
+    if Config.SCREEN_PROFILES != _valores_base['SCREEN_PROFILES']:
+        claves.add('SCREEN_PROFILES')
+    return claves
+
+def _tipo_compatible(base, valor):
+    # bool es subclase de int: se exige el mismo tipo, salvo int/float entre sí
+    if isinstance(base, bool) or isinstance(valor, bool):
+        return isinstance(base, bool) and isinstance(valor, bool)
+    if isinstance(base, (int, float)):
+        return isinstance(valor, (int, float))
+    if base is None:
+        return True
+    return isinstance(valor, type(base))
+
+def _mostrar(clave, valor):
+    return '***' if clave in SENSIBLES else repr(valor)
+
+def _aplanar(datos, origen):
+    """Secciones del archivo -> {'SECCION.CLAVE': valor}; ValueError si hay secciones, claves o tipos desconocidos"""
+    if not isinstance(datos, dict):
+        raise ValueError(f"{origen}: se esperaba un objeto con secciones")
+    valores = {}
+    for seccion, contenido in datos.items():
+        if seccion == SECCION_EQUIPOS:
+            continue
+        if seccion == 'SCREEN_PROFILES':
+            if not isinstance(contenido, list) or not all(isinstance(p, dict) for p in contenido):
+                raise ValueError(f"{origen}: SCREEN_PROFILES debe ser una lista de perfiles")
+            valores['SCREEN_PROFILES'] = contenido
+            continue
+        if seccion not in SECCIONES:
+            raise ValueError(f"{origen}: sección desconocida '{seccion}'")
+        if not isinstance(contenido, dict):
+            raise ValueError(f"{origen}: la sección {seccion} debe ser un objeto")
+        for nombre, valor in contenido.items():
+            clave = f"{seccion}.{nombre}"
+            if clave == 'PATHS.CONFIG_FILE':
+                raise ValueError(f"{origen}: CONFIG_FILE solo se define en config.py")
+            if nombre not in _valores_base[seccion]:
+                raise ValueError(f"{origen}: clave desconocida {clave}")
+            if not _tipo_compatible(_valores_base[seccion][nombre], valor):
+                raise ValueError(f"{origen}: tipo no válido para {clave} "
+                                 f"(se esperaba {type(_valores_base[seccion][nombre]).__name__})")
+            valores[clave] = valor
+    return valores
+
+def _leer(path):
+    """
+    Lee el archivo externo (JSON o TOML según la extensión) y combina los ajustes generales
+    con los de este equipo. Returns: {'SECCION.CLAVE': valor}
+    """
+    if path.lower().endswith('.toml'):
+        if tomllib is None:
+            raise ValueError("Los archivos TOML requieren Python 3.11 o superior; usar JSON")
+        with open(path, "rb") as f:
+            datos = tomllib.load(f)
+    else:
+        with open(path, "r", encoding="utf-8") as f:
+            datos = json.load(f)
+    valores = _aplanar(datos, os.path.basename(path))
+    equipos = datos.get(SECCION_EQUIPOS, {}) if isinstance(datos, dict) else {}
+    if not isinstance(equipos, dict):
+        raise ValueError(f"{SECCION_EQUIPOS} debe ser un objeto por nombre de equipo")
+    equipo = socket.gethostname()
+    for nombre, ajustes in equipos.items():
+        if nombre.lower() == equipo.lower():
+            valores.update(_aplanar(ajustes, f"{SECCION_EQUIPOS}.{nombre}"))
+    return valores
+
+def _firma_archivo(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+# ============================================================================
+# FUNCIONES PRINCIPALES
+# ============================================================================
+
+def aplicar_config(valores, al_iniciar=False):
+    """
+    Aplica sobre Config solo las claves cuyo valor efectivo cambió (las que salen del archivo
+    vuelven al valor de config.py). Al iniciar se aplica todo y valida quien inicia el daemon.
+    Al recargar, las claves de REQUIEREN_REINICIO se avisan y se dejan para el próximo inicio,
+    y se valida sin recorrer VIDEO_DIR; si la validación falla no se aplica nada.
+    Args:
+        valores (dict): {'SECCION.CLAVE': valor} leídos del archivo
+        al_iniciar (bool): Aplicar también las claves que requieren reinicio
+    Returns:
+        set: Claves aplicadas
+    """
+    global _pendientes
+    _capturar_base()
+    claves = set(valores) | _claves_sobrescritas()
+    efectivos = {clave: valores[clave] if clave in valores else _valor_base(clave) for clave in claves}
+    cambios = {clave: valor for clave, valor in efectivos.items() if _valor_actual(clave) != valor}
+
+    pendientes = set()
+    if not al_iniciar:
+        pendientes = {clave for clave in cambios if _requiere_reinicio(clave)}
+        for clave in sorted(pendientes - _pendientes):
+            log(f"WARNING: {clave} cambió en la configuración externa; se aplicará al reiniciar el daemon")
+        _pendientes = pendientes
+        for clave in pendientes:
+            del cambios[clave]
+    if not cambios:
+        return set()
+
+    anteriores = {clave: copy.deepcopy(_valor_actual(clave)) for clave in cambios}
+    for clave, valor in cambios.items():
+        _fijar_valor(clave, valor)
+    errores = [] if al_iniciar else Config.validate(revisar_contenido=False)
+    if errores:
+        for clave, valor in anteriores.items():
+            _fijar_valor(clave, valor)
+        log("ERROR: La configuración externa no es válida, se mantiene la actual:")
+        for error in errores:
+            log(f"- {error}")
+        incrementar('config_recargas_total', resultado='invalida')
+        return set()
+
+    for clave in sorted(cambios):
+        log(f"Configuración: {clave} = {_mostrar(clave, cambios[clave])} "
+            f"(antes {_mostrar(clave, anteriores[clave])})")
+    incrementar('config_recargas_total', resultado='aplicada')
+    return set(cambios)
+
+def cargar_config_externa():
+    """
+    Al iniciar: aplica el archivo PATHS['CONFIG_FILE'] completo, si existe.
+    Los errores de lectura se registran y el daemon sigue con config.py.
+    Returns:
+        set: Claves aplicadas
+    """
+    global _firma
+    path = _ruta()
+    with _lock:
+        _capturar_base()
+        if not path or not os.path.exists(path):
+            return set()
+        _firma = _firma_archivo(path)
+        try:
+            valores = _leer(path)
+        except (OSError, ValueError) as e:
+            log(f"ERROR: No se pudo leer la configuración externa {path}, se usa config.py: {e}")
+            incrementar('config_recargas_total', resultado='ilegible')
+            return set()
+        log(f"Configuración externa: {path}")
+        return aplicar_config(valores, al_iniciar=True)
+
+def recargar_config():
+    """
+    Vuelve a aplicar el archivo externo si cambió (un stat por llamada). Un archivo eliminado
+    devuelve las claves recargables a config.py; uno ilegible (p. ej. a medio sincronizar) se
+    ignora hasta la siguiente modificación.
+    Returns:
+        set: Claves aplicadas
+    """
+    global _firma
+    path = _ruta()
+    if not path:
+        return set()
+    with _lock:
+        firma = _firma_archivo(path)
+        if firma == _firma:
+            return set()
+        _firma = firma
+        if firma is None:
+            log(f"Configuración externa eliminada ({path}), se vuelve a config.py")
+            return aplicar_config({})
+        try:
+            valores = _leer(path)
+        except (OSError, ValueError) as e:
+            log(f"ERROR: Configuración externa ilegible, se mantiene la actual: {e}")
+            incrementar('config_recargas_total', resultado='ilegible')
+            return set()
+        log(f"Configuración externa modificada ({path}), aplicando cambios")
+        return aplicar_config(valores)
@@ -0,0 +1,327 @@
+import os
+import sys
+import shutil
+import errno
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from logging_utils import log
+from config import Config
+from metrics_utils import incrementar, fijar
+from io_utils import limitar, prioridad_baja, espera_del_hilo
+from journal_utils import registrar_copia, copia_pendiente, copias_pendientes, finalizar_copia
+
+# ioctl FICLONE de Linux: clona el archivo completo compartiendo extents (btrfs, xfs, bcachefs)
+_FICLONE = 0x40049409
+
+# Errores que indican "este método no está soportado aquí", no un fallo real de la copia
+_ERRORES_NO_SOPORTADO = {getattr(errno, nombre) for nombre in
+                         ('EXDEV', 'ENOSYS', 'EINVAL', 'EOPNOTSUPP', 'ENOTSUP', 'ENOTTY', 'EBADF', 'EPERM')
+                         if hasattr(errno, nombre)}
+
+# Sufijo de archivos en copia; se renombran al terminar para no dejar archivos a medias.
+# Un .part de más de COPY_CHECKPOINT_MB se conserva si la copia se interrumpe: el diario de estado
+# guarda hasta qué offset está en disco y el siguiente intento continúa desde ahí
+SUFIJO_PARCIAL = '.part'
+
+# Estado entre ejecuciones: pool de hilos reutilizable y métodos descartados por
+# par de dispositivos (st_dev origen, st_dev destino) para no reintentarlos en cada archivo
+_pool = None
+_pool_lock = threading.Lock()
+_metodos_descartados = {}
+# Buffer de la copia por bloques de cada hilo del pool: se crea una vez, no en cada tramo o bloque limitado
+_hilo = threading.local()
+
+class CopiaIncompletaError(OSError):
+    """El destino quedó más corto que el origen: p. ej. OneDrive truncó el archivo durante la copia"""
+    pass
+
+# ============================================================================
+# FUNCIONES HELPER PRIVADAS
+# ============================================================================
+
+def _mb(num_bytes):
+    return num_bytes / (1024 * 1024)
+
+def _mb_s(num_bytes, segundos):
+    return _mb(num_bytes) / segundos if segundos > 0 else 0.0
+
+def _obtener_pool():
+    """Pool de hilos acotado por COPY_WORKERS, creado una vez y reutilizado entre ciclos"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=Config.COPY_CONFIG['COPY_WORKERS'],
+                                       thread_name_prefix="copia")
+        return _pool
+
+def _metodos_disponibles():
+    """Métodos de copia en orden de preferencia para esta plataforma"""
+    metodos = []
+    if sys.platform.startswith('linux'):
+        if Config.COPY_CONFIG['COPY_REFLINK']:
+            metodos.append('reflink')
+        if hasattr(os, 'copy_file_range'):
+            metodos.append('copy_file_range')
+        if hasattr(os, 'sendfile'):
+            metodos.append('sendfile')
+    metodos.append('bloques')
+    return metodos
+
+# Cada copiador copia 'cantidad' bytes desde el offset 'inicio' (el mismo en origen y destino).
+# Los offsets son explícitos: los métodos del kernel no mueven la posición de los archivos de Python
+
+def _copiar_reflink(fsrc, fdst, inicio, cantidad):
+    # Clona el archivo completo; solo se usa para copias que empiezan desde cero
+    import fcntl
+    fcntl.ioctl(fdst.fileno(), _FICLONE, fsrc.fileno())
+
+def _copiar_copy_file_range(fsrc, fdst, inicio, cantidad):
+    # Copia dentro del kernel; en el mismo sistema de archivos puede incluso compartir bloques
+    offset, fin = inicio, inicio + cantidad
+    while offset < fin:
+        copiados = os.copy_file_range(fsrc.fileno(), fdst.fileno(), fin - offset, offset, offset)
+        if copiados == 0:
+            break
+        offset += copiados
+
+def _copiar_sendfile(fsrc, fdst, inicio, cantidad):
+    # sendfile escribe en la posición actual del destino
+    os.lseek(fdst.fileno(), inicio, os.SEEK_SET)
+    offset, fin = inicio, inicio + cantidad
+    while offset < fin:
+        copiados = os.sendfile(fdst.fileno(), fsrc.fileno(), offset, fin - offset)
+        if copiados == 0:
+            break
+        offset += copiados
+
+def _buffer_del_hilo():
+    """Buffer de COPY_CHUNK_SIZE_MB del hilo actual; se vuelve a crear solo si el tamaño cambió (recarga)"""
+    tamano = int(Config.COPY_CONFIG['COPY_CHUNK_SIZE_MB'] * 1024 * 1024)
+    buffer = getattr(_hilo, 'buffer', None)
+    if buffer is None or len(buffer) != tamano:
+        buffer = _hilo.buffer = bytearray(tamano)
+    return buffer
+
+def _copiar_bloques(fsrc, fdst, inicio, cantidad):
+    # Respaldo portable: el buffer del hilo se reutiliza entre bloques, tramos y archivos
+    buffer = _buffer_del_hilo()
+    vista = memoryview(buffer)
+    fsrc.seek(inicio)
+    fdst.seek(inicio)
+    restante = cantidad
+    while restante > 0:
+        leidos = fsrc.readinto(vista[:min(len(buffer), restante)])
+        if not leidos:
+            break
+        fdst.write(vista[:leidos])
+        restante -= leidos
+    fdst.flush()
+
+_COPIADORES = {
+    'reflink': _copiar_reflink,
+    'copy_file_range': _copiar_copy_file_range,
+    'sendfile': _copiar_sendfile,
+    'bloques': _copiar_bloques,
+}
+
+def _copiar_limitado(metodo, fsrc, fdst, inicio, cantidad):
+    """Con IO_MAX_MB_S, copia en bloques de COPY_CHUNK_SIZE_MB y espera su turno antes de cada uno"""
+    if not Config.COPY_CONFIG['IO_MAX_MB_S']:
+        _COPIADORES[metodo](fsrc, fdst, inicio, cantidad)
+        return
+    bloque = Config.COPY_CONFIG['COPY_CHUNK_SIZE_MB'] * 1024 * 1024
+    for offset in range(inicio, inicio + cantidad, bloque):
+        n = min(bloque, inicio + cantidad - offset)
+        limitar(n, 'copia')
+        _COPIADORES[metodo](fsrc, fdst, offset, n)
+
+def _copiar_datos(src, dst, size, dispositivos, desde=0, tramo=0, al_confirmar=None):
+    """
+    Copia el contenido con el mejor método disponible; retorna el método usado.
+    Con 'desde' continúa un dst parcial a partir de ese offset. Con 'tramo' copia en tramos de ese
+    tamaño y, tras fsync de cada uno, llama a al_confirmar(offset) con lo que ya está en disco.
+    """
+    descartados = _metodos_descartados.setdefault(dispositivos, set())
+    confirmado = desde
+    with open(src, 'rb') as fsrc, open(dst, 'r+b' if desde else 'wb') as fdst:
+        for metodo in _metodos_disponibles():
+            if metodo in descartados or (metodo == 'reflink' and confirmado):
+                continue
+            try:
+                # Lo que pasó del último offset confirmado se descarta y se vuelve a copiar
+                fdst.truncate(confirmado)
+                if metodo == 'reflink':
+                    _copiar_reflink(fsrc, fdst, 0, size)
+                else:
+                    offset = confirmado
+                    while offset < size:
+                        cantidad = min(tramo, size - offset) if tramo else size - offset
+                        _copiar_limitado(metodo, fsrc, fdst, offset, cantidad)
+                        offset += cantidad
+                        if al_confirmar and offset < size:
+                            os.fsync(fdst.fileno())
+                            confirmado = offset
+                            al_confirmar(confirmado)
+                fdst.flush()
+                if os.fstat(fdst.fileno()).st_size != size:
+                    raise CopiaIncompletaError(errno.EIO, f"Copia incompleta con {metodo}: "
+                                                          f"{os.fstat(fdst.fileno()).st_size} de {size} bytes")
+                return metodo
+            except CopiaIncompletaError:
+                # Si el origen cambió de tamaño falla este archivo, no el método
+                if metodo == 'bloques' or os.fstat(fsrc.fileno()).st_size != size:
+                    raise
+                # Algunos sistemas de archivos devuelven 0 bytes sin error: se sigue con el siguiente
+                # método solo para este archivo, sin descartarlo para el par de dispositivos
+                continue
+            except OSError as e:
+                if metodo == 'bloques' or e.errno not in _ERRORES_NO_SOPORTADO:
+                    raise
+                # No soportado en este par de sistemas de archivos: descartar y seguir desde lo confirmado
+                descartados.add(metodo)
+    raise OSError(f"Sin método de copia disponible para {src}")
+
+def _offset_reanudable(src, st, dst, parcial):
+    """Offset desde el que puede continuar la copia interrumpida hacia dst (0 = desde el inicio)"""
+    pendiente = copia_pendiente(dst)
+    if pendiente is None:
+        return 0
+    try:
+        tamano_parcial = os.path.getsize(parcial)
+    except OSError:
+        tamano_parcial = -1
+    # Solo si el origen es la misma versión y el .part conserva al menos lo confirmado
+    if (pendiente['origen'] == src and pendiente['tamano'] == st.st_size
+            and pendiente['mtime_ns'] == st.st_mtime_ns and tamano_parcial >= pendiente['confirmado']):
+        return pendiente['confirmado']
+    finalizar_copia(dst)
+    return 0
+
+# ============================================================================
+# FUNCIONES PRINCIPALES
+# ============================================================================
+
+def copiar_archivo(src, dst):
+    """
+    Copia un archivo con el método más rápido disponible y conserva sus metadatos (como copy2).
+    Escribe primero a un .part y lo renombra al final: el destino nunca queda a medias.
+    Los archivos de más de COPY_CHECKPOINT_MB registran su avance en el diario de estado: si la
+    copia se interrumpe (error o caída del daemon), el siguiente intento continúa desde el último
+    offset confirmado en disco en lugar de empezar de nuevo.
+    Returns:
+        dict: 'archivo', 'bytes' (copiados en este intento), 'segundos', 'mb_s', 'metodo',
+              'reanudado' (offset inicial) y 'limitado' (segundos de espera por IO_MAX_MB_S)
+    """
+    inicio = time.perf_counter()
+    espera_inicial = espera_del_hilo()
+    parcial = dst + SUFIJO_PARCIAL
+    st = os.stat(src)
+    size = st.st_size
+    dispositivos = (st.st_dev, os.stat(os.path.dirname(dst) or '.').st_dev)
+    tramo = Config.COPY_CONFIG['COPY_CHECKPOINT_MB'] * 1024 * 1024
+    reanudable = bool(tramo) and size > tramo
+    desde = _offset_reanudable(src, st, dst, parcial) if reanudable else 0
+    if desde:
+        log(f"Reanudando copia de {os.path.basename(src)} desde {_mb(desde):.1f} MB de {_mb(size):.1f} MB")
+        incrementar('copia_reanudada_bytes_total', desde)
+    try:
+        # Prioridad de E/S de segundo plano: la lectura de VLC del mismo disco pasa primero
+        with prioridad_baja():
+            metodo = _copiar_datos(src, parcial, size, dispositivos, desde, tramo if reanudable else 0,
+                                   (lambda offset: registrar_copia(dst, src, st, offset)) if reanudable else None)
+        shutil.copystat(src, parcial)
+        os.replace(parcial, dst)
+    except Exception:
+        # Un .part con avance confirmado se conserva para reanudar; el resto no sirve
+        if not (reanudable and copia_pendiente(dst)) and os.path.exists(parcial):
+            try:
+                os.remove(parcial)
+            except OSError:
+                pass
+        raise
+    if reanudable:
+        finalizar_copia(dst)
+    segundos = time.perf_counter() - inicio
+    return {
+        'archivo': os.path.basename(dst),
+        'bytes': size - desde,
+        'segundos': segundos,
+        'mb_s': _mb_s(size - desde, segundos),
+        'metodo': metodo,
+        'reanudado': desde,
+        'limitado': espera_del_hilo() - espera_inicial
+    }
+
+def depurar_copias_interrumpidas():
+    """
+    Revisa las copias interrumpidas del diario: las que aún pueden continuar (el .part existe y el
+    origen no cambió) se conservan; las demás se olvidan y su .part se elimina.
+    Returns:
+        set: Rutas .part que se conservan para reanudar
+    """
+    conservados = set()
+    for destino, pendiente in copias_pendientes().items():
+        parcial = destino + SUFIJO_PARCIAL
+        try:
+            st = os.stat(pendiente['origen'])
+            vigente = (st.st_size == pendiente['tamano'] and st.st_mtime_ns == pendiente['mtime_ns']
+                       and os.path.getsize(parcial) >= pendiente['confirmado'])
+        except OSError:
+            vigente = False
+        if vigente:
+            conservados.add(parcial)
+            continue
+        finalizar_copia(destino)
+        if os.path.exists(parcial):
+            try:
+                os.remove(parcial)
+            except OSError:
+                pass
+    return conservados
+
+def copiar_lote(pares, nombres=None):
+    """
+    Copia varios archivos en paralelo usando el pool de COPY_WORKERS hilos.
+    Args:
+        pares (list): Tuplas (src, dst)
+        nombres (list): Nombre de cada par para resultados y log (por defecto, el nombre de dst)
+    Returns:
+        dict: 'resultados' (por archivo), 'fallidos' (nombre -> error),
+              'bytes', 'segundos', 'mb_s' y 'limitado' (espera por IO_MAX_MB_S, suma de los hilos) del lote
+    """
+    resumen = {'resultados': [], 'fallidos': {}, 'bytes': 0, 'segundos': 0.0, 'mb_s': 0.0, 'limitado': 0.0}
+    if not pares:
+        return resumen
+
+    inicio = time.perf_counter()
+    pool = _obtener_pool()
+    nombres = nombres or [os.path.basename(dst) for _, dst in pares]
+    futuros = {pool.submit(copiar_archivo, src, dst): nombre for (src, dst), nombre in zip(pares, nombres)}
+    for futuro in as_completed(futuros):
+        nombre = futuros[futuro]
+        try:
+            resultado = futuro.result()
+            resultado['archivo'] = nombre
+            resumen['resultados'].append(resultado)
+            resumen['bytes'] += resultado['bytes']
+            resumen['limitado'] += resultado['limitado']
+            reanudado = f", reanudado desde {_mb(resultado['reanudado']):.1f} MB" if resultado['reanudado'] else ''
+            log(f"Archivo copiado: {nombre} ({_mb(resultado['bytes']):.1f} MB en {resultado['segundos']:.2f} s, "
+                f"{resultado['mb_s']:.1f} MB/s, {resultado['metodo']}{reanudado})")
+        except Exception as e:
+            resumen['fallidos'][nombre] = e
+            log(f"ERROR al copiar {nombre}: {e}")
+
+    resumen['segundos'] = time.perf_counter() - inicio
+    resumen['mb_s'] = _mb_s(resumen['bytes'], resumen['segundos'])
+    incrementar('copia_bytes_total', resumen['bytes'])
+    incrementar('copia_archivos_total', len(resumen['resultados']), resultado='ok')
+    incrementar('copia_archivos_total', len(resumen['fallidos']), resultado='error')
+    if resumen['bytes']:
+        fijar('copia_mb_s', round(resumen['mb_s'], 3))
+    limitado = (f", {resumen['limitado']:.1f} s de espera por el límite de {Config.COPY_CONFIG['IO_MAX_MB_S']} MB/s"
+                if resumen['limitado'] else '')
+    log(f"Copia finalizada: {len(resumen['resultados'])} archivos, {_mb(resumen['bytes']):.1f} MB en "
+        f"{resumen['segundos']:.2f} s ({resumen['mb_s']:.1f} MB/s), {len(resumen['fallidos'])} con error{limitado}")
+    return resumen
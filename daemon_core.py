@@ -0,0 +1,583 @@
+import os
+import time
+import asyncio
+import signal
+import threading
+from config import Config
+from logging_utils import log, publicar_log, actualizar_nivel
+from config_utils import recargar_config
+from vlc_utils import ReproductorVLC, SupervisorVLC, SondaReproduccion, adoptar_vlc_huerfano, validar_playlist
+from file_utils import validar_dir
+from manifest_utils import cargar_manifiesto, actualizar_manifiesto, guardar_manifiesto, hay_cambios
+from sync_utils import estimular_onedrive, guardar_cache_huellas, FileAccessError
+from watcher_utils import VigilanteContenido
+from stability_utils import RastreadorEstabilidad
+from staging_utils import (construir_generacion, validar_generacion, descartar_generacion,
+                           activar_generacion, revertir_generacion)
+from retry_utils import PlanificadorReintentos
+from journal_utils import intencion, cerrar_diario
+from mp4_utils import detener_faststart
+from io_utils import resumen_limitacion
+from metrics_utils import (medir_fase, incrementar, fijar, escribir_estado, publicar_estado, marcar_arranque,
+                           etapas_arranque, iniciar_servidor_metricas, detener_servidor_metricas)
+
+# Máximo que una tarea queda bloqueada en un hilo esperando al vigilante (segundos).
+# Acota la latencia de la detención limpia sin generar carga perceptible.
+ESPERA_MAXIMA_VIGILANTE = 1
+
+class DaemonMediaSync:
+    """
+    Núcleo asyncio del daemon. Por cada pantalla (perfil de SCREEN_PROFILES, o una sola en el
+    modo clásico) corren tareas independientes que se comunican por colas:
+
+        vigilante de contenido --(cola_staging)--> pipeline de staging --(cola_onedrive)--> estimulador OneDrive
+        arranque rápido: vuelve a reproducir la última generación mientras el primer ciclo revisa VIDEO_DIR
+        supervisor de VLC: ciclo de vida de SupervisorVLC (espera de proceso en su propio hilo)
+        salud de VLC: SondaReproduccion (posición que no avanza -> saltar -> reiniciar)
+
+    y dos tareas del proceso: una reescribe el archivo de estado JSON cada STATUS_INTERVAL y
+    otra aplica los cambios de la configuración externa (CONFIG_FILE) sin reiniciar nada.
+    Las pantallas comparten el almacén de contenido (STORE_DIR): un clip que está en varias
+    carpetas se copia una sola vez.
+
+    El trabajo bloqueante (E/S de archivos, PowerShell, HTTP a VLC) corre en hilos vía
+    run_in_executor, así que una pasada lenta de OneDrive nunca retrasa la detección de
+    cambios ni la recuperación de VLC. Todas comparten una única ruta de detención.
+    """
+
+    def __init__(self, perfiles=None, medir_arranque=False):
+        self.status_interval = Config.METRICS_CONFIG['STATUS_INTERVAL']
+        self.pantallas = [PantallaMediaSync(self, perfil) for perfil in (perfiles or Config.perfiles())]
+        self.codigo_salida = 0
+        # Modo de medición: se detiene tras el primer ciclo de todas las pantallas
+        self.medir_arranque = medir_arranque
+        self._sin_primer_ciclo = {p.nombre for p in self.pantallas}
+
+        # Se crean dentro del loop en ejecutar()
+        self._loop = None
+        self._detener = None
+
+    # ------------------------------------------------------------------------
+    # CICLO DE VIDA
+    # ------------------------------------------------------------------------
+
+    async def ejecutar(self):
+        """Arranca todas las tareas y espera la señal de detención. Retorna el código de salida"""
+        self._loop = asyncio.get_running_loop()
+        self._detener = asyncio.Event()
+        self._instalar_senales()
+
+        log("---- Inicio del MediaSync Daemon ----")
+        if len(self.pantallas) > 1:
+            log(f"Modo multipantalla: {', '.join(p.nombre for p in self.pantallas)}")
+        fijar('inicio_timestamp_segundos', round(time.time(), 3))
+
+        # Adoptar o detener instancias previas de VLC (única exploración completa de procesos)
+        await self._en_hilo(adoptar_vlc_huerfano, [p.vlc for p in self.pantallas])
+        marcar_arranque('adopcion_vlc')
+
+        # Cada pantalla vuelve a reproducir su última generación mientras su primer ciclo revisa VIDEO_DIR
+        tareas = []
+        for pantalla in self.pantallas:
+            tareas += pantalla.iniciar()
+        tareas += [self._crear_tarea("estado", self._tarea_estado),
+                   self._crear_tarea("config", self._tarea_config)]
+        # Después de lanzar las pantallas: el endpoint no debe retrasar la primera imagen
+        iniciar_servidor_metricas()
+
+        await self._detener.wait()
+        log("Deteniendo MediaSync Daemon...")
+        for tarea in tareas:
+            tarea.cancel()
+        await asyncio.gather(*tareas, return_exceptions=True)
+        for pantalla in self.pantallas:
+            pantalla.vigilante.detener()
+        detener_servidor_metricas()
+        escribir_estado()
+        publicar_estado(forzar=True)
+        await self._en_hilo(detener_faststart)
+        cerrar_diario()
+        log(f"---- MediaSync Daemon detenido (código {self.codigo_salida}) ----")
+        return self.codigo_salida
+
+    def solicitar_detencion(self, codigo=0):
+        """Punto único de detención; seguro de llamar desde cualquier tarea o manejador de señal"""
+        if codigo and not self.codigo_salida:
+            self.codigo_salida = codigo
+        self._detener.set()
+
+    def _instalar_senales(self):
+        for nombre in ('SIGINT', 'SIGTERM', 'SIGBREAK'):
+            sig = getattr(signal, nombre, None)
+            if sig is None:
+                continue
+            try:
+                self._loop.add_signal_handler(sig, self.solicitar_detencion)
+            except (NotImplementedError, RuntimeError):
+                # Windows: sin add_signal_handler, se redirige la señal al loop
+                signal.signal(sig, lambda *_: self._loop.call_soon_threadsafe(self.solicitar_detencion))
+
+    def _crear_tarea(self, nombre, fabrica):
+        """Crea una tarea que se relanza con backoff (desde ERROR_RETRY_DELAY) si falla de forma inesperada"""
+        reintentos = PlanificadorReintentos(f"tarea {nombre}")
+        async def _protegida():
+            while True:
+                inicio = self._loop.time()
+                try:
+                    await fabrica()
+                    return
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    log(f"ERROR: Excepción inesperada en la tarea {nombre} - {e}")
+                    # Una tarea que funcionó más que la espera máxima no arrastra el backoff de fallos viejos
+                    if self._loop.time() - inicio >= reintentos.maximo:
+                        reintentos.registrar_exito()
+                    await asyncio.sleep(reintentos.registrar_fallo(e))
+        return asyncio.ensure_future(_protegida())
+
+    async def _en_hilo(self, funcion, *args):
+        return await self._loop.run_in_executor(None, funcion, *args)
+
+    def fin_primer_ciclo(self, pantalla):
+        """Al terminar el primer ciclo de todas las pantallas se reporta el arranque (y en modo medición se detiene)"""
+        if pantalla.nombre not in self._sin_primer_ciclo:
+            return
+        self._sin_primer_ciclo.discard(pantalla.nombre)
+        if self._sin_primer_ciclo:
+            return
+        log("Tiempos de arranque (segundos desde el inicio del proceso):")
+        for etiquetas, segundos in etapas_arranque():
+            detalle = f" ({etiquetas['pantalla']})" if 'pantalla' in etiquetas else ''
+            log(f"  {segundos:8.3f}  {etiquetas['etapa']}{detalle}")
+        if self.medir_arranque:
+            log("Medición de arranque terminada; detalle por módulo importado: python -X importtime MediaSync-Daemon.py")
+            self.solicitar_detencion()
+
+    # ------------------------------------------------------------------------
+    # TAREA: ARCHIVO DE ESTADO (PROCESO)
+    # ------------------------------------------------------------------------
+
+    async def _tarea_estado(self):
+        """
+        Reescribe el archivo de estado JSON cada STATUS_INTERVAL (el staging también lo escribe al terminar)
+        y publica el log pendiente y el estado aunque no haya ciclos de staging.
+        """
+        while True:
+            await asyncio.sleep(self.status_interval)
+            await self._en_hilo(escribir_estado)
+            await self._en_hilo(publicar_log)
+            await self._en_hilo(publicar_estado)
+
+    # ------------------------------------------------------------------------
+    # TAREA: CONFIGURACIÓN EXTERNA (PROCESO)
+    # ------------------------------------------------------------------------
+
+    async def _tarea_config(self):
+        """Revisa CONFIG_FILE cada CONFIG_POLL_INTERVAL y reaplica solo las claves que cambiaron"""
+        while True:
+            await asyncio.sleep(Config.SYNC_CONFIG['CONFIG_POLL_INTERVAL'])
+            cambios = await self._en_hilo(recargar_config)
+            if cambios:
+                self.aplicar_config(cambios)
+
+    def aplicar_config(self, cambios):
+        """Lleva a los objetos en ejecución los valores que copiaron al crearse"""
+        if 'LOG_CONFIG.LOG_LEVEL' in cambios:
+            actualizar_nivel()
+        self.status_interval = Config.METRICS_CONFIG['STATUS_INTERVAL']
+        for pantalla in self.pantallas:
+            pantalla.aplicar_config(cambios)
+
+# ============================================================================
+# PANTALLA (UN PERFIL DE SCREEN_PROFILES)
+# ============================================================================
+
+class PantallaMediaSync:
+    """
+    Una pantalla: su carpeta de origen, sus generaciones de staging, su manifiesto y su VLC.
+    Sus tareas corren en el loop del DaemonMediaSync y usan su ruta de detención.
+    """
+
+    def __init__(self, daemon, perfil):
+        self.daemon = daemon
+        self.nombre = perfil['NOMBRE']
+        self.video_dir = perfil['VIDEO_DIR']
+        self.temp_video_dir = perfil['TEMP_VIDEO_DIR']
+        self.playlist_path = perfil['PLAYLIST_PATH']
+        self.manifest_file = perfil['MANIFEST_FILE']
+        self.flag_file = perfil['FLAG_FILE']
+        self.sondeo_min = Config.SYNC_CONFIG['STABILITY_POLL_MIN']
+        self.sondeo_max = Config.SYNC_CONFIG['STABILITY_POLL_MAX']
+        self.cycle_delay = Config.SYNC_CONFIG['REFRESH_CYCLE_DELAY']
+
+        self.vigilante = VigilanteContenido(self.video_dir)
+        self.vlc = ReproductorVLC.desde_perfil(perfil)
+        self.supervisor = SupervisorVLC(self.vlc)
+        self.sonda = SondaReproduccion(self.vlc)
+        self.estabilidad = RastreadorEstabilidad()
+        # Revisión programada de archivos que aún no se estabilizan (asyncio.TimerHandle)
+        self._revision_estabilidad = None
+        # Espera actual (backoff) para revisar de nuevo si OneDrive tiene archivos pendientes
+        self._espera_onedrive = None
+        # Manifiesto del último contenido publicado
+        self.manifiesto = cargar_manifiesto(self.manifest_file)
+        # Una generación a medias al detenerse: el primer ciclo la rehace sin repetir lo ya copiado
+        pendiente = intencion(self.temp_video_dir)
+        if pendiente and pendiente['estado'] == 'construyendo':
+            log(f"La generación {pendiente['generacion']} de {self.nombre} quedó a medias "
+                f"({len(pendiente['archivos'])} archivo(s) por copiar): lo que ya está en el almacén "
+                f"se reutiliza y las copias parciales se reanudan")
+        # Ciclos sin contenido válido: backoff con jitter y circuito en lugar de detener el daemon
+        self.reintentos = PlanificadorReintentos(f"contenido {self.nombre}")
+        # Se marca al terminar el arranque rápido: hasta entonces el staging no toca VLC
+        self._arranque_listo = threading.Event()
+
+        # Se crean dentro del loop en iniciar()
+        self._loop = None
+        self.cola_staging = None
+        self.cola_onedrive = None
+
+    def iniciar(self):
+        """Arranca el vigilante y las tareas de la pantalla (dentro del loop). Retorna las tareas"""
+        self._loop = asyncio.get_running_loop()
+        # cola_staging: set de nombres cambiados o None (= revisar todo VIDEO_DIR)
+        self.cola_staging = asyncio.Queue()
+        # cola_onedrive: lista de archivos válidos tras cada ciclo de staging
+        self.cola_onedrive = asyncio.Queue()
+        self.vigilante.iniciar()
+
+        # Primer ciclo: revisión completa
+        self.cola_staging.put_nowait(None)
+
+        sufijo = '' if self.nombre == 'principal' else f" {self.nombre}"
+        return [
+            self.daemon._crear_tarea("arranque" + sufijo, self._tarea_arranque),
+            self.daemon._crear_tarea("vigilante" + sufijo, self._tarea_vigilante),
+            self.daemon._crear_tarea("staging" + sufijo, self._tarea_staging),
+            self.daemon._crear_tarea("supervisor-vlc" + sufijo, self._tarea_supervisor_vlc),
+            self.daemon._crear_tarea("salud-vlc" + sufijo, self._tarea_salud_vlc),
+            self.daemon._crear_tarea("onedrive" + sufijo, self._tarea_onedrive),
+        ]
+
+    def _programar_refresco(self, retraso, cambios=None):
+        """Encola una revisión para dentro de 'retraso' segundos"""
+        return self._loop.call_later(retraso, self.cola_staging.put_nowait, cambios)
+
+    def _programar_revision_estabilidad(self):
+        """Una sola revisión pendiente de los archivos que aún están llegando, solo de esos archivos"""
+        if self._revision_estabilidad is not None:
+            self._revision_estabilidad.cancel()
+            self._revision_estabilidad = None
+        espera = self.estabilidad.proxima_revision()
+        if espera is not None:
+            self._revision_estabilidad = self._programar_refresco(espera, self.estabilidad.pendientes())
+
+    async def _en_hilo(self, funcion, *args):
+        return await self.daemon._en_hilo(funcion, *args)
+
+    def aplicar_config(self, cambios):
+        """Valores recargados de la configuración externa; los que cambian qué se publica fuerzan una revisión completa"""
+        sync = Config.SYNC_CONFIG
+        self.cycle_delay = sync['REFRESH_CYCLE_DELAY']
+        self.sondeo_min, self.sondeo_max = sync['STABILITY_POLL_MIN'], sync['STABILITY_POLL_MAX']
+        self.estabilidad.ventana = sync['STABILITY_WINDOW']
+        self.estabilidad.sondeo_min, self.estabilidad.sondeo_max = self.sondeo_min, self.sondeo_max
+        self.vigilante.debounce = sync['WATCHER_DEBOUNCE']
+        self.reintentos.base, self.reintentos.maximo = sync['ERROR_RETRY_DELAY'], sync['RETRY_MAX_DELAY']
+        self.reintentos.jitter, self.reintentos.umbral = sync['RETRY_JITTER'], sync['MAX_CONSECUTIVE_ERRORS']
+        if cambios & {'VIDEO_CONFIG.FORMATOS_DE_VIDEO_ADMITIDOS', 'VIDEO_CONFIG.MAX_FILE_SIZE_MB',
+                      'VIDEO_CONFIG.MP4_STRUCTURE_CHECK', 'SYNC_CONFIG.MANIFEST_FINGERPRINT'}:
+            log(f"Reglas de contenido modificadas, revisando {self.video_dir}")
+            self.cola_staging.put_nowait(None)
+
+    # ------------------------------------------------------------------------
+    # TAREA: ARRANQUE RÁPIDO
+    # ------------------------------------------------------------------------
+
+    async def _tarea_arranque(self):
+        """La pantalla vuelve a mostrar su última generación sin esperar el escaneo de VIDEO_DIR"""
+        await self._en_hilo(self._arranque_rapido)
+
+    def _arranque_rapido(self):
+        try:
+            if self.vlc.activo():
+                # VLC adoptado de la ejecución anterior: la pantalla nunca se apagó
+                marcar_arranque('vlc_reproduciendo', pantalla=self.nombre)
+            elif (not os.path.exists(self.flag_file) and os.path.exists(self.playlist_path)
+                    and validar_playlist(self.playlist_path)):
+                log(f"Reproduciendo la última generación de {self.nombre} mientras se revisa {self.video_dir}")
+                if self.vlc.iniciar():
+                    marcar_arranque('vlc_reproduciendo', pantalla=self.nombre)
+        finally:
+            self._arranque_listo.set()
+
+    # ------------------------------------------------------------------------
+    # TAREA: VIGILANTE DE CONTENIDO
+    # ------------------------------------------------------------------------
+
+    async def _tarea_vigilante(self):
+        """Traduce los cambios del vigilante (y una revisión completa por ciclo) en solicitudes de staging"""
+        ultima_revision = self._loop.time()
+        while True:
+            if await self._en_hilo(self.vigilante.esperar_cambio, ESPERA_MAXIMA_VIGILANTE):
+                cambios = self.vigilante.obtener_cambios()
+                detalle = ', '.join(sorted(cambios)) if cambios else 'sin detalle'
+                log(f"INFO: Cambios detectados en {self.video_dir} por {self.vigilante.backend} ({detalle}), "
+                    f"iniciando refresco")
+                await self.cola_staging.put(cambios)
+                ultima_revision = self._loop.time()
+            elif self._loop.time() - ultima_revision >= self.cycle_delay:
+                # Red de seguridad: revisión completa cada REFRESH_CYCLE_DELAY aunque no haya eventos
+                await self.cola_staging.put(None)
+                ultima_revision = self._loop.time()
+
+    # ------------------------------------------------------------------------
+    # TAREA: PIPELINE DE STAGING
+    # ------------------------------------------------------------------------
+
+    async def _tarea_staging(self):
+        while True:
+            cambios = await self.cola_staging.get()
+            # Agrupar las solicitudes acumuladas mientras el ciclo anterior trabajaba
+            while not self.cola_staging.empty():
+                otra = self.cola_staging.get_nowait()
+                cambios = None if cambios is None or otra is None else cambios | otra
+
+            limitacion = resumen_limitacion()
+            with medir_fase('ciclo', pantalla=self.nombre):
+                media_content, publicado = await self._en_hilo(self._ciclo_staging, cambios)
+            self._reportar_limitacion(limitacion)
+            marcar_arranque('primer_ciclo', pantalla=self.nombre)
+            self.daemon.fin_primer_ciclo(self)
+            self._programar_revision_estabilidad()
+            # Segmento de log y estado a la carpeta compartida: como máximo uno por LOG_PUSH_INTERVAL
+            await self._en_hilo(publicar_log)
+            await self._en_hilo(publicar_estado)
+
+            if media_content:
+                self.reintentos.registrar_exito()
+                self._publicar_estado_reintentos()
+                await self._en_hilo(escribir_estado)
+                # Solo se estimula OneDrive tras publicar cambios; el resto lo cubre su ciclo periódico
+                if publicado:
+                    await self.cola_onedrive.put(media_content)
+                continue
+
+            # MIENTRAS EN VIDEO_DIR NO HAY ALMENOS 1 FICHERO VALIDO
+            # YA NO SE DETIENE EL DAEMON: SE SIGUE REPRODUCIENDO EL ÚLTIMO CONTENIDO VÁLIDO Y SE REINTENTA
+            espera = self.reintentos.registrar_fallo(f"Sin contenido válido en {self.video_dir}")
+            self._publicar_estado_reintentos()
+            await self._en_hilo(escribir_estado)
+            await self._en_hilo(self._mantener_ultimo_contenido)
+            log(f"Intento fallido {self.reintentos.fallos} sin contenido válido "
+                f"(circuito {self.reintentos.estado_circuito}). Reintentando en {espera:.1f} segundos...")
+            # Estimular OneDrive y reintentar; si aparece contenido antes, el vigilante adelanta el ciclo
+            await self.cola_onedrive.put([])
+            self._programar_refresco(espera)
+
+    def _reportar_limitacion(self, anterior):
+        """Espera por IO_MAX_MB_S durante el ciclo (copias y huellas; incluye otras pantallas que trabajen a la vez)"""
+        actual = resumen_limitacion()
+        detalle, total = [], 0.0
+        for trabajo, valores in sorted(actual.items()):
+            previo = anterior.get(trabajo, {'bytes': 0, 'espera': 0.0})
+            espera = valores['espera'] - previo['espera']
+            if espera > 0:
+                total += espera
+                detalle.append(f"{trabajo} {espera:.1f} s ({(valores['bytes'] - previo['bytes']) / (1024 * 1024):.1f} MB)")
+        fijar('ciclo_limitacion_segundos', round(total, 3), pantalla=self.nombre)
+        if detalle:
+            log(f"Límite de E/S de {Config.COPY_CONFIG['IO_MAX_MB_S']} MB/s en el ciclo de {self.nombre}: "
+                f"{', '.join(detalle)} de espera")
+
+    def _publicar_estado_reintentos(self):
+        estado = self.reintentos.estado()
+        fijar('errores_consecutivos', estado['fallos_consecutivos'], pantalla=self.nombre)
+        fijar('circuito_abierto', 0 if estado['estado'] == 'cerrado' else 1, circuito=estado['nombre'])
+        fijar('reintento_espera_segundos', estado['espera'], circuito=estado['nombre'])
+
+    def _mantener_ultimo_contenido(self):
+        """Sin contenido nuevo, VLC sigue (o vuelve a) reproducir la última generación publicada"""
+        self._arranque_listo.wait()
+        if (not os.path.exists(self.flag_file) and os.path.exists(self.playlist_path)
+                and validar_playlist(self.playlist_path)):
+            log(f"Reproduciendo el último contenido válido de {self.nombre} mientras se reintenta")
+            self.vlc.iniciar()
+
+    def _ciclo_staging(self, cambios):
+        """
+        Un ciclo de staging (bloqueante, corre en un hilo).
+        Solo se publican los archivos que el RastreadorEstabilidad da por terminados; el resto
+        queda fuera del manifiesto y entra en una revisión posterior.
+        Returns:
+            tuple: (archivos válidos o [] si no hay contenido válido, True si se publicaron cambios)
+        """
+        try:
+            with medir_fase('escaneo', pantalla=self.nombre):
+                media_content = validar_dir(self.video_dir)
+        except OSError as e:
+            log(f"ERROR: Acceso a archivo denegado - {str(e)}")
+            incrementar('ciclos_total', resultado='error_acceso', pantalla=self.nombre)
+            return [], False
+        if not media_content:
+            log(f"WARNING: SIN CONTENIDO VÁLIDO EN {self.video_dir}")
+            incrementar('ciclos_total', resultado='sin_contenido', pantalla=self.nombre)
+            return [], False
+
+        # SOLO SE PUBLICA LO QUE YA TERMINÓ DE LLEGAR; LO DEMÁS ESPERA SIN BLOQUEAR AL RESTO
+        with medir_fase('estabilidad', pantalla=self.nombre):
+            pendientes = self.estabilidad.pendientes()
+            listos, en_espera = self.estabilidad.clasificar(self.video_dir, media_content)
+        fijar('archivos_en_espera', len(en_espera), pantalla=self.nombre)
+        if en_espera:
+            log(f"{len(en_espera)} archivo(s) aún llegando, se publicarán al estabilizarse: "
+                f"{', '.join(en_espera[:10])}{' ...' if len(en_espera) > 10 else ''}")
+
+        # CALCULAR DIFF DEL MANIFIESTO: SI EL VIGILANTE REPORTÓ NOMBRES, SOLO SE REVISAN ESOS
+        # Y LOS QUE EL RASTREADOR ACABA DE DAR POR ESTABLES (PUEDEN LLEGAR CON OTRO EVENTO)
+        if cambios is not None:
+            cambios = set(cambios) | pendientes.intersection(listos)
+        with medir_fase('manifiesto', pantalla=self.nombre):
+            nuevo_manifiesto, diff = actualizar_manifiesto(self.video_dir, self.manifiesto, cambios, incluir=listos)
+        resultado = 'sin_cambios'
+
+        # HAY ALTAS, BAJAS O MODIFICACIONES, O NO EXISTE MANIFIESTO ANTERIOR?
+        publicado = bool(listos) and (hay_cambios(diff) or not os.path.exists(self.manifest_file))
+        if publicado:
+            log(f"CAMBIOS DETECTADOS: {len(listos)} archivos listos encontrados en {self.video_dir} "
+                f"({len(diff['agregados'])} nuevos, {len(diff['modificados'])} modificados, "
+                f"{len(diff['eliminados'])} eliminados)")
+
+            # CONSTRUIR LA NUEVA GENERACIÓN MIENTRAS VLC SIGUE REPRODUCIENDO LA ACTIVA
+            # LO QUE NO CAMBIÓ SE ENLAZA (HARDLINK), SOLO SE COPIA LO NUEVO/MODIFICADO
+            generacion = construir_generacion(listos, self.video_dir, self.temp_video_dir)
+            with medir_fase('validacion', pantalla=self.nombre):
+                valida = validar_generacion(generacion)
+            if not valida:
+                log(f"WARNING: La generación {generacion['nombre']} no es válida, se descarta "
+                    f"y se mantiene la activa")
+                descartar_generacion(generacion, self.temp_video_dir)
+                incrementar('ciclos_total', resultado='generacion_invalida', pantalla=self.nombre)
+                return media_content, False
+
+            # SI VLC ESTÁ REPRODUCIENDO Y ACEPTA CONTROL HTTP, SE ACTUALIZA EN CALIENTE (SIN PANTALLA NEGRA)
+            # SI NO, SE DETIENE VLC SOLO PARA EL CAMBIO DE GENERACIÓN (LA COPIA YA TERMINÓ)
+            self._arranque_listo.wait()
+            with medir_fase('activacion', pantalla=self.nombre):
+                en_caliente = os.path.exists(self.flag_file) and self.vlc.control_http_disponible()
+                if not en_caliente:
+                    self.vlc.detener()
+
+                # CAMBIO ATÓMICO: PLAYLIST Y PUNTERO DE GENERACIÓN ACTIVA
+                activar_generacion(generacion['nombre'], self.playlist_path, self.temp_video_dir)
+
+                if en_caliente and not self.vlc.actualizar_playlist_en_caliente(self.playlist_path):
+                    log("WARNING: Actualización en caliente fallida, se reinicia VLC con la nueva playlist")
+                    self.vlc.detener()
+            fijar('archivos_publicados', len(generacion['incluidos']), pantalla=self.nombre)
+
+            # Con copias fallidas no se guarda el manifiesto: el siguiente ciclo reintenta solo esas
+            if generacion['fallidos']:
+                log(f"WARNING: {len(generacion['fallidos'])} archivo(s) no se copiaron, "
+                    f"se reintentará en el siguiente ciclo")
+                resultado = 'copia_incompleta'
+            else:
+                resultado = 'publicado'
+                guardar_manifiesto(nuevo_manifiesto, self.manifest_file)
+                guardar_cache_huellas()
+                self.manifiesto = nuevo_manifiesto
+            log("MONITOREO INICIALIZADO...")
+
+        # NO EXISTE FLAG Y PLAYLIST TIENE CONTENIDO
+        self._arranque_listo.wait()
+        if (not os.path.exists(self.flag_file) and os.path.exists(self.playlist_path)
+                and os.path.getsize(self.playlist_path) > 0):
+            # INICIAR VLC CON NUEVO CONTENIDO Y CREAR FLAG
+            # SI NO ARRANCA CON LA GENERACIÓN NUEVA, SE VUELVE A LA ANTERIOR SIN COPIAR NADA
+            iniciado = self.vlc.iniciar()
+            if not iniciado and publicado and revertir_generacion(self.playlist_path, self.temp_video_dir):
+                # El manifiesto vacío obliga a reconstruir la generación en el siguiente ciclo
+                self.manifiesto = {}
+                iniciado = self.vlc.iniciar()
+            if iniciado:
+                marcar_arranque('vlc_reproduciendo', pantalla=self.nombre)
+
+        incrementar('ciclos_total', resultado=resultado, pantalla=self.nombre)
+        if resultado != 'copia_incompleta':
+            fijar('ultima_sincronizacion_timestamp_segundos', round(time.time(), 3), pantalla=self.nombre)
+        return media_content, publicado
+
+    # ------------------------------------------------------------------------
+    # TAREA: SUPERVISOR DE VLC
+    # ------------------------------------------------------------------------
+
+    async def _tarea_supervisor_vlc(self):
+        """
+        Ciclo de vida del SupervisorVLC. La espera de salida del proceso queda en el hilo
+        propio del supervisor (waitpid / WaitForSingleObject): un hilo del executor bloqueado
+        indefinidamente impediría la detención limpia del loop.
+        """
+        self.supervisor.iniciar()
+        try:
+            await self.daemon._detener.wait()
+        finally:
+            self.supervisor.detener()
+
+    # ------------------------------------------------------------------------
+    # TAREA: SONDA DE REPRODUCCIÓN
+    # ------------------------------------------------------------------------
+
+    async def _tarea_salud_vlc(self):
+        """Una muestra de la SondaReproduccion cada VLC_HEALTH_INTERVAL segundos (0 = deshabilitada)"""
+        while True:
+            intervalo = Config.VLC_CONFIG['VLC_HEALTH_INTERVAL']
+            if intervalo > 0:
+                await self._en_hilo(self.sonda.revisar)
+            # Deshabilitada: se vuelve a mirar la configuración (puede recargarse) cada 30 segundos
+            await asyncio.sleep(intervalo if intervalo > 0 else 30)
+
+    # ------------------------------------------------------------------------
+    # TAREA: ESTIMULADOR DE ONEDRIVE
+    # ------------------------------------------------------------------------
+
+    async def _tarea_onedrive(self):
+        """
+        Estimula OneDrive tras cada staging y, sin actividad, una vez por REFRESH_CYCLE_DELAY.
+        Con archivos pendientes vuelve a revisar con backoff (STABILITY_POLL_MIN a STABILITY_POLL_MAX)
+        en lugar de una espera fija de descarga.
+        """
+        while True:
+            try:
+                media_content = await asyncio.wait_for(self.cola_onedrive.get(),
+                                                       timeout=self._espera_onedrive or self.cycle_delay)
+            except asyncio.TimeoutError:
+                # Sin staging reciente la última lista puede estar desactualizada (archivos renombrados
+                # o eliminados): se vuelve a escanear, con stats propios para no pisar los del staging
+                try:
+                    media_content = await self._en_hilo(validar_dir, self.video_dir, {})
+                except OSError as e:
+                    log(f"ERROR: Acceso a archivo denegado - {str(e)}")
+                    media_content = []
+
+            try:
+                with medir_fase('onedrive', pantalla=self.nombre):
+                    howisdoing = await self._en_hilo(estimular_onedrive, media_content, self.video_dir)
+            except FileAccessError as e:
+                log(f"ERROR: Acceso a archivo denegado - {str(e)}")
+                howisdoing = False
+            fijar('onedrive_pendiente', 0 if howisdoing else 1, pantalla=self.nombre)
+
+            if howisdoing:
+                log("OneDrive está sincronizado.")
+                if self._espera_onedrive is not None:
+                    # Las descargas de OneDrive no siempre generan eventos de nombre/tamaño
+                    # (p. ej. hidratar un archivo en la nube): revisar todo al terminar
+                    self._espera_onedrive = None
+                    self._programar_refresco(0)
+            else:
+                self._espera_onedrive = (self.sondeo_min if self._espera_onedrive is None
+                                         else min(self._espera_onedrive * 2, self.sondeo_max))
+                log(f"WARNING: OneDrive requiere atención - archivos pendientes detectados. "
+                    f"Nueva revisión en {self._espera_onedrive} s.")
+                self._programar_refresco(self._espera_onedrive)
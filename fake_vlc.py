@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+"""
+Sustituto de VLC para pruebas sin pantalla.
+
+Implementa el subconjunto de la interfaz HTTP de VLC que usa vlc_utils
+(/requests/status.json y /requests/playlist.json) y simula el avance de la
+reproducción con el reloj. Acepta los mismos argumentos con los que
+iniciar_vlc() lanza VLC, así que puede apuntarse VLC_EXE a este script
+(con permisos de ejecución) para probar el daemon completo sin VLC:
+
+    python fake_vlc.py playlist.m3u --http-port=8080 --http-password=mediasync
+
+Para probar la sonda de reproducción simula fallos (MODOS_FALLO) al arrancar,
+tras unos segundos o en cualquier momento con el comando fake_congelar:
+
+    python fake_vlc.py playlist.m3u --congelar=imagen --congelar-tras=20
+    /requests/status.json?command=fake_congelar&modo=item   (modo vacío = normal)
+"""
+import base64
+import json
+import os
+import pathlib
+import signal
+import sys
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Duración simulada de cada elemento (segundos)
+DURACION_POR_DEFECTO = 30
+
+# Fallos simulados:
+#   item:    el elemento actual se congela (la posición no avanza); otro elemento reproduce bien
+#   imagen:  todo el reproductor se congela: ningún elemento avanza hasta reiniciarlo
+#   colgado: la interfaz HTTP deja de responder
+#   detenido / vacio: la reproducción se detiene / la cola queda vacía (como pl_stop / pl_empty)
+MODOS_FALLO = ('item', 'imagen', 'colgado', 'detenido', 'vacio')
+
+class ReproductorSimulado:
+    """Estado de una playlist de VLC: elementos, elemento actual y posición"""
+
+    def __init__(self, duracion=DURACION_POR_DEFECTO):
+        self.duracion = duracion
+        self.items = []
+        self.estado = 'stopped'
+        self.actual = None
+        self._inicio = 0.0
+        self._pausado_en = 0.0
+        self._siguiente_id = 3
+        self._lock = threading.Lock()
+        # Fallo simulado en curso ('item', 'imagen', 'colgado') o None
+        self.congelado = None
+        self._item_congelado = None
+        self._tiempo_congelado = 0.0
+        # Sin señalar mientras la interfaz está 'colgado': las solicitudes esperan aquí
+        self.respondiendo = threading.Event()
+        self.respondiendo.set()
+
+    # ------------------------------------------------------------------------
+    # SIMULACIÓN DEL TIEMPO
+    # ------------------------------------------------------------------------
+
+    def _indice_actual(self):
+        for i, item in enumerate(self.items):
+            if item['id'] == self.actual:
+                return i
+        return None
+
+    def _congelado_ahora(self):
+        return self.congelado == 'imagen' or (self.congelado == 'item' and self.actual == self._item_congelado)
+
+    def _tiempo(self):
+        if self.estado == 'playing':
+            if self._congelado_ahora():
+                return self._tiempo_congelado
+            return time.monotonic() - self._inicio
+        if self.estado == 'paused':
+            return self._pausado_en
+        return 0.0
+
+    def _avanzar_reloj(self):
+        """Pasa al siguiente elemento (en bucle) cada vez que se cumple la duración"""
+        while (self.estado == 'playing' and self.items and not self._congelado_ahora()
+               and self._tiempo() >= self.duracion):
+            indice = self._indice_actual()
+            siguiente = 0 if indice is None else (indice + 1) % len(self.items)
+            self._inicio += self.duracion
+            self.actual = self.items[siguiente]['id']
+
+    def _reproducir(self, item_id=None):
+        if not self.items:
+            self.estado, self.actual = 'stopped', None
+            return
+        if item_id is None:
+            item_id = self.actual if self._indice_actual() is not None else self.items[0]['id']
+        self.actual = item_id
+        self.estado = 'playing'
+        self._inicio = time.monotonic()
+        self._tiempo_congelado = 0.0
+
+    def _saltar(self, paso):
+        if not self.items:
+            return
+        indice = self._indice_actual() or 0
+        self._reproducir(self.items[(indice + paso) % len(self.items)]['id'])
+
+    # ------------------------------------------------------------------------
+    # API EQUIVALENTE A LA INTERFAZ HTTP
+    # ------------------------------------------------------------------------
+
+    def congelar(self, modo):
+        """Aplica un fallo de MODOS_FALLO; None o '' vuelve a la reproducción normal"""
+        with self._lock:
+            self._avanzar_reloj()
+            if self._congelado_ahora():
+                # Al descongelar, la posición sigue desde donde quedó
+                self._inicio = time.monotonic() - self._tiempo_congelado
+            if modo == 'detenido':
+                self.estado = 'stopped'
+            elif modo == 'vacio':
+                self.items, self.estado, self.actual = [], 'stopped', None
+            elif modo in ('item', 'imagen'):
+                self._tiempo_congelado = self._tiempo()
+                self._item_congelado = self.actual
+            self.congelado = modo if modo in ('item', 'imagen', 'colgado') else None
+            if self.congelado == 'colgado':
+                self.respondiendo.clear()
+            else:
+                self.respondiendo.set()
+
+    def agregar(self, uri):
+        item = {'id': self._siguiente_id, 'uri': uri, 'name': os.path.basename(urllib.parse.unquote(uri))}
+        self._siguiente_id += 1
+        self.items.append(item)
+        return item
+
+    def comando(self, nombre, params):
+        """Ejecuta un comando de status.json (in_enqueue, pl_delete, pl_next, ...)"""
+        with self._lock:
+            self._avanzar_reloj()
+            item_id = int(params['id']) if params.get('id') not in (None, '') else None
+            if nombre == 'in_enqueue':
+                self.agregar(params['input'])
+            elif nombre == 'in_play':
+                self._reproducir(self.agregar(params['input'])['id'])
+            elif nombre == 'pl_play':
+                self._reproducir(item_id)
+            elif nombre == 'pl_pause':
+                if self.estado == 'playing':
+                    self._pausado_en, self.estado = self._tiempo(), 'paused'
+                elif self.estado == 'paused':
+                    self._inicio, self.estado = time.monotonic() - self._pausado_en, 'playing'
+            elif nombre == 'pl_forceresume' and self.estado == 'paused':
+                self._inicio, self.estado = time.monotonic() - self._pausado_en, 'playing'
+            elif nombre == 'pl_stop':
+                self.estado = 'stopped'
+            elif nombre == 'pl_next':
+                self._saltar(1)
+            elif nombre == 'pl_previous':
+                self._saltar(-1)
+            elif nombre == 'pl_delete':
+                self.items = [item for item in self.items if item['id'] != item_id]
+                if item_id == self.actual:
+                    # Como VLC 3: al borrar el elemento actual se detiene la reproducción
+                    self.estado, self.actual = 'stopped', None
+            elif nombre == 'pl_empty':
+                self.items, self.estado, self.actual = [], 'stopped', None
+
+    def estado_json(self):
+        with self._lock:
+            self._avanzar_reloj()
+            tiempo = self._tiempo()
+            return {
+                'version': '3.0.0 (fake_vlc)',
+                'state': self.estado,
+                'time': int(tiempo),
+                'length': self.duracion if self.actual is not None else 0,
+                'position': (tiempo / self.duracion) if self.actual is not None and self.duracion else 0.0,
+                'currentplid': self.actual if self.actual is not None else -1,
+                'loop': True,
+                'random': False,
+                'repeat': False
+            }
+
+    def playlist_json(self):
+        with self._lock:
+            self._avanzar_reloj()
+            hojas = []
+            for item in self.items:
+                hoja = {'type': 'leaf', 'ro': 'rw', 'id': str(item['id']), 'uri': item['uri'],
+                        'name': item['name'], 'duration': self.duracion}
+                if item['id'] == self.actual:
+                    hoja['current'] = 'current'
+                hojas.append(hoja)
+            return {'type': 'node', 'ro': 'rw', 'id': '1', 'name': '', 'children': [
+                {'type': 'node', 'ro': 'ro', 'id': '2', 'name': 'Playlist', 'children': hojas},
+                {'type': 'node', 'ro': 'ro', 'id': '3', 'name': 'Media Library', 'children': []}
+            ]}
+
+class FakeVLC:
+    """Servidor HTTP que imita la interfaz de control de VLC sobre un ReproductorSimulado"""
+
+    def __init__(self, host='127.0.0.1', puerto=8080, password='mediasync', duracion=DURACION_POR_DEFECTO):
+        self.host = host
+        self.puerto = puerto
+        self.password = password
+        self.reproductor = ReproductorSimulado(duracion)
+        self._servidor = None
+        self._hilo = None
+
+    def cargar_playlist(self, playlist_path):
+        """Carga una playlist m3u como hace VLC al recibirla por línea de comandos y la reproduce"""
+        with open(playlist_path, "r", encoding="utf-8") as pl:
+            for linea in pl:
+                linea = linea.strip()
+                if linea and not linea.startswith('#'):
+                    self.reproductor.agregar(pathlib.Path(os.path.abspath(linea)).as_uri())
+        self.reproductor.comando('pl_play', {})
+
+    def _crear_manejador(self):
+        fake = self
+        esperado = "Basic " + base64.b64encode(f":{self.password}".encode()).decode()
+
+        class _Manejador(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _responder(self, codigo, cuerpo):
+                datos = json.dumps(cuerpo).encode('utf-8')
+                self.send_response(codigo)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(datos)))
+                self.end_headers()
+                try:
+                    self.wfile.write(datos)
+                except (BrokenPipeError, ConnectionResetError):
+                    # El cliente dejó de esperar (timeout de la sonda mientras estaba 'colgado')
+                    pass
+
+            def do_GET(self):
+                if self.headers.get('Authorization') != esperado:
+                    self._responder(401, {'error': 'unauthorized'})
+                    return
+                url = urllib.parse.urlsplit(self.path)
+                params = {k: v[0] for k, v in urllib.parse.parse_qs(url.query, keep_blank_values=True).items()}
+                if params.get('command') == 'fake_congelar':
+                    fake.reproductor.congelar(params.get('modo'))
+                # Como un VLC bloqueado: acepta la conexión y no responde hasta que se descongele
+                fake.reproductor.respondiendo.wait()
+                if url.path == '/requests/status.json':
+                    if params.get('command') not in (None, 'fake_congelar'):
+                        fake.reproductor.comando(params.pop('command'), params)
+                    self._responder(200, fake.reproductor.estado_json())
+                elif url.path == '/requests/playlist.json':
+                    self._responder(200, fake.reproductor.playlist_json())
+                else:
+                    self._responder(404, {'error': 'not found'})
+
+        return _Manejador
+
+    def iniciar(self):
+        """Arranca el servidor en un hilo en segundo plano"""
+        self._servidor = ThreadingHTTPServer((self.host, self.puerto), self._crear_manejador())
+        self.puerto = self._servidor.server_address[1]
+        self._hilo = threading.Thread(target=self._servidor.serve_forever, name="fake-vlc", daemon=True)
+        self._hilo.start()
+        return self
+
+    def detener(self):
+        if self._servidor is not None:
+            self._servidor.shutdown()
+            self._servidor.server_close()
+            self._servidor = None
+
+def _leer_argumentos(argv):
+    """Interpreta los argumentos estilo VLC; los que no se reconocen se ignoran"""
+    opciones = {'playlist': None, 'host': '127.0.0.1', 'puerto': 8080, 'password': 'mediasync',
+                'duracion': DURACION_POR_DEFECTO, 'congelar': None, 'congelar_tras': 0}
+    claves = {'--http-host': 'host', '--http-port': 'puerto', '--http-password': 'password',
+              '--duracion-simulada': 'duracion', '--congelar': 'congelar', '--congelar-tras': 'congelar_tras'}
+    for arg in argv:
+        if arg.startswith('--') and '=' in arg:
+            clave, valor = arg.split('=', 1)
+            if clave in claves:
+                opciones[claves[clave]] = valor
+        elif not arg.startswith('-') and opciones['playlist'] is None:
+            opciones['playlist'] = arg
+    opciones['puerto'] = int(opciones['puerto'])
+    opciones['duracion'] = float(opciones['duracion'])
+    opciones['congelar_tras'] = float(opciones['congelar_tras'])
+    if opciones['congelar'] not in (None, *MODOS_FALLO):
+        raise SystemExit(f"--congelar debe ser uno de: {', '.join(MODOS_FALLO)}")
+    return opciones
+
+def main(argv=None):
+    opciones = _leer_argumentos(sys.argv[1:] if argv is None else argv)
+    fake = FakeVLC(opciones['host'], opciones['puerto'], opciones['password'], opciones['duracion'])
+    if opciones['playlist']:
+        fake.cargar_playlist(opciones['playlist'])
+    fake.iniciar()
+    print(f"fake_vlc escuchando en http://{fake.host}:{fake.puerto}/requests/status.json")
+    if opciones['congelar']:
+        temporizador = threading.Timer(opciones['congelar_tras'], fake.reproductor.congelar, [opciones['congelar']])
+        temporizador.daemon = True
+        temporizador.start()
+
+    detener = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: detener.set())
+    try:
+        while not detener.wait(1):
+            pass
+    except KeyboardInterrupt:
+        pass
+    fake.detener()
+
+if __name__ == "__main__":
+    main()
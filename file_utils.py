@@ -1,21 +1,123 @@
 import os
-import shutil
-import time
+import threading
+from collections import namedtuple
 from logging_utils import log
 from config import Config
+from copy_utils import copiar_lote
+from mp4_utils import es_mp4_completo
 
 video_dir = Config.VIDEO_CONFIG['VIDEO_DIR']
 
 # todo: refactorizar para aplicar config global a variable local
 formatos_validos = Config.VIDEO_CONFIG['FORMATOS_DE_VIDEO_ADMITIDOS']
 
-# Calcula hash de los videos en video_dir
-def calcular_hash(file_list):
+# Tolerancia al comparar mtime entre origen y staging (segundos).
+# FAT/exFAT guardan mtime con resolución de 2 segundos y copy2 puede redondear.
+TOLERANCIA_MTIME = 2
+
+# Archivo encontrado por el escáner: nombre relativo con '/' como separador (p. ej. 'promo/clip.mp4'),
+# ruta completa y el DirEntry de os.scandir (su stat() queda en caché tras la primera llamada)
+EntradaArchivo = namedtuple('EntradaArchivo', ['nombre', 'path', 'dir_entry'])
+
+# Stat de cada video del último validar_dir(), por VIDEO_DIR y ruta completa: las etapas siguientes
+# del mismo ciclo (planificación del delta) no vuelven a consultar el sistema de archivos.
+# Lo escriben los hilos de staging de cada pantalla y lo leen los de copia: se accede con _stats_lock
+_stats_escaneo = {}
+_stats_lock = threading.Lock()
+
+# Videos ya avisados por superar MAX_FILE_SIZE_MB, por (ruta, tamaño): el aviso no se repite en cada ciclo
+_excedidos_avisados = set()
+
+# ============================================================================
+# ESCÁNER DE DIRECTORIOS
+# ============================================================================
+
+def extensiones_admitidas():
+    """FORMATOS_DE_VIDEO_ADMITIDOS como conjunto en minúsculas, para comparar con un solo lookup"""
+    return frozenset(ext.lower() for ext in Config.VIDEO_CONFIG['FORMATOS_DE_VIDEO_ADMITIDOS'])
+
+def es_video_admitido(nombre, extensiones=None):
+    """True si la extensión del nombre está en FORMATOS_DE_VIDEO_ADMITIDOS"""
+    return os.path.splitext(nombre)[1].lower() in (extensiones or extensiones_admitidas())
+
+def iterar_archivos(directorio, recursivo=False, extensiones=None):
+    """
+    Recorre un directorio con os.scandir en una sola pasada, sin orden definido.
+    Args:
+        directorio (str): Directorio a recorrer
+        recursivo (bool): Entrar también en subcarpetas (se omiten las ocultas, que empiezan con '.')
+        extensiones (set): Solo archivos con estas extensiones en minúsculas; None = todos
+    Yields:
+        EntradaArchivo
+    """
+    pendientes = [('', directorio)]
+    while pendientes:
+        prefijo, actual = pendientes.pop()
+        with os.scandir(actual) as entradas:
+            for entrada in entradas:
+                try:
+                    if entrada.is_dir(follow_symlinks=False):
+                        if recursivo and not entrada.name.startswith('.'):
+                            pendientes.append((prefijo + entrada.name + '/', entrada.path))
+                        continue
+                    if extensiones is not None and os.path.splitext(entrada.name)[1].lower() not in extensiones:
+                        continue
+                    if entrada.is_file():
+                        yield EntradaArchivo(prefijo + entrada.name, entrada.path, entrada)
+                except OSError as e:
+                    log(f"WARNING: No se puede acceder a {entrada.path}: {e}")
+
+def ultimo_stat(path):
+    """Stat de un video tomado en el último validar_dir(), o None si no se escaneó"""
+    # Un diccionario por VIDEO_DIR escaneado (una sola entrada salvo en modo multipantalla)
+    with _stats_lock:
+        escaneos = list(_stats_escaneo.values())
+    for stats in escaneos:
+        st = stats.get(path)
+        if st is not None:
+            return st
+    return None
+
+def _clave_orden(nombre):
+    # Orden por carpeta y luego por nombre, sin distinguir mayúsculas; el nombre original desempata
+    return [parte.casefold() for parte in nombre.split('/')], nombre
+
+def iterar_videos(video_dir, recursivo=None):
+    """iterar_archivos() limitado a FORMATOS_DE_VIDEO_ADMITIDOS; recursivo por defecto según RECURSIVE_SCAN"""
+    if recursivo is None:
+        recursivo = Config.VIDEO_CONFIG['RECURSIVE_SCAN']
+    return iterar_archivos(video_dir, recursivo, extensiones_admitidas())
+
+def hay_video(video_dir, max_archivos=None):
+    """
+    True si video_dir tiene al menos un video admitido; se detiene en el primero sin recorrer todo.
+    Returns:
+        bool | None: None si se revisaron max_archivos archivos sin encontrar ninguno
+    """
+    extensiones = extensiones_admitidas()
+    for revisados, entrada in enumerate(iterar_archivos(video_dir, Config.VIDEO_CONFIG['RECURSIVE_SCAN']), 1):
+        if es_video_admitido(entrada.nombre, extensiones):
+            return True
+        if max_archivos and revisados >= max_archivos:
+            return None
+    return False
+
+def escanear_videos(video_dir, recursivo=None):
+    """
+    Lista los videos de video_dir (y de sus subcarpetas si RECURSIVE_SCAN) en orden determinista:
+    por carpeta y nombre sin distinguir mayúsculas, igual en Windows y en Linux.
+    Returns:
+        list: EntradaArchivo ordenadas
+    """
+    return sorted(iterar_videos(video_dir, recursivo), key=lambda e: _clave_orden(e.nombre))
+
+# Calcula hash de los videos en video_dir (o en base_dir si se especifica)
+def calcular_hash(file_list, base_dir=None):
     hashes = []
     missing_files = []
     
     for f in sorted(file_list):
-        file_path = os.path.join(video_dir, f)
+        file_path = os.path.join(base_dir or video_dir, f)
         try:
             size = os.path.getsize(file_path)
             hashes.append(f"{size}-{f}")
@@ -24,82 +126,108 @@ def calcular_hash(file_list):
             log(f"WARNING: No se puede acceder al archivo para hashearlo {f}: {e}")
     return ";" if not hashes else ";".join(hashes)
 
-def limpiar_archivos_temporales(incluir_activos=False):
+def validar_dir(video_dir, stats_escaneo=None):
     """
-    Limpia archivos temporales del sistema.
+    Encuentra videos en el directorio especificado según las extensiones permitidas,
+    en orden determinista (ver escanear_videos). Con RECURSIVE_SCAN los nombres
+    incluyen la subcarpeta relativa ('promo/clip.mp4').
+    Los MP4 incompletos (descarga parcial o truncada) se omiten hasta que estén completos,
+    y los que superan MAX_FILE_SIZE_MB se omiten siempre.
     Args:
-        incluir_activos (bool): Si True, también limpia los archivos en uso actual
+        stats_escaneo (dict): Dónde dejar el stat de cada video. Por defecto se publica para
+            ultimo_stat(); quien escanea fuera del ciclo de staging (el sondeo del vigilante) pasa el suyo
     """
-    def _eliminar_seguro(path):
-        """Elimina un archivo o directorio de forma segura"""
-        try:
-            if os.path.isfile(path):
-                os.remove(path)
-            elif os.path.isdir(path):
-                # Intentar primero con shutil.rmtree
-                try:
-                    shutil.rmtree(path, ignore_errors=True)
-                except:
-                    # Si falla, intentar con comando del sistema
-                    if os.name == 'nt':  # Windows
-                        os.system(f'rd /s /q "{path}"')
-                    else:  # Unix/Linux
-                        os.system(f'rm -rf "{path}"')
-                # Esperar un momento después de la eliminación
-                if os.path.exists(path):
-                    time.sleep(1)
-        except Exception as e:
-            log(f"Error al eliminar {path}: {str(e)}")
-            
-    temp_paths = []
-    
-    if incluir_activos:
-        temp_paths.extend([
-            Config.PATHS['TEMP_VIDEO_DIR'],
-            Config.PATHS['PLAYLIST_PATH'],
-            Config.PATHS['HASH_FILE']
-        ])
-    
-    for path in temp_paths:
-        try:
-            if os.path.isfile(path):
-                os.remove(path)
-            elif os.path.isdir(path):
-                shutil.rmtree(path, ignore_errors=True)
-        except Exception as e:
-            log(f"Advertencia: No se pudo limpiar {path}: {e}")
-
-def validar_dir(video_dir):
-    """Encuentra videos en el directorio especificado según las extensiones permitidas"""
-    extensiones = Config.VIDEO_CONFIG['FORMATOS_DE_VIDEO_ADMITIDOS']
     archivos = []
-    for f in os.listdir(video_dir):
-        if any(f.lower().endswith(ext.lower()) for ext in extensiones):
-            archivos.append(f)
+    stats = {}
+    limite = Config.VIDEO_CONFIG['MAX_FILE_SIZE_MB'] * 1024 * 1024
+    for entrada in escanear_videos(video_dir):
+        try:
+            st = entrada.dir_entry.stat()
+            if limite and st.st_size > limite:
+                if (entrada.path, st.st_size) not in _excedidos_avisados:
+                    _excedidos_avisados.add((entrada.path, st.st_size))
+                    log(f"WARNING: {entrada.nombre} ({st.st_size / (1024 * 1024):.1f} MB) supera "
+                        f"MAX_FILE_SIZE_MB ({Config.VIDEO_CONFIG['MAX_FILE_SIZE_MB']} MB), se omite")
+                continue
+            if not es_mp4_completo(entrada.path, st):
+                continue
+        except FileNotFoundError:
+            continue
+        stats[entrada.path] = st
+        archivos.append(entrada.nombre)
+    if stats_escaneo is None:
+        with _stats_lock:
+            _stats_escaneo[video_dir] = stats
+    else:
+        stats_escaneo.clear()
+        stats_escaneo.update(stats)
     return archivos
 
 def copiar_archivos(files, src_dir, dest_dir):
-    """Crea y si no existe y copia archivos de un directorio a otro"""
+    """Crea y si no existe y copia archivos de un directorio a otro (en paralelo, ver copy_utils)"""
     os.makedirs(dest_dir, exist_ok=True)
+    # Subcarpetas de los nombres relativos (RECURSIVE_SCAN)
+    for subdir in {os.path.dirname(f) for f in files if '/' in f}:
+        os.makedirs(os.path.join(dest_dir, subdir), exist_ok=True)
+    return copiar_lote([(os.path.join(src_dir, f), os.path.join(dest_dir, f)) for f in files], nombres=files)
+
+def planificar_delta(files, src_dir, dest_dir):
+    """
+    Compara archivo por archivo el origen contra el staging sin modificar nada.
+    Args:
+        files (list): Archivos válidos en src_dir (resultado de validar_dir)
+        src_dir (str): Directorio fuente (OneDrive)
+        dest_dir (str): Directorio de staging (TEMP_VIDEO_DIR)
+    Returns:
+        dict: 'copiar' (nuevos o modificados), 'eliminar' (ya no existen en origen),
+              'sin_cambios', y los bytes a copiar y a omitir.
+    """
+    plan = {
+        'copiar': [],
+        'eliminar': [],
+        'sin_cambios': [],
+        'bytes_copiar': 0,
+        'bytes_omitidos': 0
+    }
+
     for f in files:
-        src = os.path.join(src_dir, f)
-        dst = os.path.join(dest_dir, f)
         try:
-            shutil.copy2(src, dst)
-            log(f"Archivo copiado: {f}")
-        except Exception as e:
-            log(f"ERROR al copiar {f}: {e}")
+            src_path = os.path.join(src_dir, f)
+            src_stat = ultimo_stat(src_path) or os.stat(src_path)
+        except OSError as e:
+            log(f"WARNING: No se puede acceder al archivo fuente {f}: {e}")
+            continue
+
+        try:
+            dst_stat = os.stat(os.path.join(dest_dir, f))
+        except OSError:
+            dst_stat = None
+
+        # Mismo tamaño y mismo mtime (copy2 lo conserva) = archivo sin cambios
+        if (dst_stat is not None and
+                dst_stat.st_size == src_stat.st_size and
+                abs(dst_stat.st_mtime - src_stat.st_mtime) <= TOLERANCIA_MTIME):
+            plan['sin_cambios'].append(f)
+            plan['bytes_omitidos'] += src_stat.st_size
+        else:
+            plan['copiar'].append(f)
+            plan['bytes_copiar'] += src_stat.st_size
+
+    # Todo lo que quede en staging y no esté en el origen sobra
+    vigentes = set(files)
+    if os.path.isdir(dest_dir):
+        for entrada in iterar_archivos(dest_dir, recursivo=Config.VIDEO_CONFIG['RECURSIVE_SCAN']):
+            if entrada.nombre not in vigentes:
+                plan['eliminar'].append(entrada.nombre)
+        plan['eliminar'].sort(key=_clave_orden)
+
+    return plan
 
 def generar_playlist(files, dest_dir, playlist_path):
     """Genera una playlist para VLC"""
+    extensiones = extensiones_admitidas()
     with open(playlist_path, "w", encoding=Config.LOG_CONFIG['LOG_ENCODING']) as pl:
         for f in files:
-            if any(f.lower().endswith(ext.lower()) for ext in Config.VIDEO_CONFIG['FORMATOS_DE_VIDEO_ADMITIDOS']):
-                pl.write(os.path.join(dest_dir, f) + "\n")
+            if es_video_admitido(f, extensiones):
+                pl.write(os.path.normpath(os.path.join(dest_dir, f)) + "\n")
     log(f"Playlist generada. Incluye: {', '.join(files)}")
-
-def escribir_hash(hash_value, hash_file):
-    """Escribe el hash en el archivo especificado."""
-    with open(hash_file, "w", encoding="utf-8") as hf:
-        hf.write(hash_value)
-    log(f"Hash escrito en {hash_file}.")
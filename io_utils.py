@@ -0,0 +1,165 @@
+import os
+import sys
+import time
+import threading
+from contextlib import contextmanager
+from logging_utils import log
+from config import Config
+from metrics_utils import incrementar
+
+# Prioridad de E/S del hilo para el staging y las huellas: que la lectura de VLC del mismo disco
+# siempre pase primero. Linux: clase idle de ioprio (CFQ/BFQ la respetan). Windows: modo de fondo
+# del hilo (THREAD_MODE_BACKGROUND_BEGIN), que baja su prioridad de E/S y de memoria.
+
+# ioprio_set/ioprio_get por arquitectura (no hay envoltorio en os)
+_SYSCALLS_IOPRIO = {
+    'x86_64': (251, 252), 'amd64': (251, 252),
+    'aarch64': (30, 31), 'arm64': (30, 31),
+    'i386': (289, 290), 'i686': (289, 290),
+    'armv7l': (314, 315), 'armv6l': (314, 315),
+}
+_IOPRIO_WHO_PROCESS = 1       # Con id 0: el hilo que llama
+_IOPRIO_CLASS_IDLE = 3
+_IOPRIO_CLASS_SHIFT = 13
+_THREAD_MODE_BACKGROUND_BEGIN = 0x00010000
+_THREAD_MODE_BACKGROUND_END = 0x00020000
+
+# Se resuelve al primer uso: función (activar, restaurar) de la plataforma, o None si no hay soporte
+_prioridad = None
+_prioridad_resuelta = False
+# Por hilo: anidamiento de prioridad_baja (solo el bloque externo cambia y restaura la prioridad)
+# y segundos esperados por la limitación (espera_del_hilo)
+_hilo = threading.local()
+
+# Cubeta de tokens compartida por todas las copias y huellas (bytes por segundo, ráfaga de 1 s)
+_cubeta_lock = threading.Lock()
+_tokens = 0.0
+_ultima_recarga = None
+# Totales desde el inicio, para el reporte por ciclo: trabajo -> {'bytes', 'espera'}
+_totales = {}
+
+# ============================================================================
+# FUNCIONES HELPER PRIVADAS
+# ============================================================================
+
+def _prioridad_linux():
+    import ctypes
+    llamadas = _SYSCALLS_IOPRIO.get(os.uname().machine.lower())
+    if llamadas is None:
+        return None
+    libc = ctypes.CDLL(None, use_errno=True)
+    ioprio_set, ioprio_get = llamadas
+
+    def activar():
+        anterior = libc.syscall(ioprio_get, _IOPRIO_WHO_PROCESS, 0)
+        if anterior < 0 or libc.syscall(ioprio_set, _IOPRIO_WHO_PROCESS, 0,
+                                        _IOPRIO_CLASS_IDLE << _IOPRIO_CLASS_SHIFT) != 0:
+            raise OSError(ctypes.get_errno(), "ioprio_set")
+        return anterior
+
+    def restaurar(anterior):
+        libc.syscall(ioprio_set, _IOPRIO_WHO_PROCESS, 0, anterior)
+
+    return activar, restaurar
+
+def _prioridad_windows():
+    import ctypes
+    kernel32 = ctypes.WinDLL('kernel32', use_last_error=True)
+
+    def activar():
+        if not kernel32.SetThreadPriority(kernel32.GetCurrentThread(), _THREAD_MODE_BACKGROUND_BEGIN):
+            raise OSError(ctypes.get_last_error(), "SetThreadPriority")
+        return None
+
+    def restaurar(anterior):
+        kernel32.SetThreadPriority(kernel32.GetCurrentThread(), _THREAD_MODE_BACKGROUND_END)
+
+    return activar, restaurar
+
+def _obtener_prioridad():
+    global _prioridad, _prioridad_resuelta
+    if not _prioridad_resuelta:
+        _prioridad_resuelta = True
+        try:
+            if sys.platform.startswith('linux'):
+                _prioridad = _prioridad_linux()
+            elif sys.platform == 'win32':
+                _prioridad = _prioridad_windows()
+        except (OSError, AttributeError) as e:
+            log(f"WARNING: Prioridad de E/S en segundo plano no disponible: {e}")
+        if _prioridad is None:
+            log("INFO: Sin control de prioridad de E/S en esta plataforma; el staging usa la prioridad normal")
+    return _prioridad
+
+# ============================================================================
+# FUNCIONES PRINCIPALES
+# ============================================================================
+
+@contextmanager
+def prioridad_baja():
+    """Ejecuta el bloque con prioridad de E/S de segundo plano en el hilo actual (IO_BACKGROUND_PRIORITY)"""
+    profundidad = getattr(_hilo, 'profundidad', 0)
+    prioridad = None
+    anterior = None
+    if profundidad == 0 and Config.COPY_CONFIG['IO_BACKGROUND_PRIORITY']:
+        prioridad = _obtener_prioridad()
+        if prioridad is not None:
+            try:
+                anterior = prioridad[0]()
+            except OSError as e:
+                log(f"WARNING: No se pudo bajar la prioridad de E/S del hilo: {e}")
+                prioridad = None
+    _hilo.profundidad = profundidad + 1
+    try:
+        yield
+    finally:
+        _hilo.profundidad = profundidad
+        if prioridad is not None:
+            prioridad[1](anterior)
+
+def limitar(n_bytes, trabajo):
+    """
+    Reserva n_bytes de la cubeta de tokens de IO_MAX_MB_S y espera lo necesario (0 = sin límite).
+    Las reservas mayores que la ráfaga dejan la cubeta en deuda: la espera la paga quien la pidió.
+    Args:
+        n_bytes (int): Bytes que se van a leer o copiar
+        trabajo (str): 'copia', 'huella' o 'faststart', para el reporte
+    """
+    global _tokens, _ultima_recarga
+    tasa = Config.COPY_CONFIG['IO_MAX_MB_S'] * 1024 * 1024
+    if tasa <= 0 or n_bytes <= 0:
+        return
+    with _cubeta_lock:
+        ahora = time.monotonic()
+        if _ultima_recarga is None:
+            _tokens = tasa
+        else:
+            _tokens = min(tasa, _tokens + (ahora - _ultima_recarga) * tasa)
+        _ultima_recarga = ahora
+        _tokens -= n_bytes
+        espera = -_tokens / tasa if _tokens < 0 else 0.0
+        total = _totales.setdefault(trabajo, {'bytes': 0, 'espera': 0.0})
+        total['bytes'] += n_bytes
+        total['espera'] += espera
+    if espera > 0:
+        incrementar('es_limitacion_segundos_total', espera, trabajo=trabajo)
+        _hilo.espera = getattr(_hilo, 'espera', 0.0) + espera
+        time.sleep(espera)
+
+def registrar_limitacion(n_bytes, espera, trabajo):
+    """Suma a los totales y a las métricas la limitación que se aplicó en otro proceso (pool de faststart)"""
+    with _cubeta_lock:
+        total = _totales.setdefault(trabajo, {'bytes': 0, 'espera': 0.0})
+        total['bytes'] += n_bytes
+        total['espera'] += espera
+    if espera > 0:
+        incrementar('es_limitacion_segundos_total', espera, trabajo=trabajo)
+
+def espera_del_hilo():
+    """Segundos que el hilo actual lleva esperando por la limitación (para medir un bloque por diferencia)"""
+    return getattr(_hilo, 'espera', 0.0)
+
+def resumen_limitacion():
+    """Copia de los totales de la limitación: trabajo -> {'bytes', 'espera'} (para calcular diferencias)"""
+    with _cubeta_lock:
+        return {trabajo: dict(total) for trabajo, total in _totales.items()}
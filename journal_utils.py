@@ -0,0 +1,178 @@
+import os
+import json
+import time
+import threading
+from logging_utils import log
+from config import Config
+
+try:
+    # sqlite3 puede faltar en distribuciones mínimas de Python; sin él el daemon funciona sin diario
+    import sqlite3
+except ImportError:
+    sqlite3 = None
+
+# Diario de estado (PATHS['JOURNAL_FILE']): lo que el daemon tenía a medias al detenerse.
+#   copias:       progreso confirmado de cada copia en curso (destino -> origen y offset ya en disco)
+#   intenciones:  generación que cada staging (TEMP_VIDEO_DIR) está construyendo o activó
+#   reproduccion: VLC de cada pantalla (PID, puerto y playlist) mientras el daemon lo gestiona
+# Cada escritura es una sola sentencia en modo autocommit: tras un corte se ve el valor anterior
+# o el nuevo. Un offset se registra solo después de fsync de los datos, así nunca adelanta al disco.
+VERSION_DIARIO = 1
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS copias (
+    destino TEXT PRIMARY KEY, origen TEXT NOT NULL, tamano INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL, confirmado INTEGER NOT NULL, actualizado REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS intenciones (
+    staging TEXT PRIMARY KEY, generacion TEXT NOT NULL, estado TEXT NOT NULL,
+    archivos TEXT NOT NULL, actualizado REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS reproduccion (
+    pantalla TEXT PRIMARY KEY, pid INTEGER NOT NULL, http_port INTEGER, playlist TEXT,
+    desde REAL NOT NULL);
+"""
+
+_conexion = None
+# La conexión se comparte entre el loop, los hilos del executor y el pool de copia
+_lock = threading.Lock()
+# True tras un error irrecuperable: el daemon sigue sin diario (como antes de tenerlo)
+_deshabilitado = False
+
+# ============================================================================
+# FUNCIONES HELPER PRIVADAS
+# ============================================================================
+
+def _abrir(path):
+    conexion = sqlite3.connect(path, timeout=5, isolation_level=None, check_same_thread=False)
+    conexion.execute("PRAGMA journal_mode=WAL")
+    conexion.execute("PRAGMA synchronous=NORMAL")
+    if conexion.execute("PRAGMA user_version").fetchone()[0] not in (0, VERSION_DIARIO):
+        conexion.close()
+        raise sqlite3.DatabaseError("versión del diario desconocida")
+    conexion.executescript(_ESQUEMA)
+    conexion.execute(f"PRAGMA user_version={VERSION_DIARIO}")
+    return conexion
+
+def _obtener_conexion():
+    """Abre el diario al primer uso; uno ilegible se aparta (.corrupto) y se empieza uno nuevo"""
+    global _conexion, _deshabilitado
+    if _deshabilitado:
+        return None
+    if _conexion is not None:
+        return _conexion
+    path = Config.PATHS.get('JOURNAL_FILE')
+    if sqlite3 is None or not path:
+        _deshabilitado = True
+        return None
+    try:
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        try:
+            _conexion = _abrir(path)
+        except sqlite3.DatabaseError as e:
+            log(f"WARNING: Diario de estado ilegible ({e}), se empieza uno nuevo; "
+                f"las copias interrumpidas se repiten desde el inicio")
+            os.replace(path, path + ".corrupto")
+            for sufijo in ("-wal", "-shm"):
+                if os.path.exists(path + sufijo):
+                    os.remove(path + sufijo)
+            _conexion = _abrir(path)
+    except (OSError, sqlite3.Error) as e:
+        log(f"WARNING: No se pudo abrir el diario de estado {path}, se continúa sin él: {e}")
+        _deshabilitado = True
+    return _conexion
+
+def _ejecutar(sentencia, parametros=()):
+    """Ejecuta una sentencia; retorna las filas (lista vacía si no hay diario o falla)"""
+    global _deshabilitado
+    with _lock:
+        conexion = _obtener_conexion()
+        if conexion is None:
+            return []
+        try:
+            return conexion.execute(sentencia, parametros).fetchall()
+        except sqlite3.Error as e:
+            # Disco lleno o archivo bloqueado: perder el diario solo cuesta repetir trabajo tras un corte
+            log(f"WARNING: Diario de estado deshabilitado tras un error: {e}")
+            _deshabilitado = True
+            return []
+
+# ============================================================================
+# COPIAS EN CURSO
+# ============================================================================
+
+def registrar_copia(destino, origen, st_origen, confirmado):
+    """Registra que los primeros 'confirmado' bytes de la copia origen -> destino ya están en disco"""
+    _ejecutar("INSERT OR REPLACE INTO copias VALUES (?, ?, ?, ?, ?, ?)",
+              (destino, origen, st_origen.st_size, st_origen.st_mtime_ns, confirmado, time.time()))
+
+def copia_pendiente(destino):
+    """Copia interrumpida hacia destino: dict con 'origen', 'tamano', 'mtime_ns' y 'confirmado', o None"""
+    filas = _ejecutar("SELECT origen, tamano, mtime_ns, confirmado FROM copias WHERE destino = ?", (destino,))
+    if not filas:
+        return None
+    origen, tamano, mtime_ns, confirmado = filas[0]
+    return {'origen': origen, 'tamano': tamano, 'mtime_ns': mtime_ns, 'confirmado': confirmado}
+
+def copias_pendientes():
+    """Todas las copias interrumpidas: destino -> dict como copia_pendiente()"""
+    return {destino: {'origen': origen, 'tamano': tamano, 'mtime_ns': mtime_ns, 'confirmado': confirmado}
+            for destino, origen, tamano, mtime_ns, confirmado in
+            _ejecutar("SELECT destino, origen, tamano, mtime_ns, confirmado FROM copias")}
+
+def finalizar_copia(destino):
+    _ejecutar("DELETE FROM copias WHERE destino = ?", (destino,))
+
+# ============================================================================
+# INTENCIONES DE STAGING
+# ============================================================================
+
+def registrar_intencion(staging_root, generacion, estado, archivos=None):
+    """
+    Estado de la última generación de un staging: 'construyendo', 'activa' o 'descartada'.
+    'archivos' son los que la construcción debe copiar (None al cambiar solo el estado).
+    """
+    if archivos is not None:
+        _ejecutar("INSERT OR REPLACE INTO intenciones VALUES (?, ?, ?, ?, ?)",
+                  (staging_root, generacion, estado, json.dumps(sorted(archivos)), time.time()))
+        return
+    _ejecutar("INSERT INTO intenciones VALUES (?, ?, ?, '[]', ?) "
+              "ON CONFLICT(staging) DO UPDATE SET generacion = excluded.generacion, "
+              "estado = excluded.estado, actualizado = excluded.actualizado",
+              (staging_root, generacion, estado, time.time()))
+
+def intencion(staging_root):
+    """Última intención registrada para el staging: dict con 'generacion', 'estado' y 'archivos', o None"""
+    filas = _ejecutar("SELECT generacion, estado, archivos FROM intenciones WHERE staging = ?", (staging_root,))
+    if not filas:
+        return None
+    generacion, estado, archivos = filas[0]
+    return {'generacion': generacion, 'estado': estado, 'archivos': json.loads(archivos)}
+
+# ============================================================================
+# ESTADO DE REPRODUCCIÓN
+# ============================================================================
+
+def registrar_reproduccion(pantalla, pid, http_port, playlist):
+    _ejecutar("INSERT OR REPLACE INTO reproduccion VALUES (?, ?, ?, ?, ?)",
+              (pantalla, pid, http_port, playlist, time.time()))
+
+def reproduccion(pantalla):
+    """VLC que gestionaba la pantalla: dict con 'pid', 'http_port', 'playlist' y 'desde', o None"""
+    filas = _ejecutar("SELECT pid, http_port, playlist, desde FROM reproduccion WHERE pantalla = ?", (pantalla,))
+    if not filas:
+        return None
+    pid, http_port, playlist, desde = filas[0]
+    return {'pid': pid, 'http_port': http_port, 'playlist': playlist, 'desde': desde}
+
+def finalizar_reproduccion(pantalla):
+    _ejecutar("DELETE FROM reproduccion WHERE pantalla = ?", (pantalla,))
+
+def cerrar_diario():
+    """Cierra la conexión (el WAL se integra al archivo principal); se reabre si se vuelve a usar"""
+    global _conexion
+    with _lock:
+        if _conexion is not None:
+            try:
+                _conexion.close()
+            except sqlite3.Error:
+                pass
+            _conexion = None
@@ -1,18 +1,80 @@
 import os
+import sys
+import gzip
+import time
+import queue
+import atexit
+import socket
 import logging
 import logging.handlers
-import sys
+import threading
 from config import Config
 
+# Prefijo de los segmentos comprimidos que se publican en LOG_SHARED_DIR
+PREFIJO_SEGMENTO = 'MediaSync_'
+
+_listener = None
+_buffer_segmento = None
+_ultima_publicacion = 0.0
+_publicacion_lock = threading.Lock()
+
+class _BufferSegmento(logging.Handler):
+    """
+    Acumula en memoria las líneas ya formateadas desde la última publicación.
+    Se acota a LOG_SEGMENT_MAX_LINES: si la carpeta compartida no está disponible por mucho
+    tiempo se descartan las más antiguas (siguen en el log local).
+    """
+
+    def __init__(self, max_lineas):
+        super().__init__()
+        self.max_lineas = max_lineas
+        self.lineas = []
+        self.descartadas = 0
+
+    def emit(self, record):
+        try:
+            linea = self.format(record)
+        except Exception:
+            self.handleError(record)
+            return
+        with self.lock:
+            self.lineas.append(linea)
+            if len(self.lineas) > self.max_lineas:
+                exceso = len(self.lineas) - self.max_lineas
+                del self.lineas[:exceso]
+                self.descartadas += exceso
+
+    def extraer(self):
+        with self.lock:
+            lineas, descartadas = self.lineas, self.descartadas
+            self.lineas, self.descartadas = [], 0
+        if descartadas:
+            lineas.insert(0, f"... {descartadas} líneas anteriores omitidas (ver el log local) ...")
+        return lineas
+
+    def devolver(self, lineas):
+        """Reinserta líneas no publicadas delante de las nuevas"""
+        with self.lock:
+            self.lineas[:0] = lineas
+            if len(self.lineas) > self.max_lineas:
+                exceso = len(self.lineas) - self.max_lineas
+                del self.lineas[:exceso]
+                self.descartadas += exceso
+
 def configurar_logging():
-    """Configura el sistema de logging con rotación de archivos"""
+    """
+    Configura el logging sin bloquear a quien llama: log() solo encola el registro y un hilo
+    (QueueListener) escribe el log local con rotación, la consola y el búfer de segmentos
+    que publicar_log() sube comprimido a la carpeta compartida.
+    """
+    global _listener, _buffer_segmento
     log_path = Config.LOG_CONFIG['LOG_PATH']
     log_dir = os.path.dirname(log_path)
-    
+
     # Asegurar que el directorio de logs existe
     if not os.path.exists(log_dir):
         os.makedirs(log_dir, exist_ok=True)
-    
+
     # Configurar el handler con rotación
     file_handler = logging.handlers.RotatingFileHandler(
         filename=log_path,
@@ -20,32 +82,108 @@ def configurar_logging():
         backupCount=Config.LOG_CONFIG['LOG_BACKUP_COUNT'],
         encoding=Config.LOG_CONFIG['LOG_ENCODING']
     )
-    
+
     # Configurar el formato
     formatter = logging.Formatter(
         fmt=Config.LOG_CONFIG['LOG_FORMAT'],
         datefmt=Config.LOG_CONFIG['DATE_FORMAT']
     )
     file_handler.setFormatter(formatter)
-    
+
+    # Agregar también un StreamHandler para la consola con el mismo formato
+    console_handler = logging.StreamHandler(sys.stdout)
+    console_handler.setFormatter(formatter)
+
+    handlers = [file_handler, console_handler]
+    if Config.LOG_CONFIG['LOG_SHARED_DIR']:
+        _buffer_segmento = _BufferSegmento(Config.LOG_CONFIG['LOG_SEGMENT_MAX_LINES'])
+        _buffer_segmento.setFormatter(formatter)
+        handlers.append(_buffer_segmento)
+
+    # Detener un listener anterior (reconfiguración) antes de reemplazarlo
+    detener_logging()
+    cola = queue.SimpleQueue()
+    _listener = logging.handlers.QueueListener(cola, *handlers)
+    _listener.start()
+    atexit.register(detener_logging)
+
     # Configurar el logger root
     root_logger = logging.getLogger()
     root_logger.setLevel(getattr(logging, Config.LOG_CONFIG['LOG_LEVEL']))
-    
+
     # Remover handlers existentes si los hay
     for handler in root_logger.handlers[:]:
         root_logger.removeHandler(handler)
-    
-    # Agregar el nuevo handler
-    root_logger.addHandler(file_handler)
-    
-    # Agregar también un StreamHandler para la consola con el mismo formato
-    console_handler = logging.StreamHandler(sys.stdout)
-    console_handler.setFormatter(formatter)
-    root_logger.addHandler(console_handler)
-    
+
+    # El único handler del root solo encola
+    root_logger.addHandler(logging.handlers.QueueHandler(cola))
+
     logging.info("Sistema de logging iniciado con rotación de archivos")
 
+def actualizar_nivel():
+    """Aplica LOG_LEVEL sin reconfigurar el logging (recarga de la configuración externa)"""
+    logging.getLogger().setLevel(getattr(logging, Config.LOG_CONFIG['LOG_LEVEL']))
+
+def detener_logging():
+    """Vacía la cola pendiente y detiene el hilo de escritura"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+def publicar_log(forzar=False):
+    """
+    Sube a LOG_SHARED_DIR un segmento .log.gz con las líneas registradas desde la última
+    publicación, como máximo una vez por LOG_PUSH_INTERVAL (salvo forzar=True, al detener).
+    Se conservan los LOG_SHARED_KEEP segmentos más recientes de este equipo.
+    Returns:
+        str | None: Ruta del segmento publicado
+    """
+    global _ultima_publicacion
+    shared_dir = Config.LOG_CONFIG['LOG_SHARED_DIR']
+    if _buffer_segmento is None or not shared_dir:
+        return None
+    with _publicacion_lock:
+        ahora = time.monotonic()
+        if not forzar and ahora - _ultima_publicacion < Config.LOG_CONFIG['LOG_PUSH_INTERVAL']:
+            return None
+        lineas = _buffer_segmento.extraer()
+        if not lineas:
+            return None
+
+        equipo = socket.gethostname()
+        base = os.path.join(shared_dir, f"{PREFIJO_SEGMENTO}{equipo}_{time.strftime('%Y%m%d-%H%M%S')}")
+        destino, n = base + ".log.gz", 1
+        while os.path.exists(destino):
+            destino, n = f"{base}-{n}.log.gz", n + 1
+        contenido = gzip.compress(('\n'.join(lineas) + '\n').encode(Config.LOG_CONFIG['LOG_ENCODING']))
+        try:
+            # Un solo archivo completo por publicación: OneDrive sube cada segmento una vez
+            with open(destino + ".tmp", "wb") as f:
+                f.write(contenido)
+            os.replace(destino + ".tmp", destino)
+        except OSError as e:
+            _buffer_segmento.devolver(lineas)
+            logging.warning(f"No se pudo publicar el log en {shared_dir}, se reintentará: {e}")
+            return None
+        _ultima_publicacion = ahora
+        _podar_segmentos(shared_dir, equipo)
+        return destino
+
+def _podar_segmentos(shared_dir, equipo):
+    prefijo = f"{PREFIJO_SEGMENTO}{equipo}_"
+    try:
+        # Orden por fecha de escritura: el sufijo -N de dos publicaciones en el mismo segundo no ordena bien
+        segmentos = sorted((e.stat().st_mtime_ns, e.name) for e in os.scandir(shared_dir)
+                           if e.name.startswith(prefijo) and e.name.endswith('.log.gz'))
+    except OSError:
+        return
+    for _, nombre in segmentos[:-Config.LOG_CONFIG['LOG_SHARED_KEEP']]:
+        try:
+            os.remove(os.path.join(shared_dir, nombre))
+        except OSError:
+            pass
+
 def log(msg):
     """Función de logging centralizada"""
     logging.info(msg)
@@ -0,0 +1,188 @@
+import os
+import json
+from logging_utils import log
+from config import Config
+from sync_utils import calcular_huella, huellas_comparables
+from file_utils import iterar_videos, es_video_admitido
+
+# Versión del formato del manifiesto en disco; si cambia, el manifiesto anterior se descarta
+VERSION_MANIFIESTO = 1
+
+# Último diff calculado, consultable desde cualquier módulo con ultimo_diff()
+_ultimo_diff = None
+
+# ============================================================================
+# FUNCIONES HELPER PRIVADAS
+# ============================================================================
+
+def _misma_version(entrada, size, mtime_ns):
+    return entrada is not None and entrada['size'] == size and entrada['mtime_ns'] == mtime_ns
+
+def _crear_entrada(file_path, st, anterior, file_id=None, huellas=False):
+    """
+    Crea la entrada del manifiesto a partir de un stat.
+    Si tamaño y mtime coinciden con la entrada anterior se reutilizan su file_id y su huella.
+    """
+    if (_misma_version(anterior, st.st_size, st.st_mtime_ns) and
+            (file_id is None or file_id == anterior['file_id'])):
+        return dict(anterior)
+
+    entrada = {
+        'size': st.st_size,
+        'mtime_ns': st.st_mtime_ns,
+        'file_id': file_id if file_id is not None else st.st_ino,
+        'huella': None
+    }
+    if huellas:
+        try:
+            entrada['huella'] = calcular_huella(file_path, st)
+        except OSError as e:
+            log(f"WARNING: No se pudo calcular la huella de {os.path.basename(file_path)}: {e}")
+    return entrada
+
+def _entrada_modificada(anterior, nueva):
+    if (anterior['size'] != nueva['size'] or anterior['mtime_ns'] != nueva['mtime_ns']
+            or anterior['file_id'] != nueva['file_id']):
+        return True
+    # Mismo stat pero distinto contenido (p. ej. reemplazo que conserva la fecha)
+    return huellas_comparables(anterior.get('huella'), nueva.get('huella')) and anterior['huella'] != nueva['huella']
+
+# ============================================================================
+# FUNCIONES PRINCIPALES
+# ============================================================================
+
+def cargar_manifiesto(manifest_file=None):
+    """Lee el manifiesto persistido; retorna {} si no existe o no es válido"""
+    manifest_file = manifest_file or Config.PATHS['MANIFEST_FILE']
+    try:
+        with open(manifest_file, "r", encoding="utf-8") as mf:
+            datos = json.load(mf)
+        if datos.get('version') != VERSION_MANIFIESTO:
+            log("WARNING: Versión de manifiesto distinta, se reconstruye desde cero")
+            return {}
+        return datos['archivos']
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError, KeyError) as e:
+        log(f"WARNING: Manifiesto ilegible, se reconstruye desde cero: {e}")
+        return {}
+
+def guardar_manifiesto(manifiesto, manifest_file=None):
+    """Escribe el manifiesto de forma atómica (archivo temporal + os.replace)"""
+    manifest_file = manifest_file or Config.PATHS['MANIFEST_FILE']
+    temporal = manifest_file + ".tmp"
+    with open(temporal, "w", encoding="utf-8") as mf:
+        json.dump({'version': VERSION_MANIFIESTO, 'archivos': manifiesto}, mf, ensure_ascii=False)
+    os.replace(temporal, manifest_file)
+    log(f"Manifiesto escrito en {manifest_file} ({len(manifiesto)} archivos).")
+
+def construir_manifiesto(video_dir, anterior=None, huellas=None):
+    """
+    Recorre video_dir una sola vez con el escáner os.scandir de file_utils (subcarpetas
+    incluidas si RECURSIVE_SCAN) y construye el manifiesto completo.
+    En Windows el stat de cada DirEntry viene incluido en el listado del directorio,
+    así que los archivos sin cambios no generan ninguna llamada extra al sistema.
+    Args:
+        video_dir (str): Directorio fuente
+        anterior (dict): Manifiesto previo, para reutilizar file_id y huellas
+        huellas (bool): Calcular huella de contenido (por defecto MANIFEST_FINGERPRINT)
+    Returns:
+        dict: nombre de archivo -> {'size', 'mtime_ns', 'file_id', 'huella'}
+    """
+    anterior = anterior or {}
+    if huellas is None:
+        huellas = Config.SYNC_CONFIG['MANIFEST_FINGERPRINT']
+
+    manifiesto = {}
+    for entrada in iterar_videos(video_dir):
+        try:
+            st = entrada.dir_entry.stat()
+            previa = anterior.get(entrada.nombre)
+            # En Windows DirEntry.stat() no trae el file-id; inode() lo pide aparte,
+            # por eso allí solo se consulta para archivos nuevos o modificados.
+            # En POSIX el inode viene en el propio listado y siempre se compara.
+            file_id = None
+            if os.name != 'nt' or not _misma_version(previa, st.st_size, st.st_mtime_ns):
+                file_id = entrada.dir_entry.inode()
+            manifiesto[entrada.nombre] = _crear_entrada(entrada.path, st, previa, file_id, huellas)
+        except OSError as e:
+            log(f"WARNING: No se puede acceder al archivo para el manifiesto {entrada.nombre}: {e}")
+    return manifiesto
+
+def actualizar_manifiesto(video_dir, anterior, cambiados=None, huellas=None, incluir=None):
+    """
+    Calcula el manifiesto nuevo y su diff contra el anterior.
+    Si se conocen los nombres cambiados (p. ej. del VigilanteContenido) solo se
+    hace stat de esos archivos y el resto se reutiliza: costo O(archivos cambiados).
+    Sin esa información se hace un recorrido completo con construir_manifiesto().
+    Args:
+        incluir (iterable): Si se indica, los archivos fuera de este conjunto (p. ej. aún
+            descargándose) quedan fuera del manifiesto y aparecerán como nuevos cuando entren
+    Returns:
+        tuple: (manifiesto nuevo, diff)
+    """
+    global _ultimo_diff
+    if huellas is None:
+        huellas = Config.SYNC_CONFIG['MANIFEST_FINGERPRINT']
+
+    if incluir is not None:
+        incluir = set(incluir)
+
+    if cambiados is None or not anterior:
+        nuevo = construir_manifiesto(video_dir, anterior, huellas)
+        if incluir is not None:
+            nuevo = {nombre: entrada for nombre, entrada in nuevo.items() if nombre in incluir}
+        diff = diferenciar_manifiestos(anterior, nuevo)
+    else:
+        nuevo = dict(anterior)
+        for nombre in cambiados:
+            if not es_video_admitido(nombre):
+                continue
+            if incluir is not None and nombre not in incluir:
+                nuevo.pop(nombre, None)
+                continue
+            file_path = os.path.join(video_dir, nombre)
+            try:
+                st = os.stat(file_path)
+                nuevo[nombre] = _crear_entrada(file_path, st, anterior.get(nombre), st.st_ino, huellas)
+            except FileNotFoundError:
+                nuevo.pop(nombre, None)
+            except OSError as e:
+                log(f"WARNING: No se puede acceder al archivo para el manifiesto {nombre}: {e}")
+        diff = diferenciar_manifiestos(anterior, nuevo, nombres=cambiados)
+
+    _ultimo_diff = diff
+    return nuevo, diff
+
+def diferenciar_manifiestos(anterior, nuevo, nombres=None):
+    """
+    Compara dos manifiestos.
+    Args:
+        nombres (iterable): Limita la comparación a estos nombres; el resto se da por sin cambios
+    Returns:
+        dict: listas ordenadas 'agregados', 'eliminados', 'modificados' y el conteo 'sin_cambios'
+    """
+    anterior = anterior or {}
+    candidatos = set(anterior) | set(nuevo) if nombres is None else set(nombres)
+
+    diff = {'agregados': [], 'eliminados': [], 'modificados': [], 'sin_cambios': 0}
+    for nombre in sorted(candidatos):
+        previa, actual = anterior.get(nombre), nuevo.get(nombre)
+        if previa is None and actual is not None:
+            diff['agregados'].append(nombre)
+        elif previa is not None and actual is None:
+            diff['eliminados'].append(nombre)
+        elif previa is not None and _entrada_modificada(previa, actual):
+            diff['modificados'].append(nombre)
+
+    cambios = len(diff['agregados']) + len(diff['modificados'])
+    diff['sin_cambios'] = len(nuevo) - cambios
+    return diff
+
+def hay_cambios(diff):
+    """True si el diff contiene altas, bajas o modificaciones"""
+    return bool(diff and (diff['agregados'] or diff['eliminados'] or diff['modificados']))
+
+def ultimo_diff():
+    """Retorna el último diff calculado por actualizar_manifiesto(), o None si aún no hay"""
+    return _ultimo_diff
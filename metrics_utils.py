@@ -0,0 +1,289 @@
+import os
+import json
+import time
+import socket
+import threading
+from contextlib import contextmanager
+from logging_utils import log
+from config import Config
+
+PREFIJO = 'mediasync_'
+
+# Límites superiores (segundos) de los histogramas de duración
+BUCKETS_SEGUNDOS = (0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300, 900)
+
+# Métricas conocidas: nombre -> (tipo, descripción). Usar un nombre fuera de esta tabla es un error de programación
+METRICAS = {
+    'fase_segundos': ('histogram', "Duración de cada fase del refresco"),
+    'espera_estabilidad_segundos': ('histogram', "Tiempo desde que se detecta un archivo hasta que se estabiliza"),
+    'vlc_inicio_segundos': ('histogram', "Latencia desde el lanzamiento de VLC hasta confirmar que reproduce"),
+    'ciclos_total': ('counter', "Ciclos de staging por resultado"),
+    'copia_bytes_total': ('counter', "Bytes copiados al staging"),
+    'es_limitacion_segundos_total': ('counter', "Segundos de espera por el límite de E/S del staging (IO_MAX_MB_S)"),
+    'copia_reanudada_bytes_total': ('counter', "Bytes que no se volvieron a copiar al reanudar copias interrumpidas"),
+    'copia_archivos_total': ('counter', "Archivos copiados al staging por resultado"),
+    'huellas_calculadas_total': ('counter', "Huellas de contenido calculadas (sin caché)"),
+    'huellas_bytes_total': ('counter', "Bytes leídos para calcular huellas de contenido"),
+    'config_recargas_total': ('counter', "Lecturas de la configuración externa por resultado"),
+    'vlc_inicios_total': ('counter', "Intentos de iniciar VLC por resultado"),
+    'vlc_salud_acciones_total': ('counter', "Acciones de la sonda de reproducción (saltar, reanudar, reiniciar)"),
+    'mp4_faststart_total': ('counter', "MP4 nuevos revisados por la etapa de faststart, por resultado"),
+    'almacen_desalojos_total': ('counter', "Objetos retenidos del almacén eliminados para respetar la cuota"),
+    'ciclo_limitacion_segundos': ('gauge', "Espera por el límite de E/S durante el último ciclo de staging"),
+    'copia_mb_s': ('gauge', "Velocidad de la última copia al staging (MB/s)"),
+    'almacen_bytes': ('gauge', "Bytes en el almacén local de contenido"),
+    'almacen_retenido_bytes': ('gauge', "Bytes del almacén que ninguna pantalla usa (retenidos para revertir cambios)"),
+    'vlc_sin_avance_segundos': ('gauge', "Segundos que la reproducción lleva sin avanzar según la sonda"),
+    'archivos_publicados': ('gauge', "Archivos en la generación activa"),
+    'archivos_en_espera': ('gauge', "Archivos que aún no se estabilizan"),
+    'errores_consecutivos': ('gauge', "Ciclos consecutivos sin contenido válido"),
+    'circuito_abierto': ('gauge', "1 si el circuito de reintentos está abierto (se reproduce el último contenido válido)"),
+    'reintento_espera_segundos': ('gauge', "Espera actual antes del siguiente reintento"),
+    'onedrive_pendiente': ('gauge', "1 si OneDrive tiene archivos pendientes"),
+    'ultima_sincronizacion_timestamp_segundos': ('gauge', "Hora (epoch) del último ciclo de staging exitoso"),
+    'segundos_desde_ultima_sincronizacion': ('gauge', "Segundos desde el último ciclo de staging exitoso"),
+    'inicio_timestamp_segundos': ('gauge', "Hora (epoch) de inicio del daemon"),
+    'arranque_segundos': ('gauge', "Segundos desde el inicio del proceso hasta cada etapa del arranque"),
+}
+
+_lock = threading.Lock()
+# (nombre, etiquetas ordenadas) -> valor; los histogramas guardan {'buckets', 'suma', 'cuenta', 'ultimo'}
+_valores = {}
+_servidor = None
+# Copia del estado publicada en LOG_SHARED_DIR: hora (monotonic) y métricas de la última publicación
+_ultima_publicacion_estado = 0.0
+_ultimo_estado_publicado = None
+_publicacion_lock = threading.Lock()
+# Referencia de las etapas del arranque; MediaSync-Daemon.py la fija antes de sus imports
+_inicio_proceso = time.perf_counter()
+
+# ============================================================================
+# FUNCIONES HELPER PRIVADAS
+# ============================================================================
+
+def _clave(nombre, etiquetas):
+    if nombre not in METRICAS:
+        raise KeyError(f"Métrica no registrada: {nombre}")
+    return nombre, tuple(sorted(etiquetas.items()))
+
+def _escapar(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _formatear_etiquetas(etiquetas, extra=()):
+    pares = list(etiquetas) + list(extra)
+    if not pares:
+        return ''
+    return '{' + ','.join(f'{k}="{_escapar(v)}"' for k, v in pares) + '}'
+
+def _formatear_numero(valor):
+    if valor == float('inf'):
+        return '+Inf'
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+def _derivadas():
+    """Valores que dependen del momento de la consulta"""
+    with _lock:
+        ultimas = [(etiquetas, v) for (n, etiquetas), v in _valores.items()
+                   if n == 'ultima_sincronizacion_timestamp_segundos']
+    for etiquetas, ultima in ultimas:
+        fijar('segundos_desde_ultima_sincronizacion', round(time.time() - ultima, 3), **dict(etiquetas))
+
+def _crear_servidor(host, puerto):
+    # http.server se importa aquí: su carga (email, http.client) no retrasa el arranque del daemon
+    from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+    class _ManejadorMetricas(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] == '/metrics':
+                cuerpo, tipo = exportar_prometheus().encode('utf-8'), 'text/plain; version=0.0.4; charset=utf-8'
+            elif self.path.split('?')[0] in ('/estado', '/status'):
+                cuerpo, tipo = json.dumps(estado(), indent=2).encode('utf-8'), 'application/json'
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', tipo)
+            self.send_header('Content-Length', str(len(cuerpo)))
+            self.end_headers()
+            self.wfile.write(cuerpo)
+
+        def log_message(self, formato, *args):
+            # Cada consulta del recolector no debe llenar el log del daemon
+            pass
+
+    return ThreadingHTTPServer((host, puerto), _ManejadorMetricas)
+
+# ============================================================================
+# FUNCIONES PRINCIPALES
+# ============================================================================
+
+def incrementar(nombre, valor=1, **etiquetas):
+    clave = _clave(nombre, etiquetas)
+    with _lock:
+        _valores[clave] = _valores.get(clave, 0) + valor
+
+def fijar(nombre, valor, **etiquetas):
+    clave = _clave(nombre, etiquetas)
+    with _lock:
+        _valores[clave] = valor
+
+def observar(nombre, valor, **etiquetas):
+    """Registra una muestra en un histograma"""
+    clave = _clave(nombre, etiquetas)
+    with _lock:
+        histograma = _valores.get(clave)
+        if histograma is None:
+            histograma = {'buckets': [0] * len(BUCKETS_SEGUNDOS), 'suma': 0.0, 'cuenta': 0, 'ultimo': None}
+            _valores[clave] = histograma
+        for i, limite in enumerate(BUCKETS_SEGUNDOS):
+            if valor <= limite:
+                histograma['buckets'][i] += 1
+        histograma['suma'] += valor
+        histograma['cuenta'] += 1
+        histograma['ultimo'] = valor
+
+@contextmanager
+def medir_fase(fase, **etiquetas):
+    """Mide la duración del bloque en el histograma fase_segundos{fase=...} (también si lanza excepción)"""
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        observar('fase_segundos', time.perf_counter() - inicio, fase=fase, **etiquetas)
+
+def fijar_inicio_proceso(instante):
+    """Instante (time.perf_counter) desde el que se miden las etapas del arranque"""
+    global _inicio_proceso
+    _inicio_proceso = instante
+
+def marcar_arranque(etapa, **etiquetas):
+    """Registra una sola vez cuánto tardó el arranque en llegar a la etapa (arranque_segundos{etapa=...})"""
+    etiquetas['etapa'] = etapa
+    clave = _clave('arranque_segundos', etiquetas)
+    with _lock:
+        if clave not in _valores:
+            _valores[clave] = round(time.perf_counter() - _inicio_proceso, 3)
+
+def etapas_arranque():
+    """Etapas registradas en orden: lista de (etiquetas, segundos desde el inicio del proceso)"""
+    with _lock:
+        etapas = [(dict(etiquetas), v) for (n, etiquetas), v in _valores.items() if n == 'arranque_segundos']
+    return sorted(etapas, key=lambda e: e[1])
+
+def exportar_prometheus():
+    """Todas las métricas en formato de texto de Prometheus"""
+    _derivadas()
+    with _lock:
+        copia = {clave: (dict(v, buckets=list(v['buckets'])) if isinstance(v, dict) else v)
+                 for clave, v in _valores.items()}
+    lineas = []
+    for nombre, (tipo, ayuda) in METRICAS.items():
+        series = sorted((etiquetas, v) for (n, etiquetas), v in copia.items() if n == nombre)
+        if not series:
+            continue
+        completo = PREFIJO + nombre
+        lineas.append(f"# HELP {completo} {ayuda}")
+        lineas.append(f"# TYPE {completo} {tipo}")
+        for etiquetas, valor in series:
+            if tipo != 'histogram':
+                lineas.append(f"{completo}{_formatear_etiquetas(etiquetas)} {_formatear_numero(valor)}")
+                continue
+            for limite, cuenta in zip(BUCKETS_SEGUNDOS, valor['buckets']):
+                lineas.append(f"{completo}_bucket{_formatear_etiquetas(etiquetas, [('le', limite)])} {cuenta}")
+            lineas.append(f"{completo}_bucket{_formatear_etiquetas(etiquetas, [('le', '+Inf')])} "
+                          f"{valor['cuenta']}")
+            lineas.append(f"{completo}_sum{_formatear_etiquetas(etiquetas)} {_formatear_numero(valor['suma'])}")
+            lineas.append(f"{completo}_count{_formatear_etiquetas(etiquetas)} {valor['cuenta']}")
+    return '\n'.join(lineas) + '\n'
+
+def estado():
+    """
+    Resumen para el archivo de estado JSON: contadores y medidores por nombre, y de cada
+    histograma su cuenta, suma, promedio y última muestra.
+    """
+    _derivadas()
+    metricas = {}
+    with _lock:
+        for (nombre, etiquetas), valor in sorted(_valores.items()):
+            clave = nombre + (_formatear_etiquetas(etiquetas) if etiquetas else '')
+            if isinstance(valor, dict):
+                metricas[clave] = {'cuenta': valor['cuenta'], 'suma': round(valor['suma'], 6),
+                                   'promedio': round(valor['suma'] / valor['cuenta'], 6) if valor['cuenta'] else None,
+                                   'ultimo': None if valor['ultimo'] is None else round(valor['ultimo'], 6)}
+            else:
+                metricas[clave] = valor
+    return {
+        'equipo': socket.gethostname(),
+        'pid': os.getpid(),
+        'actualizado': time.strftime("%Y-%m-%dT%H:%M:%S"),
+        'metricas': metricas
+    }
+
+def escribir_estado(status_file=None):
+    """Escribe el archivo de estado JSON de forma atómica (tmp + os.replace)"""
+    status_file = status_file or Config.PATHS['STATUS_FILE']
+    temporal = status_file + ".tmp"
+    try:
+        with open(temporal, "w", encoding="utf-8") as f:
+            json.dump(estado(), f, indent=2)
+        os.replace(temporal, status_file)
+    except OSError as e:
+        log(f"WARNING: No se pudo escribir el archivo de estado {status_file}: {e}")
+
+def publicar_estado(forzar=False):
+    """
+    Publica el estado en LOG_SHARED_DIR como MediaSync_estado_<equipo>.json para monitorear la flota,
+    al ritmo de los segmentos del log (como máximo una vez por LOG_PUSH_INTERVAL, salvo forzar=True al
+    detener) y solo si las métricas cambiaron: un archivo igual no vuelve a subirse por OneDrive.
+    Returns:
+        str | None: Ruta publicada
+    """
+    global _ultima_publicacion_estado, _ultimo_estado_publicado
+    shared_dir = Config.LOG_CONFIG['LOG_SHARED_DIR']
+    if not shared_dir:
+        return None
+    with _publicacion_lock:
+        ahora = time.monotonic()
+        if not forzar and ahora - _ultima_publicacion_estado < Config.LOG_CONFIG['LOG_PUSH_INTERVAL']:
+            return None
+        contenido = estado()
+        # Los segundos desde la última sincronización cambian en cada consulta aunque nada haya pasado
+        metricas = {clave: valor for clave, valor in contenido['metricas'].items()
+                    if not clave.startswith('segundos_desde_ultima_sincronizacion')}
+        if metricas == _ultimo_estado_publicado:
+            return None
+        destino = os.path.join(shared_dir, f"MediaSync_estado_{contenido['equipo']}.json")
+        try:
+            with open(destino + ".tmp", "w", encoding="utf-8") as f:
+                json.dump(contenido, f, indent=2)
+            os.replace(destino + ".tmp", destino)
+        except OSError as e:
+            log(f"WARNING: No se pudo publicar el estado en {shared_dir}, se reintentará: {e}")
+            return None
+        _ultima_publicacion_estado, _ultimo_estado_publicado = ahora, metricas
+        return destino
+
+def iniciar_servidor_metricas():
+    """
+    Expone /metrics (Prometheus) y /estado (JSON) en METRICS_HOST:METRICS_PORT en un hilo propio.
+    Si el puerto está ocupado el daemon sigue sin endpoint; el archivo de estado se escribe igual.
+    """
+    global _servidor
+    if not Config.METRICS_CONFIG['METRICS_ENABLED'] or _servidor is not None:
+        return
+    host, puerto = Config.METRICS_CONFIG['METRICS_HOST'], Config.METRICS_CONFIG['METRICS_PORT']
+    try:
+        _servidor = _crear_servidor(host, puerto)
+    except OSError as e:
+        log(f"WARNING: No se pudo iniciar el endpoint de métricas en {host}:{puerto}: {e}")
+        return
+    _servidor.daemon_threads = True
+    threading.Thread(target=_servidor.serve_forever, name="metricas", daemon=True).start()
+    log(f"Métricas disponibles en http://{host}:{puerto}/metrics")
+
+def detener_servidor_metricas():
+    global _servidor
+    if _servidor is not None:
+        _servidor.shutdown()
+        _servidor.server_close()
+        _servidor = None
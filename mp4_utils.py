@@ -0,0 +1,355 @@
+import io
+import os
+import struct
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from logging_utils import log
+from config import Config
+from copy_utils import SUFIJO_PARCIAL
+from io_utils import limitar, prioridad_baja, espera_del_hilo, registrar_limitacion
+from metrics_utils import incrementar, medir_fase
+
+# Extensiones con estructura ISO BMFF (cajas/atoms) que se pueden recorrer
+EXTENSIONES_ISO_BMFF = ('.mp4', '.m4v', '.mov')
+
+# Resultados por archivo -> (tamaño, mtime_ns, válido): un archivo sin cambios no se vuelve a recorrer.
+# La clave es (dispositivo, inode) si el sistema la provee: los hardlinks del almacén y de cada
+# generación comparten resultado, así el contenido se verifica una sola vez
+_cache_validacion = {}
+_cache_lock = threading.Lock()
+
+# Cajas entre 'moov' y las tablas de offsets de chunks (stco de 32 bits, co64 de 64 bits)
+_CONTENEDORES_TABLAS = ('trak', 'mdia', 'minf', 'stbl')
+
+# Archivo en reescritura por faststart; termina en SUFIJO_PARCIAL para que la limpieza del almacén
+# elimine el que quede de una reescritura interrumpida
+SUFIJO_FASTSTART = '.faststart' + SUFIJO_PARCIAL
+
+# Pool de procesos del faststart (MP4_FASTSTART_WORKERS), creado al primer uso
+_pool = None
+_pool_lock = threading.Lock()
+
+class EstructuraMP4Error(Exception):
+    pass
+
+# ============================================================================
+# FUNCIONES HELPER PRIVADAS
+# ============================================================================
+
+def _tipo_valido(tipo):
+    # Los tipos de caja son 4 caracteres imprimibles; ceros o basura indican datos sin descargar
+    return all(32 <= c < 127 for c in tipo)
+
+def _tablas_chunks(f, inicio, fin):
+    """Cajas stco/co64 de todas las pistas dentro de un 'moov' en memoria"""
+    for tipo, offset, tamano, encabezado in recorrer_cajas(f, inicio, fin):
+        if tipo in _CONTENEDORES_TABLAS:
+            yield from _tablas_chunks(f, offset + encabezado, offset + tamano)
+        elif tipo in ('stco', 'co64'):
+            yield tipo, offset, tamano, encabezado
+
+def _desplazar_chunks(moov, encabezado_moov, desde, hasta, delta):
+    """
+    Suma delta a los offsets de chunks del 'moov' (bytearray) que apuntan a [desde, hasta).
+    Returns: False si algún offset de una tabla stco ya no cabe en 32 bits (no se modifica nada)
+    """
+    cambios = []
+    for tipo, offset, tamano, encabezado in _tablas_chunks(io.BytesIO(moov), encabezado_moov, len(moov)):
+        # Versión y flags (4 bytes), cantidad de entradas (4 bytes) y las entradas
+        datos = offset + encabezado + 8
+        if datos > offset + tamano:
+            raise EstructuraMP4Error(f"Tabla '{tipo}' truncada")
+        cantidad = struct.unpack_from('>I', moov, datos - 4)[0]
+        formato = f">{cantidad}{'I' if tipo == 'stco' else 'Q'}"
+        if datos + struct.calcsize(formato) > offset + tamano:
+            raise EstructuraMP4Error(f"Tabla '{tipo}' declara {cantidad} entradas que no caben en la caja")
+        valores = [v + delta if desde <= v < hasta else v for v in struct.unpack_from(formato, moov, datos)]
+        if tipo == 'stco' and valores and max(valores) > 0xFFFFFFFF:
+            return False
+        cambios.append((formato, datos, valores))
+    for formato, datos, valores in cambios:
+        struct.pack_into(formato, moov, datos, *valores)
+    return True
+
+def _copiar_rango(origen, destino, inicio, cantidad, bloque):
+    """Copia cantidad bytes desde inicio; cada bloque espera su turno en la cubeta de IO_MAX_MB_S"""
+    origen.seek(inicio)
+    while cantidad > 0:
+        limitar(min(bloque, cantidad), 'faststart')
+        datos = origen.read(min(bloque, cantidad))
+        if not datos:
+            raise EstructuraMP4Error(f"El archivo terminó antes de lo esperado (offset {origen.tell()})")
+        destino.write(datos)
+        cantidad -= len(datos)
+
+def _ubicacion_moov(f, size):
+    """
+    (moov, primer mdat) como tuplas de recorrer_cajas, o None si el archivo no se puede reordenar:
+    sin 'moov' o sin 'mdat', o fragmentado ('moof', sus offsets son relativos a cada fragmento)
+    """
+    cajas = {}
+    for caja in recorrer_cajas(f, 0, size):
+        cajas.setdefault(caja[0], caja)
+    if 'moof' in cajas or 'moov' not in cajas or 'mdat' not in cajas:
+        return None
+    return cajas['moov'], cajas['mdat']
+
+def _iniciar_proceso(copy_config):
+    # Los procesos del pool parten de config.py: reciben los valores vigentes al crearse el pool
+    Config.COPY_CONFIG.update(copy_config)
+
+def _reubicar_en_proceso(path, bloque, tasa_mb_s):
+    """
+    Reescritura en un proceso del pool. La cubeta de tokens es de cada proceso: tasa_mb_s es la parte de
+    IO_MAX_MB_S de este proceso y se aplica por bloque dentro de _copiar_rango.
+    Returns:
+        tuple: (resultado de reubicar_moov, bytes copiados, segundos de espera por la limitación)
+    """
+    Config.COPY_CONFIG['IO_MAX_MB_S'] = tasa_mb_s
+    espera = espera_del_hilo()
+    with prioridad_baja():
+        resultado = reubicar_moov(path, bloque)
+    copiados = os.path.getsize(path) if resultado == 'reubicado' else 0
+    return resultado, copiados, espera_del_hilo() - espera
+
+def _obtener_pool():
+    """
+    Pool de procesos acotado por MP4_FASTSTART_WORKERS, creado una vez y reutilizado entre ciclos.
+    'spawn' también en Linux: con los hilos del daemon, fork podría copiar un lock tomado.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=Config.VIDEO_CONFIG['MP4_FASTSTART_WORKERS'],
+                                        mp_context=multiprocessing.get_context('spawn'),
+                                        initializer=_iniciar_proceso, initargs=(dict(Config.COPY_CONFIG),))
+        return _pool
+
+# ============================================================================
+# FUNCIONES PRINCIPALES
+# ============================================================================
+
+def recorrer_cajas(f, inicio, fin):
+    """
+    Recorre las cajas (atoms) de un archivo ISO BMFF entre inicio y fin leyendo solo los encabezados.
+    Args:
+        f: Archivo abierto en modo binario
+        inicio (int): Offset de la primera caja
+        fin (int): Offset donde terminan las cajas (tamaño del archivo para el nivel superior)
+    Yields:
+        tuple: (tipo, offset, tamaño total, tamaño del encabezado)
+    Raises:
+        EstructuraMP4Error: encabezado truncado, tipo inválido o caja que excede fin
+    """
+    offset = inicio
+    while offset < fin:
+        if fin - offset < 8:
+            raise EstructuraMP4Error(f"{fin - offset} bytes sueltos al final (offset {offset})")
+        f.seek(offset)
+        encabezado = f.read(8)
+        if len(encabezado) < 8:
+            raise EstructuraMP4Error(f"Encabezado truncado en offset {offset}")
+        tamano, tipo = struct.unpack('>I4s', encabezado)
+        if not _tipo_valido(tipo):
+            raise EstructuraMP4Error(f"Tipo de caja inválido en offset {offset}")
+        tipo = tipo.decode('ascii')
+
+        largo_encabezado = 8
+        if tamano == 1:
+            # Tamaño de 64 bits a continuación del tipo (mdat de más de 4 GB)
+            extendido = f.read(8)
+            if len(extendido) < 8:
+                raise EstructuraMP4Error(f"Tamaño extendido truncado en '{tipo}'")
+            tamano = struct.unpack('>Q', extendido)[0]
+            largo_encabezado = 16
+        elif tamano == 0:
+            # La caja llega hasta el final del archivo
+            tamano = fin - offset
+
+        if tamano < largo_encabezado:
+            raise EstructuraMP4Error(f"Caja '{tipo}' con tamaño inválido ({tamano}) en offset {offset}")
+        if offset + tamano > fin:
+            raise EstructuraMP4Error(f"Caja '{tipo}' incompleta: declara {tamano} bytes, "
+                                     f"quedan {fin - offset}")
+        yield tipo, offset, tamano, largo_encabezado
+        offset += tamano
+
+def validar_estructura_mp4(file_path, size=None):
+    """
+    Valida la estructura de un MP4 sin leer su contenido: las cajas de nivel superior deben
+    sumar exactamente el tamaño del archivo y deben existir 'ftyp' y 'moov'.
+    Detecta descargas parciales o truncadas que pasan la verificación por bloques.
+    Returns:
+        tuple: (True si es válido, motivo del rechazo o None)
+    """
+    try:
+        if size is None:
+            size = os.path.getsize(file_path)
+        with open(file_path, "rb") as f:
+            tipos = [tipo for tipo, _, _, _ in recorrer_cajas(f, 0, size)]
+    except EstructuraMP4Error as e:
+        return False, str(e)
+    except OSError as e:
+        return False, f"No se puede leer: {e}"
+
+    if 'ftyp' not in tipos:
+        return False, "Falta la caja 'ftyp'"
+    if 'moov' not in tipos:
+        return False, "Falta la caja 'moov' (índice de reproducción)"
+    return True, None
+
+def es_mp4_completo(file_path, st=None):
+    """
+    True si el archivo no necesita validación estructural (otro formato) o si la supera.
+    El resultado se guarda por archivo, tamaño y mtime_ns para no repetir el recorrido en cada ciclo.
+    """
+    if not Config.VIDEO_CONFIG['MP4_STRUCTURE_CHECK'] or not file_path.lower().endswith(EXTENSIONES_ISO_BMFF):
+        return True
+    if st is None:
+        st = os.stat(file_path)
+    version = (st.st_size, st.st_mtime_ns)
+    clave = (st.st_dev, st.st_ino) if st.st_ino else file_path
+    with _cache_lock:
+        previo = _cache_validacion.get(clave)
+        if previo is not None and previo[:2] == version:
+            return previo[2]
+
+    valido, motivo = validar_estructura_mp4(file_path, st.st_size)
+    if not valido:
+        log(f"WARNING: MP4 incompleto o dañado, se excluye hasta que esté completo: "
+            f"{os.path.basename(file_path)} ({motivo})")
+    with _cache_lock:
+        _cache_validacion[clave] = version + (valido,)
+    return valido
+
+def reubicar_moov(path, bloque=8 * 1024 * 1024):
+    """
+    Faststart: reescribe un MP4 con 'moov' después de los datos para que quede antes del primer 'mdat'.
+    Con el índice al final VLC lee hasta el final del archivo antes del primer cuadro. Los offsets de
+    chunks (stco/co64) se corrigen por el tamaño de 'moov'; el archivo conserva tamaño y mtime, así
+    planificar_delta lo sigue reconociendo como sin cambios. Se reemplaza con os.replace al terminar.
+    Args:
+        path (str): Archivo a reescribir (no debe estar enlazado ni en reproducción)
+        bloque (int): Tamaño de lectura/escritura en bytes
+    Returns:
+        str: 'reubicado', 'ya_optimizado' o 'no_aplica' (sin moov/mdat, fragmentado o con offsets
+             de stco que pasarían de 32 bits)
+    Raises:
+        EstructuraMP4Error, OSError: El archivo queda sin cambios
+    """
+    st = os.stat(path)
+    temporal = path + SUFIJO_FASTSTART
+    with open(path, "rb") as f:
+        ubicacion = _ubicacion_moov(f, st.st_size)
+        if ubicacion is None:
+            return 'no_aplica'
+        (_, inicio_moov, tamano_moov, encabezado_moov), (_, insercion, _, _) = ubicacion
+        if inicio_moov < insercion:
+            return 'ya_optimizado'
+
+        f.seek(inicio_moov)
+        moov = bytearray(f.read(tamano_moov))
+        if len(moov) < tamano_moov:
+            raise EstructuraMP4Error("Caja 'moov' truncada")
+        if struct.unpack_from('>I', moov)[0] == 0:
+            # 'moov' declarado hasta el final del archivo: al moverlo necesita su tamaño explícito
+            if tamano_moov > 0xFFFFFFFF:
+                return 'no_aplica'
+            struct.pack_into('>I', moov, 0, tamano_moov)
+        # Todo lo que estaba entre el primer 'mdat' y 'moov' avanza tamano_moov bytes
+        if not _desplazar_chunks(moov, encabezado_moov, insercion, inicio_moov, tamano_moov):
+            return 'no_aplica'
+
+        try:
+            with open(temporal, "wb") as salida:
+                _copiar_rango(f, salida, 0, insercion, bloque)
+                salida.write(moov)
+                _copiar_rango(f, salida, insercion, inicio_moov - insercion, bloque)
+                fin_moov = inicio_moov + tamano_moov
+                _copiar_rango(f, salida, fin_moov, st.st_size - fin_moov, bloque)
+                salida.flush()
+                os.fsync(salida.fileno())
+        except BaseException:
+            if os.path.exists(temporal):
+                os.remove(temporal)
+            raise
+    # Fuera del with: en Windows no se puede reemplazar un archivo abierto
+    os.utime(temporal, ns=(st.st_atime_ns, st.st_mtime_ns))
+    os.replace(temporal, path)
+    return 'reubicado'
+
+def optimizar_inicio(paths, nombres=None):
+    """
+    Etapa de faststart (MP4_FASTSTART) para archivos recién copiados: los encabezados se revisan
+    aquí y solo los que tienen 'moov' al final se reescriben, en paralelo en el pool de procesos.
+    Cada reescritura cuenta para IO_MAX_MB_S como una copia: los procesos del pool se reparten el
+    límite y lo aplican bloque a bloque. Un archivo que falla queda como estaba.
+    Args:
+        paths (list): Archivos a revisar (los que no son ISO BMFF se ignoran)
+        nombres (list): Nombre de cada archivo para el log (por defecto, el de path)
+    Returns:
+        dict: path -> 'reubicado', 'ya_optimizado', 'no_aplica' o 'error'
+    """
+    global _pool
+    resultados = {}
+    nombres = dict(zip(paths, nombres or [os.path.basename(p) for p in paths]))
+    paths = [p for p in paths if p.lower().endswith(EXTENSIONES_ISO_BMFF)]
+    if not Config.VIDEO_CONFIG['MP4_FASTSTART'] or not paths:
+        return resultados
+
+    pendientes = []
+    for path in paths:
+        try:
+            size = os.path.getsize(path)
+            with open(path, "rb") as f:
+                ubicacion = _ubicacion_moov(f, size)
+        except (EstructuraMP4Error, OSError) as e:
+            log(f"WARNING: No se pudo revisar {nombres[path]} para faststart: {e}")
+            resultados[path] = 'error'
+            continue
+        if ubicacion is None:
+            resultados[path] = 'no_aplica'
+        elif ubicacion[0][1] < ubicacion[1][1]:
+            resultados[path] = 'ya_optimizado'
+        else:
+            pendientes.append(path)
+
+    if pendientes:
+        bloque = int(Config.COPY_CONFIG['COPY_CHUNK_SIZE_MB'] * 1024 * 1024)
+        tasa_mb_s = Config.COPY_CONFIG['IO_MAX_MB_S'] / Config.VIDEO_CONFIG['MP4_FASTSTART_WORKERS']
+        with medir_fase('faststart'):
+            pool = _obtener_pool()
+            futuros = {pool.submit(_reubicar_en_proceso, path, bloque, tasa_mb_s): path for path in pendientes}
+            for futuro in as_completed(futuros):
+                path = futuros[futuro]
+                nombre = nombres[path]
+                try:
+                    resultados[path], copiados, espera = futuro.result()
+                    registrar_limitacion(copiados, espera, 'faststart')
+                except BrokenProcessPool as e:
+                    # Un proceso del pool murió: el pool no se puede reutilizar, se crea otro en el siguiente uso
+                    resultados[path] = 'error'
+                    log(f"ERROR: Faststart de {nombre} interrumpido, se reinicia el pool de procesos: {e}")
+                    with _pool_lock:
+                        if _pool is pool:
+                            _pool = None
+                except (EstructuraMP4Error, OSError) as e:
+                    resultados[path] = 'error'
+                    log(f"WARNING: Faststart de {nombre} falló, se usa tal como llegó: {e}")
+                else:
+                    if resultados[path] == 'reubicado':
+                        log(f"Faststart: índice (moov) de {nombre} movido al inicio")
+
+    for resultado in resultados.values():
+        incrementar('mp4_faststart_total', resultado=resultado)
+    return resultados
+
+def detener_faststart():
+    """Termina los procesos del pool de faststart (al detener el daemon)"""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,90 @@
+import time
+import random
+import threading
+from logging_utils import log
+from config import Config
+
+# Estados del circuito
+CERRADO = 'cerrado'          # Funcionamiento normal
+ABIERTO = 'abierto'          # Demasiados fallos seguidos: se sigue con el último estado bueno y se reintenta en segundo plano
+
+# Exponente máximo del backoff: con muchos fallos seguidos 2 ** (fallos - 1) no debe crecer sin límite
+MAX_EXPONENTE = 32
+
+class PlanificadorReintentos:
+    """
+    Reintentos con backoff exponencial, jitter y tope, más un circuito que reemplaza la salida
+    del daemon tras varios fallos seguidos.
+
+    Cada fallo duplica la espera desde `base` hasta `maximo`; el jitter resta al azar hasta
+    esa fracción de la espera para que varias pantallas no reintenten todas a la vez.
+    Tras `umbral` fallos consecutivos el circuito se abre: quien lo usa mantiene lo último
+    que funcionó y sigue reintentando con la espera máxima alcanzada. El primer éxito lo cierra.
+    Es seguro entre hilos; estado() expone la situación actual a quien llama.
+    """
+
+    def __init__(self, nombre, base=None, maximo=None, jitter=None, umbral=None, aleatorio=None):
+        self.nombre = nombre
+        self.base = Config.SYNC_CONFIG['ERROR_RETRY_DELAY'] if base is None else base
+        self.maximo = Config.SYNC_CONFIG['RETRY_MAX_DELAY'] if maximo is None else maximo
+        self.jitter = Config.SYNC_CONFIG['RETRY_JITTER'] if jitter is None else jitter
+        self.umbral = Config.SYNC_CONFIG['MAX_CONSECUTIVE_ERRORS'] if umbral is None else umbral
+        self._aleatorio = aleatorio or random.Random()
+        self._lock = threading.Lock()
+        self.estado_circuito = CERRADO
+        self.fallos = 0
+        self.espera = 0.0
+        self.proximo_intento = None
+        self.desde = time.time()
+        self.ultimo_error = None
+
+    def _calcular_espera(self):
+        espera = min(self.base * (2 ** min(self.fallos - 1, MAX_EXPONENTE)), self.maximo)
+        return espera * (1 - self.jitter * self._aleatorio.random())
+
+    def registrar_fallo(self, error=None):
+        """
+        Registra un intento fallido.
+        Returns:
+            float: Segundos hasta el siguiente intento
+        """
+        with self._lock:
+            self.fallos += 1
+            self.ultimo_error = str(error) if error is not None else None
+            self.espera = self._calcular_espera()
+            self.proximo_intento = time.time() + self.espera
+            if self.fallos >= self.umbral and self.estado_circuito == CERRADO:
+                self.estado_circuito = ABIERTO
+                self.desde = time.time()
+                log(f"WARNING: Circuito '{self.nombre}' abierto tras {self.fallos} fallos consecutivos; "
+                    f"se mantiene el último estado válido y se reintenta en segundo plano")
+            return self.espera
+
+    def registrar_exito(self):
+        with self._lock:
+            if self.estado_circuito != CERRADO:
+                log(f"Circuito '{self.nombre}' cerrado: recuperado tras {self.fallos} fallos "
+                    f"({time.time() - self.desde:.0f} s abierto)")
+                self.desde = time.time()
+            self.estado_circuito = CERRADO
+            self.fallos = 0
+            self.espera = 0.0
+            self.proximo_intento = None
+            self.ultimo_error = None
+
+    @property
+    def abierto(self):
+        return self.estado_circuito != CERRADO
+
+    def estado(self):
+        """Copia del estado actual para logs, métricas y el archivo de estado"""
+        with self._lock:
+            return {
+                'nombre': self.nombre,
+                'estado': self.estado_circuito,
+                'fallos_consecutivos': self.fallos,
+                'espera': round(self.espera, 3),
+                'proximo_intento': self.proximo_intento,
+                'desde': self.desde,
+                'ultimo_error': self.ultimo_error
+            }
@@ -0,0 +1,97 @@
+import os
+import math
+import time
+from logging_utils import log
+from config import Config
+from file_utils import ultimo_stat
+from sync_utils import esta_deshidratado
+from metrics_utils import observar
+
+class RastreadorEstabilidad:
+    """
+    Decide qué archivos terminaron de llegar observando su tamaño y mtime entre revisiones.
+
+    Un archivo está listo cuando su firma (tamaño, mtime_ns) no cambia durante STABILITY_WINDOW
+    segundos y su contenido no sigue en la nube. Cada archivo se publica en cuanto se estabiliza,
+    sin esperar al resto de la carpeta.
+
+    Mientras un archivo sigue cambiando, el intervalo entre revisiones se duplica desde
+    STABILITY_POLL_MIN hasta STABILITY_POLL_MAX (backoff), y vuelve al mínimo cuando
+    el archivo se estabiliza o deja de existir.
+    """
+
+    def __init__(self, ventana=None, sondeo_min=None, sondeo_max=None):
+        self.ventana = Config.SYNC_CONFIG['STABILITY_WINDOW'] if ventana is None else ventana
+        self.sondeo_min = Config.SYNC_CONFIG['STABILITY_POLL_MIN'] if sondeo_min is None else sondeo_min
+        self.sondeo_max = Config.SYNC_CONFIG['STABILITY_POLL_MAX'] if sondeo_max is None else sondeo_max
+        # nombre -> {'firma', 'desde' (monotonic sin cambios), 'detectado', 'intervalo', 'listo'}
+        self._estado = {}
+
+    def _observar(self, nombre, st, ahora):
+        firma = (st.st_size, st.st_mtime_ns)
+        estado = self._estado.get(nombre)
+        if estado is None:
+            # Primera observación (p. ej. al arrancar): un archivo que no se modificó en toda
+            # la ventana se da por estable de inmediato para no retrasar la reproducción inicial
+            # (sin restar la ventana de 'ahora': el redondeo podría dejarlo a una fracción de cumplirla)
+            antiguedad = max(time.time() - st.st_mtime, 0)
+            desde = -math.inf if antiguedad >= self.ventana else ahora - antiguedad
+            estado = {'firma': firma, 'desde': desde, 'detectado': ahora,
+                      'intervalo': self.sondeo_min, 'listo': False}
+            self._estado[nombre] = estado
+        elif estado['firma'] != firma:
+            # Sigue llegando: reiniciar la ventana y espaciar la siguiente revisión
+            if estado['listo']:
+                log(f"INFO: {nombre} cambió después de publicarse, se espera a que se estabilice")
+                estado['detectado'] = ahora
+            estado.update(firma=firma, desde=ahora, listo=False,
+                          intervalo=min(estado['intervalo'] * 2, self.sondeo_max))
+
+        if not estado['listo'] and ahora - estado['desde'] >= self.ventana and not esta_deshidratado(st):
+            estado['listo'] = True
+            estado['intervalo'] = self.sondeo_min
+            # Los archivos que ya estaban estables al verse por primera vez no esperaron
+            if ahora > estado['detectado']:
+                observar('espera_estabilidad_segundos', ahora - estado['detectado'])
+        return estado['listo']
+
+    def clasificar(self, video_dir, nombres):
+        """
+        Toma una muestra de cada archivo y lo clasifica.
+        Usa el stat del último escaneo de validar_dir() si existe (sin llamadas extra).
+        Args:
+            video_dir (str): Directorio fuente
+            nombres (list): Archivos candidatos (resultado de validar_dir)
+        Returns:
+            tuple: (listos, en_espera), ambos en el orden recibido
+        """
+        ahora = time.monotonic()
+        listos, en_espera = [], []
+        for nombre in nombres:
+            file_path = os.path.join(video_dir, nombre)
+            try:
+                st = ultimo_stat(file_path) or os.stat(file_path)
+            except OSError:
+                self._estado.pop(nombre, None)
+                continue
+            (listos if self._observar(nombre, st, ahora) else en_espera).append(nombre)
+
+        # Olvidar archivos que ya no son candidatos
+        vigentes = set(nombres)
+        for nombre in [n for n in self._estado if n not in vigentes]:
+            del self._estado[nombre]
+        return listos, en_espera
+
+    def pendientes(self):
+        """Nombres observados que aún no están listos"""
+        return {nombre for nombre, estado in self._estado.items() if not estado['listo']}
+
+    def proxima_revision(self):
+        """
+        Segundos hasta la próxima muestra útil: el fin de la ventana del archivo más próximo
+        a estabilizarse, o su intervalo de backoff si es mayor. None si no hay pendientes.
+        """
+        ahora = time.monotonic()
+        esperas = [max(self.ventana - (ahora - estado['desde']), estado['intervalo'])
+                   for estado in self._estado.values() if not estado['listo']]
+        return min(esperas) if esperas else None
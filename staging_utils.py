@@ -0,0 +1,238 @@
+import os
+import shutil
+from logging_utils import log
+from config import Config
+from file_utils import planificar_delta, generar_playlist
+from store_utils import incorporar_archivos, limpiar_almacen
+from mp4_utils import es_mp4_completo
+from vlc_utils import validar_playlist
+from journal_utils import registrar_intencion
+from metrics_utils import medir_fase
+
+# Cada refresco se escribe en TEMP_VIDEO_DIR/gen_NNNNNN con su propia playlist gen_NNNNNN.m3u;
+# el archivo ARCHIVO_ACTIVA indica cuál está en reproducción
+PREFIJO_GENERACION = 'gen_'
+ARCHIVO_ACTIVA = 'generacion_activa'
+
+# ============================================================================
+# FUNCIONES HELPER PRIVADAS
+# ============================================================================
+
+def _mb(num_bytes):
+    return num_bytes / (1024 * 1024)
+
+def _raiz(staging_root=None):
+    return staging_root or Config.PATHS['TEMP_VIDEO_DIR']
+
+def _numero(nombre):
+    try:
+        return int(nombre[len(PREFIJO_GENERACION):])
+    except ValueError:
+        return None
+
+def _escribir_atomico(path, contenido, encoding="utf-8"):
+    """Escribe un archivo pequeño con os.replace: quien lo lea ve la versión anterior o la nueva, nunca a medias"""
+    temporal = path + ".tmp"
+    with open(temporal, "w", encoding=encoding) as f:
+        f.write(contenido)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporal, path)
+
+def _enlazar(origen, destino):
+    """Hardlink del archivo de la generación activa (sin copiar datos); False si el sistema no lo permite"""
+    try:
+        os.makedirs(os.path.dirname(destino), exist_ok=True)
+        os.link(origen, destino)
+        return True
+    except OSError:
+        return False
+
+def _eliminar_generacion(staging_root, nombre):
+    try:
+        shutil.rmtree(os.path.join(staging_root, nombre))
+        playlist = os.path.join(staging_root, nombre + ".m3u")
+        if os.path.exists(playlist):
+            os.remove(playlist)
+        return True
+    except OSError as e:
+        # En Windows falla si VLC aún tiene abierto un archivo; se reintenta en la siguiente poda
+        log(f"WARNING: No se pudo eliminar la generación {nombre}, se reintentará: {e}")
+        return False
+
+# ============================================================================
+# FUNCIONES PRINCIPALES
+# ============================================================================
+
+def listar_generaciones(staging_root=None):
+    """Nombres de las generaciones existentes, de la más antigua a la más reciente"""
+    staging_root = _raiz(staging_root)
+    if not os.path.isdir(staging_root):
+        return []
+    nombres = [e.name for e in os.scandir(staging_root)
+               if e.is_dir() and e.name.startswith(PREFIJO_GENERACION) and _numero(e.name) is not None]
+    return sorted(nombres, key=_numero)
+
+def generacion_activa(staging_root=None):
+    """Nombre de la generación activa, o None si aún no hay ninguna"""
+    staging_root = _raiz(staging_root)
+    try:
+        with open(os.path.join(staging_root, ARCHIVO_ACTIVA), "r", encoding="utf-8") as f:
+            nombre = f.read().strip()
+    except OSError:
+        return None
+    return nombre if nombre and os.path.isdir(os.path.join(staging_root, nombre)) else None
+
+def construir_generacion(files, src_dir, staging_root=None):
+    """
+    Construye una generación nueva sin tocar la activa (VLC sigue reproduciendo mientras tanto).
+    Los archivos sin cambios respecto a la generación activa se enlazan con hardlinks;
+    solo los nuevos o modificados se copian desde el origen. Si la copia de un archivo
+    modificado falla, se conserva su versión anterior.
+    Returns:
+        dict: 'nombre', 'dir', 'playlist', 'incluidos', 'copiados', 'enlazados', 'reutilizados', 'fallidos', 'bytes_copiados'
+    """
+    staging_root = _raiz(staging_root)
+    os.makedirs(staging_root, exist_ok=True)
+    existentes = listar_generaciones(staging_root)
+    siguiente = _numero(existentes[-1]) + 1 if existentes else 1
+    nombre = f"{PREFIJO_GENERACION}{siguiente:06d}"
+    gen_dir = os.path.join(staging_root, nombre)
+    os.makedirs(gen_dir)
+
+    activa = generacion_activa(staging_root)
+    activa_dir = os.path.join(staging_root, activa) if activa else None
+
+    # Lo que no cambió respecto a la generación activa se enlaza; el resto se copia del origen
+    if activa_dir:
+        plan = planificar_delta(files, src_dir, activa_dir)
+        a_copiar = list(plan['copiar'])
+        enlazados = []
+        for f in plan['sin_cambios']:
+            if _enlazar(os.path.join(activa_dir, f), os.path.join(gen_dir, f)):
+                enlazados.append(f)
+            else:
+                a_copiar.append(f)
+    else:
+        a_copiar, enlazados = list(files), []
+    # Si el daemon se detiene a mitad de la construcción, el diario indica qué faltaba copiar
+    registrar_intencion(staging_root, nombre, 'construyendo', a_copiar)
+
+    # Lo nuevo o modificado pasa por el almacén compartido entre pantallas: si otra pantalla
+    # ya tiene ese contenido, solo se enlaza
+    with medir_fase('copia'):
+        copia = incorporar_archivos(a_copiar, src_dir, gen_dir)
+    fallidos = sorted(copia['fallidos'])
+    for f in fallidos:
+        # Mantener la versión anterior antes que dejar el archivo fuera
+        if activa_dir and os.path.exists(os.path.join(activa_dir, f)):
+            if _enlazar(os.path.join(activa_dir, f), os.path.join(gen_dir, f)):
+                log(f"WARNING: {f} no se pudo copiar, la generación {nombre} conserva su versión anterior")
+
+    incluidos = [f for f in files if os.path.exists(os.path.join(gen_dir, f))]
+    playlist = os.path.join(staging_root, nombre + ".m3u")
+    with medir_fase('playlist'):
+        generar_playlist(incluidos, gen_dir, playlist)
+
+    log(f"Generación {nombre} construida: {len(copia['resultados'])} copiados "
+        f"({_mb(copia['bytes']):.1f} MB), {len(enlazados)} enlazados sin copia, "
+        f"{len(copia['reutilizados'])} desde el almacén, {len(fallidos)} con error")
+    return {
+        'nombre': nombre,
+        'dir': gen_dir,
+        'playlist': playlist,
+        'incluidos': incluidos,
+        'copiados': sorted(r['archivo'] for r in copia['resultados']),
+        'enlazados': enlazados,
+        'reutilizados': sorted(copia['reutilizados']),
+        'fallidos': fallidos,
+        'bytes_copiados': copia['bytes']
+    }
+
+def validar_generacion(generacion):
+    """La playlist de la generación debe tener contenido y cada archivo debe estar completo"""
+    if not generacion['incluidos'] or not validar_playlist(generacion['playlist']):
+        return False
+    for f in generacion['incluidos']:
+        path = os.path.join(generacion['dir'], f)
+        try:
+            if os.path.getsize(path) == 0 or not es_mp4_completo(path):
+                log(f"ERROR: {f} incompleto en la generación {generacion['nombre']}")
+                return False
+        except OSError as e:
+            log(f"ERROR: {f} inaccesible en la generación {generacion['nombre']}: {e}")
+            return False
+    return True
+
+def descartar_generacion(generacion, staging_root=None):
+    """Elimina una generación que no llegó a activarse"""
+    staging_root = _raiz(staging_root)
+    _eliminar_generacion(staging_root, generacion['nombre'])
+    registrar_intencion(staging_root, generacion['nombre'], 'descartada')
+
+def activar_generacion(nombre, playlist_path=None, staging_root=None):
+    """
+    Cambia a la generación indicada de forma atómica: primero la playlist que lee VLC
+    y luego el puntero de generación activa, ambos con os.replace.
+    Después poda las generaciones que sobran (se conservan STAGING_GENERATIONS_KEEP).
+    """
+    staging_root = _raiz(staging_root)
+    playlist_path = playlist_path or Config.PATHS['PLAYLIST_PATH']
+    encoding = Config.LOG_CONFIG['LOG_ENCODING']
+    with open(os.path.join(staging_root, nombre + ".m3u"), "r", encoding=encoding) as f:
+        contenido = f.read()
+    _escribir_atomico(playlist_path, contenido, encoding)
+    _escribir_atomico(os.path.join(staging_root, ARCHIVO_ACTIVA), nombre)
+    registrar_intencion(staging_root, nombre, 'activa')
+    log(f"Generación activa: {nombre}")
+    podar_generaciones(staging_root)
+    # El contenido que dejó de estar en alguna generación de cualquier pantalla se libera
+    limpiar_almacen()
+
+def revertir_generacion(playlist_path=None, staging_root=None):
+    """
+    Vuelve a la generación anterior a la activa (rollback instantáneo, sin copiar nada).
+    Returns:
+        str | None: Nombre de la generación restaurada, o None si no hay anterior
+    """
+    staging_root = _raiz(staging_root)
+    activa = generacion_activa(staging_root)
+    anteriores = [g for g in listar_generaciones(staging_root)
+                  if activa is None or _numero(g) < _numero(activa)]
+    if not anteriores:
+        log("WARNING: No hay generación anterior para revertir")
+        return None
+    anterior = anteriores[-1]
+    log(f"Revirtiendo de la generación {activa} a {anterior}")
+    activar_generacion(anterior, playlist_path, staging_root)
+    return anterior
+
+def podar_generaciones(staging_root=None):
+    """
+    Conserva la generación activa y las más recientes hasta STAGING_GENERATIONS_KEEP
+    (la anterior sirve de rollback y mantiene el archivo que VLC pueda estar reproduciendo).
+    También elimina restos del formato plano anterior de TEMP_VIDEO_DIR.
+    """
+    staging_root = _raiz(staging_root)
+    activa = generacion_activa(staging_root)
+    generaciones = listar_generaciones(staging_root)
+    if activa is None:
+        return
+    # Las generaciones posteriores a la activa son construcciones descartadas o interrumpidas
+    conservar = [g for g in generaciones if _numero(g) <= _numero(activa)]
+    conservar = set(conservar[-Config.SYNC_CONFIG['STAGING_GENERATIONS_KEEP']:]) | {activa}
+    for nombre in generaciones:
+        if nombre not in conservar:
+            _eliminar_generacion(staging_root, nombre)
+
+    propios = conservar | {g + ".m3u" for g in conservar} | {ARCHIVO_ACTIVA}
+    for entrada in os.scandir(staging_root):
+        if entrada.name in propios or (entrada.name.startswith(PREFIJO_GENERACION) and entrada.is_dir()):
+            continue
+        try:
+            if entrada.is_dir(follow_symlinks=False):
+                shutil.rmtree(entrada.path)
+            else:
+                os.remove(entrada.path)
+        except OSError as e:
+            log(f"WARNING: No se pudo limpiar {entrada.name} del staging: {e}")
@@ -0,0 +1,388 @@
+import os
+import json
+import time
+import threading
+from logging_utils import log
+from config import Config
+from copy_utils import copiar_lote, depurar_copias_interrumpidas, SUFIJO_PARCIAL
+from journal_utils import copias_pendientes
+from file_utils import copiar_archivos, ultimo_stat
+from mp4_utils import es_mp4_completo, optimizar_inicio, SUFIJO_FASTSTART
+from sync_utils import calcular_huella
+from metrics_utils import fijar, incrementar
+
+# El almacén guarda cada contenido una sola vez en STORE_DIR/<algoritmo>/<hex[:2]>/<hex><extensión>.
+# Las generaciones de cada pantalla lo enlazan con hardlinks: el número de enlaces de un objeto
+# es su contador de referencias, y un objeto con un solo enlace ya no lo usa ninguna pantalla.
+# Ese contenido se retiene STORE_RETENTION_HOURS (o hasta que haga falta espacio bajo
+# STORE_MAX_SIZE_MB) por si el cambio se revierte.
+
+# Índice del almacén, junto a los objetos:
+#   'liberados': objeto relativo -> hora (epoch) en que dejó de usarlo toda pantalla, es decir, en que
+#                se podó la última generación que lo enlazaba. Es el orden del desalojo: el daemon no
+#                registra la reproducción de cada elemento, y en una playlist en bucle lo que está en
+#                una generación se reproduce hasta que la generación se poda
+#   'origenes': "ruta|tamaño|mtime_ns" del archivo fuente -> objeto relativo, para reconocer
+#               un clip restaurado sin volver a leerlo para calcular su huella
+ARCHIVO_INDICE = 'indice.json'
+
+# Incorporar y limpiar se serializan: una pantalla no puede borrar un objeto que otra
+# acaba de copiar y aún no enlaza, y dos pantallas nunca copian el mismo contenido a la vez
+_lock_almacen = threading.Lock()
+
+# Índice cargado por STORE_DIR (solo se accede con _lock_almacen tomado)
+_indices = {}
+
+# Objetos nuevos en reescritura por faststart, fuera de _lock_almacen: la limpieza no los desaloja
+# ni borra su archivo temporal, y otra pantalla no los enlaza hasta que termina la reescritura
+# (solo se accede con _lock_almacen tomado)
+_reescribiendo = set()
+# Se notifica al terminar cada reescritura
+_reescritura_terminada = threading.Condition(_lock_almacen)
+
+# Si se pueden crear hardlinks del almacén al destino: (st_dev del almacén, st_dev del destino) -> bool
+_enlaces_admitidos = {}
+
+# ============================================================================
+# FUNCIONES HELPER PRIVADAS
+# ============================================================================
+
+def _raiz(store_dir=None):
+    return store_dir or Config.PATHS['STORE_DIR']
+
+def _enlazar(origen, destino):
+    try:
+        os.makedirs(os.path.dirname(destino), exist_ok=True)
+        os.link(origen, destino)
+        return True
+    except OSError:
+        return False
+
+def _admite_enlaces(store_dir, dest_dir):
+    """
+    True si se pueden crear hardlinks del almacén a dest_dir (mismo volumen y un sistema de archivos
+    que los admite). Se prueba una vez por par de volúmenes enlazando un archivo vacío.
+    """
+    try:
+        os.makedirs(store_dir, exist_ok=True)
+        clave = (os.stat(store_dir).st_dev, os.stat(dest_dir).st_dev)
+    except OSError:
+        return False
+    if clave not in _enlaces_admitidos:
+        nombre = f".prueba_enlace_{os.getpid()}_{threading.get_ident()}"
+        prueba, enlace = os.path.join(store_dir, nombre), os.path.join(dest_dir, nombre)
+        try:
+            open(prueba, "wb").close()
+            _enlaces_admitidos[clave] = _enlazar(prueba, enlace)
+        except OSError:
+            _enlaces_admitidos[clave] = False
+        for path in (enlace, prueba):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        if not _enlaces_admitidos[clave]:
+            log(f"WARNING: No se pueden crear hardlinks de {store_dir} a {dest_dir} (¿otro volumen?), "
+                f"se copia directamente sin pasar por el almacén")
+    return _enlaces_admitidos[clave]
+
+def _copiar_directo(files, src_dir, dest_dir, resumen):
+    """Copia directa a dest_dir, como antes del almacén; el faststart se repite con cada copia"""
+    directa = copiar_archivos(files, src_dir, dest_dir)
+    optimizar_inicio([os.path.join(dest_dir, r['archivo']) for r in directa['resultados']],
+                     nombres=[r['archivo'] for r in directa['resultados']])
+    resumen['resultados'] += directa['resultados']
+    resumen['bytes'] += directa['bytes']
+    resumen['fallidos'].update(directa['fallidos'])
+    return resumen
+
+def _mb(n_bytes):
+    return n_bytes / (1024 * 1024)
+
+def _clave_origen(path, tamano, mtime_ns):
+    return f"{path}|{tamano}|{mtime_ns}"
+
+def _indice(store_dir):
+    indice = _indices.get(store_dir)
+    if indice is None:
+        indice = {'liberados': {}, 'origenes': {}}
+        try:
+            with open(os.path.join(store_dir, ARCHIVO_INDICE), "r", encoding="utf-8") as f:
+                datos = json.load(f)
+            indice['liberados'].update(datos.get('liberados', {}))
+            indice['origenes'].update(datos.get('origenes', {}))
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            log(f"WARNING: Índice del almacén ilegible, se reconstruye: {e}")
+        _indices[store_dir] = indice
+    return indice
+
+def _guardar_indice(store_dir, indice):
+    path = os.path.join(store_dir, ARCHIVO_INDICE)
+    try:
+        os.makedirs(store_dir, exist_ok=True)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(indice, f)
+        os.replace(path + ".tmp", path)
+    except OSError as e:
+        log(f"WARNING: No se pudo guardar el índice del almacén: {e}")
+
+def _objetos(store_dir):
+    """Objetos del almacén: ruta relativa -> stat (sin el índice ni las copias en curso)"""
+    objetos = {}
+    try:
+        algoritmos = [e for e in os.scandir(store_dir) if e.is_dir()]
+    except FileNotFoundError:
+        return objetos
+    for algoritmo in algoritmos:
+        for prefijo in os.scandir(algoritmo.path):
+            if not prefijo.is_dir():
+                continue
+            for entrada in os.scandir(prefijo.path):
+                if entrada.name.endswith(SUFIJO_PARCIAL):
+                    continue
+                try:
+                    # os.stat y no DirEntry.stat(): en Windows este último devuelve st_nlink=0
+                    # y el número de enlaces es el contador de referencias del objeto
+                    objetos[os.path.relpath(entrada.path, store_dir)] = os.stat(entrada.path)
+                except OSError:
+                    continue
+    return objetos
+
+def _desalojar(store_dir, objetos, indice, necesario=0, protegidos=()):
+    """
+    Elimina contenido que ninguna pantalla usa: el que superó la retención y, si con 'necesario'
+    bytes más se pasaría de STORE_MAX_SIZE_MB, el liberado hace más tiempo (ordenado por la hora
+    en que dejó de estar en toda generación, no por su última reproducción dentro de VLC).
+    Los 'protegidos' (por enlazar en la generación en construcción) no se eliminan.
+    Actualiza 'objetos' e 'indice'. Returns: bytes liberados
+    """
+    ahora = time.time()
+    retencion = Config.SYNC_CONFIG['STORE_RETENTION_HOURS'] * 3600
+    cuota = Config.SYNC_CONFIG['STORE_MAX_SIZE_MB'] * 1024 * 1024
+    liberados = indice['liberados']
+
+    # Lo que está enlazado en alguna generación se está reproduciendo (o es el respaldo de rollback)
+    for rel, st in objetos.items():
+        if st.st_nlink > 1:
+            liberados.pop(rel, None)
+        else:
+            liberados.setdefault(rel, ahora)
+
+    total = sum(st.st_size for st in objetos.values())
+    candidatos = sorted((liberados[rel], rel) for rel, st in objetos.items() if st.st_nlink <= 1)
+    eliminados = 0
+    for desde, rel in candidatos:
+        if rel in protegidos or os.path.join(store_dir, rel) in _reescribiendo:
+            continue
+        vencido = ahora - desde >= retencion
+        if not vencido and not (cuota and total + necesario > cuota):
+            continue
+        path = os.path.join(store_dir, rel)
+        try:
+            # El stat del listado puede ser anterior a un enlace nuevo: un objeto en uso nunca se elimina
+            if os.stat(path).st_nlink > 1:
+                liberados.pop(rel, None)
+                continue
+            os.remove(path)
+        except OSError:
+            # En Windows, un archivo abierto por VLC no se puede eliminar: se reintenta en la siguiente limpieza
+            continue
+        total -= objetos[rel].st_size
+        eliminados += objetos[rel].st_size
+        del objetos[rel]
+        liberados.pop(rel, None)
+        if not vencido:
+            incrementar('almacen_desalojos_total')
+
+    indice['origenes'] = {clave: rel for clave, rel in indice['origenes'].items() if rel in objetos}
+    fijar('almacen_bytes', total)
+    fijar('almacen_retenido_bytes', sum(st.st_size for rel, st in objetos.items() if rel in liberados))
+    return eliminados
+
+# ============================================================================
+# FUNCIONES PRINCIPALES
+# ============================================================================
+
+def ruta_objeto(huella, nombre, store_dir=None):
+    """
+    Ruta del objeto del almacén para una huella de contenido.
+    La extensión del nombre original se conserva para que VLC reconozca el formato.
+    """
+    algoritmo, digest = huella.split(':', 1)
+    extension = os.path.splitext(nombre)[1].lower()
+    return os.path.join(_raiz(store_dir), algoritmo.split('-')[0], digest[:2], digest + extension)
+
+def incorporar_archivos(files, src_dir, dest_dir, store_dir=None):
+    """
+    Coloca en dest_dir los archivos indicados pasando por el almacén: el contenido que ya está
+    en el almacén (de otra pantalla, de una generación anterior o retenido tras eliminarse)
+    no se vuelve a copiar ni verificar.
+    Si no se pueden crear hardlinks del almacén a dest_dir se copia directo a dest_dir como antes,
+    sin copiar también al almacén.
+    Lo nuevo que no cabe en STORE_MAX_SIZE_MB (tras desalojar lo retenido) queda como fallido
+    y se reintenta en el siguiente ciclo.
+    Args:
+        files (list): Nombres relativos a src_dir
+        src_dir (str): Directorio fuente (VIDEO_DIR de la pantalla)
+        dest_dir (str): Directorio de la generación en construcción
+    Returns:
+        dict: Mismo formato que copiar_lote ('resultados', 'fallidos', 'bytes', ...) más
+              'reutilizados' (nombres cuyo contenido ya estaba en el almacén)
+    """
+    store_dir = _raiz(store_dir)
+    resumen = {'resultados': [], 'fallidos': {}, 'bytes': 0, 'segundos': 0.0, 'mb_s': 0.0, 'reutilizados': []}
+    if not files:
+        return resumen
+    if not _admite_enlaces(store_dir, dest_dir):
+        return _copiar_directo(files, src_dir, dest_dir, resumen)
+
+    with _lock_almacen:
+        indice = _indice(store_dir)
+        origenes = dict(indice['origenes'])
+    # Copias al almacén que se interrumpieron: su objeto ya se conoce y la copia se reanuda
+    interrumpidas = {_clave_origen(p['origen'], p['tamano'], p['mtime_ns']): os.path.relpath(destino, store_dir)
+                     for destino, p in copias_pendientes().items()
+                     if os.path.dirname(destino).startswith(store_dir)}
+
+    # 1. Objeto de cada archivo: por su origen si ya se vio esta versión (sin leerlo), si no por su
+    #    huella completa (de la caché si no cambió): con muestreo dos versiones distintas del mismo
+    #    tamaño podrían compartir objeto
+    objetos, claves, tamanos = {}, {}, {}
+    for f in files:
+        src = os.path.join(src_dir, f)
+        try:
+            st = ultimo_stat(src) or os.stat(src)
+            claves[f], tamanos[f] = _clave_origen(src, st.st_size, st.st_mtime_ns), st.st_size
+            conocido = origenes.get(claves[f])
+            if conocido and os.path.exists(os.path.join(store_dir, conocido)):
+                objetos[f] = os.path.join(store_dir, conocido)
+            elif claves[f] in interrumpidas:
+                objetos[f] = os.path.join(store_dir, interrumpidas[claves[f]])
+            else:
+                objetos[f] = ruta_objeto(calcular_huella(src, st, modo='completo'), f, store_dir)
+        except OSError as e:
+            resumen['fallidos'][f] = e
+            log(f"ERROR al leer {f} para el almacén: {e}")
+
+    directos = []
+    with _lock_almacen:
+        # 2. Copiar al almacén solo el contenido que no está (una vez por contenido aunque se repita),
+        #    haciendo lugar dentro de la cuota con lo retenido que hace más tiempo no se reproduce
+        faltantes = {}
+        for f, objeto in objetos.items():
+            if not os.path.exists(objeto) and objeto not in faltantes.values():
+                faltantes[f] = objeto
+        cuota = Config.SYNC_CONFIG['STORE_MAX_SIZE_MB'] * 1024 * 1024
+        if faltantes:
+            actuales = _objetos(store_dir)
+            necesario = sum(tamanos[f] for f in faltantes)
+            protegidos = {os.path.relpath(objeto, store_dir) for objeto in objetos.values()}
+            _desalojar(store_dir, actuales, indice, necesario, protegidos)
+            if cuota:
+                disponible = cuota - sum(st.st_size for st in actuales.values())
+                sin_cupo = []
+                for f in list(faltantes):
+                    if tamanos[f] <= disponible:
+                        disponible -= tamanos[f]
+                        continue
+                    del faltantes[f]
+                    sin_cupo.append(f)
+                    resumen['fallidos'][f] = OSError("Cuota del almacén (STORE_MAX_SIZE_MB) excedida")
+                if sin_cupo:
+                    log(f"WARNING: {len(sin_cupo)} archivo(s) no caben en la cuota del almacén "
+                        f"({Config.SYNC_CONFIG['STORE_MAX_SIZE_MB']} MB, todo lo demás en reproducción), "
+                        f"se reintentará en el siguiente ciclo")
+
+        for objeto in set(faltantes.values()):
+            os.makedirs(os.path.dirname(objeto), exist_ok=True)
+        copia = copiar_lote([(os.path.join(src_dir, f), objeto) for f, objeto in faltantes.items()],
+                            nombres=list(faltantes))
+        resumen.update(resultados=copia['resultados'], bytes=copia['bytes'],
+                       segundos=copia['segundos'], mb_s=copia['mb_s'])
+        resumen['fallidos'].update(copia['fallidos'])
+
+        # 3. Verificar una sola vez cada objeto nuevo; uno incompleto no entra al almacén
+        for r in copia['resultados']:
+            objeto = faltantes[r['archivo']]
+            if not es_mp4_completo(objeto):
+                os.remove(objeto)
+                resumen['fallidos'][r['archivo']] = OSError("Copia incompleta en el almacén")
+
+        nuevos = [r['archivo'] for r in copia['resultados'] if r['archivo'] not in resumen['fallidos']]
+        reescritos = {faltantes[f] for f in nuevos}
+        _reescribiendo.update(reescritos)
+
+    # 4. Faststart de lo nuevo antes de enlazarlo, sin bloquear el almacén a las demás pantallas: el
+    #    objeto se procesa una sola vez, al entrar al almacén por su huella, y todas las pantallas y
+    #    generaciones lo reutilizan (las que lo necesitan esperan en el paso 5 a que termine)
+    try:
+        optimizar_inicio([faltantes[f] for f in nuevos], nombres=nuevos)
+    except BaseException:
+        with _lock_almacen:
+            _reescribiendo.difference_update(reescritos)
+            _reescritura_terminada.notify_all()
+        raise
+
+    with _lock_almacen:
+        # Siguen protegidos hasta tomar el lock: entre la reescritura y el enlace nada los desaloja
+        _reescribiendo.difference_update(reescritos)
+        _reescritura_terminada.notify_all()
+        # Un objeto que otra pantalla aún reescribe se enlaza cuando termina: antes del os.replace
+        # del faststart el enlace quedaría en la versión sin reescribir
+        _reescritura_terminada.wait_for(lambda: _reescribiendo.isdisjoint(objetos.values()))
+
+        # 5. Enlazar en la generación; sin hardlinks, copia directa como antes del almacén
+        for f, objeto in objetos.items():
+            if f in resumen['fallidos']:
+                continue
+            if not os.path.exists(objeto):
+                # Mismo contenido que otro archivo cuya copia falló o no cupo
+                resumen['fallidos'][f] = OSError("Contenido no disponible en el almacén")
+                continue
+            if not _enlazar(objeto, os.path.join(dest_dir, f)):
+                directos.append(f)
+                continue
+            rel = os.path.relpath(objeto, store_dir)
+            indice['origenes'][claves[f]] = rel
+            indice['liberados'].pop(rel, None)
+            if f not in faltantes:
+                resumen['reutilizados'].append(f)
+        _guardar_indice(store_dir, indice)
+
+    if directos:
+        log(f"WARNING: {len(directos)} archivo(s) no se pudieron enlazar desde el almacén, "
+            f"se copian directamente")
+        _copiar_directo(directos, src_dir, dest_dir, resumen)
+    return resumen
+
+def limpiar_almacen(store_dir=None):
+    """
+    Elimina las copias interrumpidas que ya no se pueden reanudar y el contenido que ninguna
+    generación enlaza desde hace más de STORE_RETENTION_HOURS, o el menos reciente si el almacén
+    supera STORE_MAX_SIZE_MB.
+    Returns: bytes liberados
+    """
+    store_dir = _raiz(store_dir)
+    with _lock_almacen:
+        liberados = 0
+        reanudables = depurar_copias_interrumpidas()
+        for raiz, _, archivos in os.walk(store_dir):
+            for nombre in archivos:
+                if not nombre.endswith(SUFIJO_PARCIAL):
+                    continue
+                path = os.path.join(raiz, nombre)
+                if path in reanudables or path[:-len(SUFIJO_FASTSTART)] in _reescribiendo:
+                    continue
+                try:
+                    liberados += os.path.getsize(path)
+                    os.remove(path)
+                except OSError:
+                    continue
+        indice = _indice(store_dir)
+        liberados += _desalojar(store_dir, _objetos(store_dir), indice)
+        _guardar_indice(store_dir, indice)
+    if liberados:
+        log(f"Almacén: {_mb(liberados):.1f} MB liberados de contenido sin uso")
+    return liberados
@@ -1,31 +1,244 @@
 import os
 import subprocess
 import time
+import json
+import mmap
+import hashlib
+import threading
+from collections import OrderedDict
 from logging_utils import log
 from config import Config
+from file_utils import iterar_videos
+from mp4_utils import es_mp4_completo
+from metrics_utils import incrementar
+from io_utils import limitar, prioridad_baja
+
+try:
+    # Opcional: xxHash es varias veces más rápido que BLAKE2 (pip install xxhash)
+    import xxhash
+except ImportError:
+    xxhash = None
 
 class FileAccessError(Exception):
     pass
 
-def verificar_archivo(file_path):
+# ============================================================================
+# HUELLAS DE CONTENIDO
+# ============================================================================
+
+# Versión del formato de la caché de huellas en disco; si cambia, la caché se descarta
+VERSION_CACHE_HUELLAS = 1
+
+# Caché (size, mtime_ns, inode) -> huella, en orden LRU; se carga de disco en el primer uso
+_cache_huellas = None
+_cache_modificada = False
+_cache_lock = threading.Lock()
+
+def _algoritmo_huella():
+    if xxhash is not None:
+        return 'xxh3'
+    return 'blake2b'
+
+def _nuevo_hash():
+    if xxhash is not None:
+        return xxhash.xxh3_128()
+    return hashlib.blake2b(digest_size=16)
+
+def _modo_para(size, modo):
+    """Resuelve FINGERPRINT_MODE 'auto': completo hasta FINGERPRINT_FULL_MAX_MB, muestreo por encima"""
+    modo = modo or Config.SYNC_CONFIG['FINGERPRINT_MODE']
+    if modo == 'auto':
+        limite = Config.SYNC_CONFIG['FINGERPRINT_FULL_MAX_MB'] * 1024 * 1024
+        return 'completo' if size <= limite else 'muestreo'
+    return modo
+
+def _clave_cache(st):
+    return f"{st.st_size}:{st.st_mtime_ns}:{st.st_ino}"
+
+def _obtener_cache():
+    global _cache_huellas
+    if _cache_huellas is None:
+        _cache_huellas = OrderedDict(_leer_cache_huellas(Config.PATHS['FINGERPRINT_CACHE_FILE']))
+    return _cache_huellas
+
+def _leer_cache_huellas(cache_file):
+    try:
+        with open(cache_file, "r", encoding="utf-8") as cf:
+            datos = json.load(cf)
+        if datos.get('version') != VERSION_CACHE_HUELLAS:
+            return {}
+        return datos['huellas']
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError, KeyError) as e:
+        log(f"WARNING: Caché de huellas ilegible, se descarta: {e}")
+        return {}
+
+def _hash_mmap(f, h, size):
+    """Recorre el archivo mapeado en memoria en bloques de FINGERPRINT_CHUNK_MB sin copiarlo"""
+    bloque = Config.SYNC_CONFIG['FINGERPRINT_CHUNK_MB'] * 1024 * 1024
+    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapa:
+        if hasattr(mapa, 'madvise') and hasattr(mmap, 'MADV_SEQUENTIAL'):
+            mapa.madvise(mmap.MADV_SEQUENTIAL)
+        with memoryview(mapa) as vista:
+            for inicio in range(0, size, bloque):
+                with vista[inicio:inicio + bloque] as trozo:
+                    limitar(len(trozo), 'huella')
+                    h.update(trozo)
+
+def _hash_lectura(f, h):
+    # Respaldo si el archivo no se puede mapear (placeholders de OneDrive, algunos montajes de red)
+    buffer = bytearray(Config.SYNC_CONFIG['FINGERPRINT_CHUNK_MB'] * 1024 * 1024)
+    with memoryview(buffer) as vista:
+        while True:
+            leidos = f.readinto(buffer)
+            if not leidos:
+                break
+            limitar(leidos, 'huella')
+            h.update(vista[:leidos])
+
+def _hash_muestreo(f, h, size):
+    """Hashea FINGERPRINT_SAMPLES bloques repartidos uniformemente, incluidos el primero y el último"""
+    bloque = Config.SYNC_CONFIG['FINGERPRINT_SAMPLE_KB'] * 1024
+    muestras = Config.SYNC_CONFIG['FINGERPRINT_SAMPLES']
+    if size <= bloque * muestras:
+        _hash_lectura(f, h)
+        return
+    paso = (size - bloque) / (muestras - 1)
+    limitar(bloque * muestras, 'huella')
+    for i in range(muestras):
+        f.seek(int(i * paso))
+        h.update(f.read(bloque))
+
+def _bytes_leidos(size, modo):
+    if modo != 'muestreo':
+        return size
+    return min(size, Config.SYNC_CONFIG['FINGERPRINT_SAMPLE_KB'] * 1024 * Config.SYNC_CONFIG['FINGERPRINT_SAMPLES'])
+
+def _calcular_digest(file_path, size, modo):
+    h = _nuevo_hash()
+    # El tamaño forma parte de la huella: distingue archivos truncados con las mismas muestras
+    h.update(str(size).encode())
+    # Segundo plano: calcular huellas no debe competir con la lectura de VLC
+    with open(file_path, "rb") as f, prioridad_baja():
+        if modo == 'muestreo':
+            _hash_muestreo(f, h, size)
+        elif size > 0:
+            try:
+                _hash_mmap(f, h, size)
+            except (ValueError, OSError):
+                f.seek(0)
+                h = _nuevo_hash()
+                h.update(str(size).encode())
+                _hash_lectura(f, h)
+    return h.hexdigest()
+
+def calcular_huella(file_path, st=None, modo=None):
+    """
+    Huella de contenido de un archivo: xxHash (si está instalado) o BLAKE2 sobre el archivo
+    mapeado en memoria, o sobre bloques de muestra en archivos muy grandes.
+    Se guarda en caché por (tamaño, mtime_ns, inode): cada archivo se lee una vez por cambio real.
+    Args:
+        file_path (str): Ruta del archivo
+        st (os.stat_result): Stat ya obtenido (evita otra llamada al sistema)
+        modo (str): 'completo', 'muestreo' o 'auto' (por defecto FINGERPRINT_MODE)
+    Returns:
+        str: '<algoritmo>-<modo>:<hex>'; solo son comparables huellas con el mismo prefijo
+    """
+    global _cache_modificada
+    if st is None:
+        st = os.stat(file_path)
+    modo = _modo_para(st.st_size, modo)
+    prefijo = f"{_algoritmo_huella()}-{modo}"
+    clave = _clave_cache(st)
+
+    with _cache_lock:
+        cache = _obtener_cache()
+        huella = cache.get(clave)
+        if huella is not None and huella.startswith(prefijo + ':'):
+            cache.move_to_end(clave)
+            return huella
+
+    huella = f"{prefijo}:{_calcular_digest(file_path, st.st_size, modo)}"
+    incrementar('huellas_calculadas_total', modo=modo)
+    incrementar('huellas_bytes_total', _bytes_leidos(st.st_size, modo), modo=modo)
+
+    with _cache_lock:
+        cache[clave] = huella
+        cache.move_to_end(clave)
+        while len(cache) > Config.SYNC_CONFIG['FINGERPRINT_CACHE_MAX']:
+            cache.popitem(last=False)
+        _cache_modificada = True
+    return huella
+
+def huellas_comparables(huella_a, huella_b):
+    """True si ambas huellas existen y se calcularon con el mismo algoritmo y modo"""
+    if not huella_a or not huella_b:
+        return False
+    return huella_a.split(':', 1)[0] == huella_b.split(':', 1)[0]
+
+def guardar_cache_huellas(cache_file=None):
+    """Persiste la caché de huellas (escritura atómica) si cambió desde la última vez"""
+    global _cache_modificada
+    cache_file = cache_file or Config.PATHS['FINGERPRINT_CACHE_FILE']
+    with _cache_lock:
+        if not _cache_modificada or _cache_huellas is None:
+            return
+        datos = {'version': VERSION_CACHE_HUELLAS, 'huellas': dict(_cache_huellas)}
+        _cache_modificada = False
+    temporal = cache_file + ".tmp"
+    try:
+        with open(temporal, "w", encoding="utf-8") as cf:
+            json.dump(datos, cf)
+        os.replace(temporal, cache_file)
+    except OSError as e:
+        log(f"WARNING: No se pudo guardar la caché de huellas: {e}")
+
+# ============================================================================
+# VERIFICACIÓN Y ESTIMULACIÓN DE ONEDRIVE
+# ============================================================================
+
+# Archivos cuyo bloque final se vio en ceros: ruta -> (tamaño, mtime_ns) de esa verificación
+_finales_en_ceros = {}
+
+def _final_en_ceros_pendiente(file_path, st):
+    """
+    Un final en ceros puede ser una descarga preasignada sin terminar o relleno legítimo (p. ej. una
+    caja 'free' al final de un MP4). Es descarga pendiente si la estructura del MP4 está incompleta o
+    si el tamaño o el mtime cambiaron desde la verificación anterior (la primera vez, por precaución).
+    """
+    firma = (st.st_size, st.st_mtime_ns)
+    cambiando = _finales_en_ceros.get(file_path) != firma
+    _finales_en_ceros[file_path] = firma
+    return cambiando or not es_mp4_completo(file_path, st)
+
+def verificar_archivo(file_path, st=None):
     """Verifica que un archivo esté completamente disponible"""
     try:
         # Obtener tamaño total del archivo
-        size = os.path.getsize(file_path)
+        if st is None:
+            st = os.stat(file_path)
+        size = st.st_size
         
         if size == 0:
             log(f"WARNING: Archivo vacío detectado: {os.path.basename(file_path)}")
             return False
             
+        bloque = Config.SYNC_CONFIG['FILE_CHECK_BLOCK_SIZE']
         # Leer el inicio del archivo
         with open(file_path, "rb") as f:
             f.seek(0)
-            inicio = f.read(Config.SYNC_CONFIG['FILE_CHECK_BLOCK_SIZE'])
+            inicio = f.read(bloque)
             
             # Leer el final del archivo si es lo suficientemente grande
             if size > Config.SYNC_CONFIG['MIN_FILE_SIZE_FOR_TAIL_CHECK']:
-                f.seek(-Config.SYNC_CONFIG['FILE_CHECK_BLOCK_SIZE'], 2)
+                f.seek(-bloque, 2)
                 final = f.read()
+                # Un final corto o en ceros que sigue cambiando indica una descarga preasignada que aún no termina
+                if len(final) < bloque or (not final.strip(b'\0') and _final_en_ceros_pendiente(file_path, st)):
+                    log(f"WARNING: Final incompleto en {os.path.basename(file_path)}")
+                    return False
+                _finales_en_ceros.pop(file_path, None)
                 
         return len(inicio) > 0
         
@@ -45,16 +258,48 @@ def forzar_sync_powershell():
     except Exception as e:
         log(f"ERROR al estimular sincronización de OneDrive: {e}")
 
+# Atributos de Windows de los archivos "solo en la nube" de OneDrive (placeholders sin descargar):
+# FILE_ATTRIBUTE_RECALL_ON_DATA_ACCESS | FILE_ATTRIBUTE_RECALL_ON_OPEN | FILE_ATTRIBUTE_OFFLINE
+_ATRIBUTOS_DESHIDRATADO = 0x00400000 | 0x00040000 | 0x00001000
+
+# Último toque por ruta (time.monotonic()), para no tocar el mismo archivo más de una vez
+# por ONEDRIVE_TOUCH_INTERVAL
+_ultimo_toque = {}
+
+def esta_deshidratado(st):
+    """True si el stat corresponde a un placeholder de OneDrive cuyo contenido sigue en la nube"""
+    return bool(getattr(st, 'st_file_attributes', 0) & _ATRIBUTOS_DESHIDRATADO)
+
+def _tocar_limitado(file_path, crear=False):
+    """
+    Actualiza el mtime de un archivo como máximo una vez por ONEDRIVE_TOUCH_INTERVAL.
+    Returns:
+        bool: True si se tocó, False si aún no toca
+    """
+    ahora = time.monotonic()
+    ultimo = _ultimo_toque.get(file_path)
+    if ultimo is not None and ahora - ultimo < Config.SYNC_CONFIG['ONEDRIVE_TOUCH_INTERVAL']:
+        return False
+    if crear and not os.path.exists(file_path):
+        open(file_path, "a").close()
+    os.utime(file_path, None)
+    _ultimo_toque[file_path] = ahora
+    return True
+
 def estimular_onedrive(files, video_dir):
     """
     FUNCION CRITICA:
     Estimula la sincronización de OneDrive mediante 'toque' de archivos y comandos PowerShell.
     
     Esta función implementa una estrategia de dos niveles para forzar la sincronización:
-    1. "Toca" archivos individuales actualizando sus timestamps (marca como modificados)
+    1. "Toca" solo los archivos pendientes o deshidratados (o un único archivo centinela),
+       como máximo una vez por ONEDRIVE_TOUCH_INTERVAL por archivo
     2. Ejecuta comandos PowerShell para estimular OneDrive cuando es necesario
         Nota: no se ha detectado que dichos comandos requieran permisos de administrador
     
+    Los archivos válidos y sincronizados ya no se tocan: cada toque es una escritura de metadatos
+    que OneDrive puede tratar como modificación local a subir.
+    
     Args:
         files (list): Lista de nombres de archivos específicos a procesar
         video_dir (str): Directorio base donde se encuentran los archivos
@@ -64,9 +309,10 @@ def estimular_onedrive(files, video_dir):
               False si hay archivos pendientes que requieren atención
               
     Proceso detallado:
+        - Un solo recorrido con el escáner de file_utils: stat, estado de hidratación y mtime más reciente
         - Verifica la integridad de cada archivo individualmente
-        - "Toca" archivos válidos para marcarlos como activos en OneDrive
-        - Mantiene lista de archivos problemáticos para reporte
+        - Los videos del directorio que no están en files (excluidos por incompletos) son pendientes
+        - "Toca" solo archivos pendientes (ONEDRIVE_TOUCH_MODE='pendientes') o el centinela ('centinela')
         - Fuerza sincronización inmediata si hay archivos pendientes
         - Implementa sincronización periódica basada en timestamps
     """
@@ -75,58 +321,57 @@ def estimular_onedrive(files, video_dir):
     # ========================================================================
     
     # Contenedor para archivos que necesitan atención especial
-    # (archivos incompletos, inaccesibles o corruptos)
+    # (archivos incompletos, inaccesibles, corruptos o aún en la nube)
     archivos_pendientes = []
+    validos = set(files)
+    esperados = set(files)
+    
+    # Timestamp de modificación más reciente, calculado en el mismo recorrido
+    ultimo_archivo = 0
     
     # ========================================================================
-    # FASE 2: PROCESAMIENTO INDIVIDUAL DE ARCHIVOS
+    # FASE 2: PROCESAMIENTO INDIVIDUAL DE ARCHIVOS (UN SOLO RECORRIDO)
     # ========================================================================
     
-    for f in files:
-        file_path = os.path.join(video_dir, f)
-        
+    # En Windows el stat de cada DirEntry (incluidos los atributos de placeholder)
+    # viene en el propio listado del directorio: sin llamadas extra por archivo
+    try:
+        listado = list(iterar_videos(video_dir))
+    except OSError as e:
+        raise FileAccessError(f"No se puede listar {video_dir}: {e}")
+    
+    for entrada in listado:
         try:
             # ----------------------------------------------------------------
             # PASO 2.1: Verificación básica de acceso al archivo
             # ----------------------------------------------------------------
-            # os.stat() falla inmediatamente si:
-            # - El archivo no existe
-            # - No hay permisos de lectura
-            # - El archivo está bloqueado por otro proceso
-            os.stat(file_path)
+            # stat() falla inmediatamente si el archivo no existe, no hay permisos
+            # de lectura o está bloqueado por otro proceso
+            st = entrada.dir_entry.stat()
+            esperados.discard(entrada.nombre)
+            ultimo_archivo = max(ultimo_archivo, st.st_mtime)
             
             # ----------------------------------------------------------------
-            # PASO 2.2: Verificación de integridad del archivo
-            # ----------------------------------------------------------------
-            # verificar_archivo() realiza verificaciones profundas:
-            # - Tamaño del archivo > 0 bytes
-            # - Lectura exitosa del bloque inicial (detecta corrupción temprana)
-            # - Para archivos grandes: lectura del bloque final (detecta transferencias incompletas)
-            if not verificar_archivo(file_path):
-                # Archivo incompleto o corrupto - marcar para sincronización especial
-                archivos_pendientes.append(f)
-                continue  # Saltar al siguiente archivo sin procesamiento adicional
-                
-            # ----------------------------------------------------------------
-            # PASO 2.3: "Tocar" archivo para estimular OneDrive
+            # PASO 2.2: Estado de hidratación e integridad del archivo
             # ----------------------------------------------------------------
-            # Actualizar timestamp de acceso y modificación al momento actual
-            # Esto hace que OneDrive detecte el archivo como "recientemente modificado"
-            # y lo priorice en su cola de sincronización
-            current_time = time.time()
-            os.utime(file_path, (current_time, current_time))
-            # Nota: os.utime(path, (access_time, modification_time))
+            # - Placeholder deshidratado: el contenido sigue en la nube
+            # - Video del directorio que validar_dir excluyó (p. ej. MP4 a medio descargar)
+            # - verificar_archivo(): tamaño > 0, bloque inicial legible y bloque final completo
+            if (esta_deshidratado(st) or entrada.nombre not in validos
+                    or not verificar_archivo(entrada.path, st)):
+                archivos_pendientes.append(entrada.nombre)
             
-        except Exception as e:
+        except OSError as e:
             # ----------------------------------------------------------------
             # MANEJO DE ERRORES DE ACCESO
             # ----------------------------------------------------------------
-            # Posibles causas de excepción:
-            # - FileNotFoundError: Archivo eliminado durante procesamiento
-            # - PermissionError: Sin permisos de acceso/modificación
-            # - OSError: Problemas de E/O del sistema de archivos
-            log(f"ERROR accediendo a {f}: {e}")
-            archivos_pendientes.append(f)
+            # FileNotFoundError (eliminado durante el recorrido), PermissionError, E/S
+            log(f"ERROR accediendo a {entrada.nombre}: {e}")
+            esperados.discard(entrada.nombre)
+            archivos_pendientes.append(entrada.nombre)
+    
+    # Archivos esperados que ya no aparecen en el directorio
+    archivos_pendientes.extend(sorted(esperados))
     
     # ========================================================================
     # FASE 3: DECISIÓN DE SINCRONIZACIÓN BASADA EN RESULTADOS
@@ -136,21 +381,42 @@ def estimular_onedrive(files, video_dir):
     # ESCENARIO A: HAY ARCHIVOS PROBLEMÁTICOS
     # ----------------------------------------------------------------
     if archivos_pendientes:
+        # "Tocar" para que OneDrive los priorice, con límite por archivo
+        tocados = 0
+        modo = Config.SYNC_CONFIG['ONEDRIVE_TOUCH_MODE']
+        if modo == 'pendientes':
+            objetivos = [(os.path.join(video_dir, f), False) for f in archivos_pendientes]
+        elif modo == 'centinela':
+            objetivos = [(os.path.join(video_dir, Config.SYNC_CONFIG['ONEDRIVE_SENTINEL_FILE']), True)]
+        else:
+            objetivos = []
+        for file_path, crear in objetivos:
+            try:
+                tocados += _tocar_limitado(file_path, crear)
+            except OSError as e:
+                log(f"ERROR tocando {os.path.basename(file_path)}: {e}")
+        
+        # Olvidar los toques de archivos que ya no están pendientes
+        vigentes = {file_path for file_path, _ in objetivos}
+        for file_path in [p for p in _ultimo_toque if p not in vigentes]:
+            del _ultimo_toque[file_path]
+        
+        log(f"{len(archivos_pendientes)} archivo(s) pendiente(s) en OneDrive, {tocados} tocado(s): "
+            f"{', '.join(archivos_pendientes[:10])}{' ...' if len(archivos_pendientes) > 10 else ''}")
+        
         # Estrategia: Sincronización inmediata y agresiva
         # OneDrive necesita ser "despertado" para procesar archivos problemáticos
         # que pueden estar en estado de sincronización parcial o fallida
         forzar_sync_powershell()
         return False  # Indica que hay problemas pendientes de resolución
     
+    _ultimo_toque.clear()
+    
     # ----------------------------------------------------------------
     # ESCENARIO B: TODOS LOS ARCHIVOS ESTÁN BIEN
     # ----------------------------------------------------------------
     # Implementar sincronización periódica preventiva
-    # Basada en el archivo más recientemente modificado del conjunto
-    
-    # Encontrar el timestamp de modificación más reciente entre todos los archivos
-    # max() con default=0 maneja el caso edge de lista vacía
-    ultimo_archivo = max([os.path.getmtime(os.path.join(video_dir, f)) for f in files], default=0)
+    # Basada en el archivo más recientemente modificado del conjunto (ya calculado en la FASE 2)
     
     # Calcular tiempo transcurrido desde la última modificación
     tiempo_transcurrido = time.time() - ultimo_archivo
@@ -0,0 +1,57 @@
+import os
+import sys
+import copy
+import socket
+import tempfile
+
+# Los módulos del daemon se importan desde la raíz del repositorio; config.py arma sus rutas con TEMP
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('TEMP', tempfile.gettempdir())
+
+from config import Config
+
+SECCIONES = ('VIDEO_CONFIG', 'VLC_CONFIG', 'SYNC_CONFIG', 'COPY_CONFIG', 'METRICS_CONFIG', 'LOG_CONFIG', 'PATHS')
+
+def entorno_temporal(prueba):
+    """
+    Directorio temporal con VIDEO_DIR y las rutas de PATHS dentro de él. Config y el diario de estado
+    se restauran al terminar la prueba.
+    Returns:
+        str: Directorio temporal
+    """
+    import journal_utils
+    base = tempfile.mkdtemp(prefix="mediasync_prueba_")
+    originales = {seccion: copy.deepcopy(getattr(Config, seccion)) for seccion in SECCIONES}
+    perfiles = copy.deepcopy(Config.SCREEN_PROFILES)
+
+    def restaurar():
+        journal_utils.cerrar_diario()
+        for seccion, valores in originales.items():
+            getattr(Config, seccion).clear()
+            getattr(Config, seccion).update(valores)
+        Config.SCREEN_PROFILES = perfiles
+
+    prueba.addCleanup(restaurar)
+    prueba.addCleanup(lambda: __import__('shutil').rmtree(base, ignore_errors=True))
+    os.makedirs(os.path.join(base, 'videos'))
+    Config.VIDEO_CONFIG['VIDEO_DIR'] = os.path.join(base, 'videos')
+    Config.SCREEN_PROFILES = []
+    Config.PATHS.update(
+        TEMP_VIDEO_DIR=os.path.join(base, 'daemon_temp_media'),
+        PLAYLIST_PATH=os.path.join(base, 'playlistVLC.m3u'),
+        FLAG_FILE=os.path.join(base, 'stream_active.flag'),
+        MANIFEST_FILE=os.path.join(base, 'daemon_media_manifest.json'),
+        FINGERPRINT_CACHE_FILE=os.path.join(base, 'daemon_media_fingerprints.json'),
+        STORE_DIR=os.path.join(base, 'daemon_media_store'),
+        JOURNAL_FILE=os.path.join(base, 'daemon_media_journal.sqlite3'),
+        STATUS_FILE=os.path.join(base, 'MediaSync_estado.json'),
+    )
+    os.makedirs(os.path.join(base, 'compartida'))
+    Config.LOG_CONFIG['LOG_SHARED_DIR'] = os.path.join(base, 'compartida')
+    journal_utils.cerrar_diario()
+    return base
+
+def puerto_libre():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
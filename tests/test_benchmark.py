@@ -0,0 +1,100 @@
+import os
+import json
+import unittest
+import contextlib
+import io
+from unittest import mock
+from tests import entorno_temporal
+import benchmark
+import sync_utils
+from benchmark import escribir_mp4_sintetico, generar_biblioteca, comparar, _leer_tamano
+from mp4_utils import validar_estructura_mp4, es_mp4_completo
+
+def _datos(medianas):
+    return {'resultados': [{'etapa': etapa, 'archivos': 10, 'tamano_bytes': 1024, 'mediana': mediana}
+                           for etapa, mediana in medianas.items()]}
+
+class BibliotecaSinteticaTest(unittest.TestCase):
+    def setUp(self):
+        self.base = entorno_temporal(self)
+
+    def test_leer_tamano(self):
+        self.assertEqual(_leer_tamano('64K'), 64 * 1024)
+        self.assertEqual(_leer_tamano(' 10m '), 10 * 1024 ** 2)
+        self.assertEqual(_leer_tamano('1.5G'), int(1.5 * 1024 ** 3))
+        self.assertEqual(_leer_tamano('5000'), 5000)
+
+    def test_mp4_sintetico_tiene_el_tamano_exacto_y_es_valido(self):
+        for size in (200, 20000, 5 * 1024 ** 2):
+            path = os.path.join(self.base, f"clip_{size}.mp4")
+            escribir_mp4_sintetico(path, size)
+            self.assertEqual(os.path.getsize(path), size)
+            self.assertTrue(validar_estructura_mp4(path))
+            self.assertTrue(es_mp4_completo(path))
+
+    def test_mp4_sintetico_demasiado_pequeno(self):
+        with self.assertRaises(ValueError):
+            escribir_mp4_sintetico(os.path.join(self.base, "chico.mp4"), 100)
+
+    def test_generar_biblioteca(self):
+        video_dir = os.path.join(self.base, 'biblioteca')
+        nombres = generar_biblioteca(video_dir, 3, 4096)
+        self.assertEqual(nombres, ['video_00000.mp4', 'video_00001.mp4', 'video_00002.mp4'])
+        self.assertEqual(sorted(os.listdir(video_dir)), nombres)
+
+class ComparacionTest(unittest.TestCase):
+    def test_marca_regresion_sobre_el_umbral(self):
+        filas = comparar(_datos({'validar_dir': 1.0, 'copiar_archivos': 1.0}),
+                         _datos({'validar_dir': 1.05, 'copiar_archivos': 1.5}))
+        regresiones = {clave[0]: regresion for clave, _, _, _, regresion in filas}
+        self.assertEqual(regresiones, {'validar_dir': False, 'copiar_archivos': True})
+
+    def test_diferencias_de_ruido_no_son_regresion(self):
+        (fila,) = comparar(_datos({'validar_dir': 0.0001}), _datos({'validar_dir': 0.0005}))
+        self.assertGreater(fila[3], 100)
+        self.assertFalse(fila[4])
+
+    def test_solo_compara_etapas_comunes(self):
+        filas = comparar(_datos({'validar_dir': 1.0, 'ciclo_completo': 2.0}), _datos({'validar_dir': 1.0}))
+        self.assertEqual([clave[0] for clave, *_ in filas], ['validar_dir'])
+
+class EjecucionTest(unittest.TestCase):
+    def setUp(self):
+        self.base = entorno_temporal(self)
+        forzar = sync_utils.forzar_sync_powershell
+        self.addCleanup(setattr, sync_utils, 'forzar_sync_powershell', forzar)
+
+    def _ejecutar(self, *args):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return benchmark.main(['--archivos', '2', '--tamanos', '4K', '--repeticiones', '1',
+                                   '--dir', os.path.join(self.base, 'bench')] + list(args))
+
+    def test_escribe_resultados_y_compara(self):
+        salida = os.path.join(self.base, 'bench.json')
+        self.assertEqual(self._ejecutar('--salida', salida), 0)
+        with open(salida, encoding="utf-8") as f:
+            datos = json.load(f)
+        self.assertEqual(datos['version_resultados'], benchmark.VERSION_RESULTADOS)
+        self.assertEqual({r['etapa'] for r in datos['resultados']},
+                         {'validar_dir', 'calcular_hash', 'estimular_onedrive', 'copiar_archivos',
+                          'generar_playlist', 'validar_playlist', 'ciclo_completo'})
+        # Contra un resultado anterior mucho más rápido, todas las etapas son regresión
+        for r in datos['resultados']:
+            r['mediana'] /= 1000
+        anterior = os.path.join(self.base, 'anterior.json')
+        with open(anterior, "w", encoding="utf-8") as f:
+            json.dump(datos, f)
+        with mock.patch.object(benchmark, 'RUIDO_MINIMO', 0):
+            self.assertEqual(self._ejecutar('--salida', salida, '--comparar', anterior), 1)
+            self.assertEqual(self._ejecutar('--salida', salida, '--comparar', anterior, '--umbral', '1e9'), 0)
+
+    def test_sin_copia_omite_la_copia_y_el_ciclo(self):
+        salida = os.path.join(self.base, 'bench.json')
+        self._ejecutar('--salida', salida, '--sin-copia')
+        with open(salida, encoding="utf-8") as f:
+            etapas = {r['etapa'] for r in json.load(f)['resultados']}
+        self.assertNotIn('copiar_archivos', etapas)
+        self.assertNotIn('ciclo_completo', etapas)
+
+if __name__ == '__main__':
+    unittest.main()
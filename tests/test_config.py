@@ -0,0 +1,71 @@
+import os
+import sys
+import unittest
+from unittest import mock
+from tests import entorno_temporal
+from config import Config
+from benchmark import escribir_mp4_sintetico
+import config_utils
+
+RUTA_CONFIG = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'config.py')
+
+def _config_con_perfiles(perfiles):
+    """Config tal como la define config.py con SCREEN_PROFILES editado por el operador"""
+    with open(RUTA_CONFIG, encoding="utf-8") as f:
+        fuente = f.read()
+    fuente = fuente.replace("    SCREEN_PROFILES = []\n", f"    SCREEN_PROFILES = {perfiles!r}\n", 1)
+    espacio = {'__file__': RUTA_CONFIG, '__name__': 'config_prueba'}
+    exec(compile(fuente, RUTA_CONFIG, 'exec'), espacio)
+    return espacio['Config']
+
+class RutasCompartidasTest(unittest.TestCase):
+    def test_una_pantalla_usa_video_dir(self):
+        config = _config_con_perfiles([])
+        self.assertEqual(os.path.dirname(config.PATHS['CONFIG_FILE']), config.VIDEO_CONFIG['VIDEO_DIR'])
+        self.assertEqual(config.LOG_CONFIG['LOG_SHARED_DIR'], config.VIDEO_CONFIG['VIDEO_DIR'])
+
+    def test_multipantalla_usa_el_primer_perfil(self):
+        config = _config_con_perfiles([{'NOMBRE': 'recepcion', 'VIDEO_DIR': os.path.join('v', 'recepcion')},
+                                       {'NOMBRE': 'comedor', 'VIDEO_DIR': os.path.join('v', 'comedor')}])
+        self.assertEqual(config.PATHS['CONFIG_FILE'], os.path.join('v', 'recepcion', "MediaSync_config.json"))
+        self.assertEqual(config.LOG_CONFIG['LOG_SHARED_DIR'], os.path.join('v', 'recepcion'))
+
+class ValidarVideoDirTest(unittest.TestCase):
+    def setUp(self):
+        self.base = entorno_temporal(self)
+        Config.VIDEO_CONFIG['VIDEO_DIR'] = os.path.join(self.base, 'no_existe')
+
+    def _errores_de_videos(self):
+        return [e for e in Config.validate() if 'videos' in e]
+
+    def test_una_pantalla_requiere_video_dir(self):
+        self.assertIn("La ruta del directorio de videos no es válida o no existe", self._errores_de_videos())
+
+    def _perfiles(self):
+        perfiles = []
+        for nombre in ('recepcion', 'comedor'):
+            video_dir = os.path.join(self.base, nombre)
+            os.makedirs(video_dir)
+            escribir_mp4_sintetico(os.path.join(video_dir, 'a.mp4'), 20000)
+            perfiles.append({'NOMBRE': nombre, 'VIDEO_DIR': video_dir})
+        Config.SCREEN_PROFILES = perfiles
+
+    def test_multipantalla_no_valida_el_video_dir_global(self):
+        self._perfiles()
+        self.assertEqual(self._errores_de_videos(), [])
+        # El directorio de cada perfil sí se valida
+        Config.SCREEN_PROFILES[1]['VIDEO_DIR'] = os.path.join(self.base, 'falta')
+        self.assertEqual(self._errores_de_videos(),
+                         [f"Directorio de videos no existe: {os.path.join(self.base, 'falta')}"])
+
+    def test_multipantalla_sin_video_dir_global_admite_recargas(self):
+        self._perfiles()
+        Config.VLC_CONFIG['VLC_EXE'] = sys.executable
+        # Valores base de config_utils capturados en esta prueba, no en una anterior
+        with mock.patch.multiple(config_utils, _valores_base=None, _pendientes=set()):
+            self.assertEqual(config_utils.aplicar_config({'SYNC_CONFIG.REFRESH_CYCLE_DELAY': 5}),
+                             {'SYNC_CONFIG.REFRESH_CYCLE_DELAY'})
+        self.assertEqual(Config.SYNC_CONFIG['REFRESH_CYCLE_DELAY'], 5)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+import os
+import sys
+import json
+import socket
+import unittest
+from unittest import mock
+from tests import entorno_temporal
+from config import Config
+import config_utils
+from config_utils import cargar_config_externa, recargar_config
+
+class RecargaConfigTest(unittest.TestCase):
+    def setUp(self):
+        self.base = entorno_temporal(self)
+        self.path = os.path.join(self.base, 'MediaSync_config.json')
+        Config.PATHS['CONFIG_FILE'] = self.path
+        Config.VLC_CONFIG['VLC_EXE'] = sys.executable
+        Config.SYNC_CONFIG.update(REFRESH_CYCLE_DELAY=300, STABILITY_WINDOW=10)
+        # Estado del módulo propio de cada prueba: los valores base son los de este entorno
+        parche = mock.patch.multiple(config_utils, _valores_base=None, _firma=None, _pendientes=set())
+        parche.start()
+        self.addCleanup(parche.stop)
+        self._version = 0
+
+    def _escribir(self, datos):
+        with open(self.path, "w", encoding="utf-8") as f:
+            f.write(datos if isinstance(datos, str) else json.dumps(datos))
+        # La firma es (mtime_ns, tamaño): cada escritura con un mtime distinto
+        self._version += 1
+        os.utime(self.path, ns=(self._version * 10 ** 9,) * 2)
+
+    def test_solo_aplica_lo_que_cambio(self):
+        self._escribir({'SYNC_CONFIG': {'REFRESH_CYCLE_DELAY': 60, 'STABILITY_WINDOW': 10}})
+        self.assertEqual(cargar_config_externa(), {'SYNC_CONFIG.REFRESH_CYCLE_DELAY'})
+        self.assertEqual(Config.SYNC_CONFIG['REFRESH_CYCLE_DELAY'], 60)
+        # Sin modificar el archivo no se vuelve a leer
+        self.assertEqual(recargar_config(), set())
+        self._escribir({'SYNC_CONFIG': {'REFRESH_CYCLE_DELAY': 60, 'STABILITY_WINDOW': 20}})
+        self.assertEqual(recargar_config(), {'SYNC_CONFIG.STABILITY_WINDOW'})
+        self.assertEqual((Config.SYNC_CONFIG['REFRESH_CYCLE_DELAY'], Config.SYNC_CONFIG['STABILITY_WINDOW']), (60, 20))
+
+    def test_claves_quitadas_vuelven_a_config_py(self):
+        self._escribir({'SYNC_CONFIG': {'REFRESH_CYCLE_DELAY': 60}, 'LOG_CONFIG': {'LOG_LEVEL': 'DEBUG'}})
+        cargar_config_externa()
+        self._escribir({'SYNC_CONFIG': {'REFRESH_CYCLE_DELAY': 60}})
+        self.assertEqual(recargar_config(), {'LOG_CONFIG.LOG_LEVEL'})
+        self.assertEqual(Config.LOG_CONFIG['LOG_LEVEL'], 'INFO')
+        # Archivo eliminado: todo vuelve a config.py
+        os.remove(self.path)
+        self.assertEqual(recargar_config(), {'SYNC_CONFIG.REFRESH_CYCLE_DELAY'})
+        self.assertEqual(Config.SYNC_CONFIG['REFRESH_CYCLE_DELAY'], 300)
+
+    def test_claves_que_requieren_reinicio_se_posponen(self):
+        puerto = Config.VLC_CONFIG['VLC_HTTP_PORT']
+        self._escribir({})
+        cargar_config_externa()
+        self._escribir({'VLC_CONFIG': {'VLC_HTTP_PORT': puerto + 1}, 'SYNC_CONFIG': {'REFRESH_CYCLE_DELAY': 60}})
+        self.assertEqual(recargar_config(), {'SYNC_CONFIG.REFRESH_CYCLE_DELAY'})
+        self.assertEqual(Config.VLC_CONFIG['VLC_HTTP_PORT'], puerto)
+        self.assertEqual(config_utils._pendientes, {'VLC_CONFIG.VLC_HTTP_PORT'})
+        # Al iniciar sí se aplican
+        config_utils._firma = None
+        self.assertIn('VLC_CONFIG.VLC_HTTP_PORT', cargar_config_externa())
+        self.assertEqual(Config.VLC_CONFIG['VLC_HTTP_PORT'], puerto + 1)
+
+    def test_archivo_invalido_no_aplica_nada(self):
+        self._escribir({'SYNC_CONFIG': {'REFRESH_CYCLE_DELAY': 60}})
+        cargar_config_externa()
+        # Cada clave es válida por sí sola, pero el conjunto no pasa Config.validate()
+        self._escribir({'SYNC_CONFIG': {'REFRESH_CYCLE_DELAY': 120, 'STABILITY_POLL_MIN': 1000}})
+        self.assertEqual(recargar_config(), set())
+        self.assertEqual(Config.SYNC_CONFIG['REFRESH_CYCLE_DELAY'], 60)
+        self.assertNotEqual(Config.SYNC_CONFIG['STABILITY_POLL_MIN'], 1000)
+
+    def test_archivo_ilegible_o_con_claves_desconocidas_se_ignora(self):
+        self._escribir({'SYNC_CONFIG': {'REFRESH_CYCLE_DELAY': 60}})
+        cargar_config_externa()
+        for datos in ('{"SYNC_CONFIG": {"REFRESH_CYCLE_DELAY": 1', {'SYNC_CONFIG': {'NO_EXISTE': 1}},
+                      {'SYNC_CONFIG': {'REFRESH_CYCLE_DELAY': 'mucho'}}, {'PATHS': {'CONFIG_FILE': 'otro.json'}}):
+            self._escribir(datos)
+            self.assertEqual(recargar_config(), set())
+            self.assertEqual(Config.SYNC_CONFIG['REFRESH_CYCLE_DELAY'], 60)
+
+    def test_ajustes_por_equipo(self):
+        self._escribir({'SYNC_CONFIG': {'REFRESH_CYCLE_DELAY': 60},
+                        'EQUIPOS': {socket.gethostname().upper(): {'SYNC_CONFIG': {'REFRESH_CYCLE_DELAY': 30}},
+                                    'otro-equipo': {'SYNC_CONFIG': {'STABILITY_WINDOW': 99}}}})
+        cargar_config_externa()
+        self.assertEqual((Config.SYNC_CONFIG['REFRESH_CYCLE_DELAY'], Config.SYNC_CONFIG['STABILITY_WINDOW']), (30, 10))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,171 @@
+import os
+import errno
+import unittest
+from unittest import mock
+from tests import entorno_temporal
+from config import Config
+import copy_utils
+from copy_utils import copiar_archivo, depurar_copias_interrumpidas, CopiaIncompletaError, SUFIJO_PARCIAL
+from journal_utils import copia_pendiente, registrar_copia
+
+MB = 1024 * 1024
+
+class MetodosDeCopiaTest(unittest.TestCase):
+    """Solo un errno de 'no soportado' descarta un método para el par de dispositivos"""
+
+    def setUp(self):
+        self.base = entorno_temporal(self)
+        self.src = os.path.join(self.base, 'origen.mp4')
+        self.dst = os.path.join(self.base, 'destino.mp4')
+        self.datos = os.urandom(300000)
+        with open(self.src, "wb") as f:
+            f.write(self.datos)
+        for parche in (mock.patch.dict(copy_utils._metodos_descartados, clear=True),
+                       mock.patch.object(copy_utils, '_metodos_disponibles', return_value=['falso', 'bloques'])):
+            parche.start()
+            self.addCleanup(parche.stop)
+
+    def _con_metodo(self, copiador):
+        parche = mock.patch.dict(copy_utils._COPIADORES, falso=copiador)
+        parche.start()
+        self.addCleanup(parche.stop)
+
+    def _descartados(self):
+        return set().union(*copy_utils._metodos_descartados.values())
+
+    def test_origen_truncado_falla_el_archivo_sin_descartar_el_metodo(self):
+        def truncar_origen(fsrc, fdst, inicio, cantidad):
+            # OneDrive reemplaza el archivo por una versión más corta a mitad de la copia
+            os.truncate(self.src, 1000)
+            fdst.write(self.datos[:1000])
+        self._con_metodo(truncar_origen)
+        with self.assertRaises(CopiaIncompletaError):
+            copiar_archivo(self.src, self.dst)
+        self.assertNotIn('falso', self._descartados())
+        self.assertFalse(os.path.exists(self.dst))
+        self.assertFalse(os.path.exists(self.dst + copy_utils.SUFIJO_PARCIAL))
+
+    def test_cero_bytes_sin_error_sigue_con_otro_metodo_solo_para_ese_archivo(self):
+        self._con_metodo(lambda fsrc, fdst, inicio, cantidad: None)
+        self.assertEqual(copiar_archivo(self.src, self.dst)['metodo'], 'bloques')
+        self.assertEqual(open(self.dst, "rb").read(), self.datos)
+        self.assertNotIn('falso', self._descartados())
+
+    def test_errno_no_soportado_descarta_el_metodo(self):
+        def no_soportado(fsrc, fdst, inicio, cantidad):
+            raise OSError(errno.EXDEV, "otro sistema de archivos")
+        self._con_metodo(no_soportado)
+        self.assertEqual(copiar_archivo(self.src, self.dst)['metodo'], 'bloques')
+        self.assertIn('falso', self._descartados())
+
+class ReanudacionTest(unittest.TestCase):
+    """Una copia interrumpida continúa desde el último offset confirmado en el diario"""
+
+    def setUp(self):
+        self.base = entorno_temporal(self)
+        Config.COPY_CONFIG.update(COPY_CHECKPOINT_MB=1, IO_MAX_MB_S=0)
+        self.src = os.path.join(self.base, 'origen.mp4')
+        self.dst = os.path.join(self.base, 'destino.mp4')
+        self.parcial = self.dst + SUFIJO_PARCIAL
+        self.datos = os.urandom(3 * MB + 12345)
+        with open(self.src, "wb") as f:
+            f.write(self.datos)
+        for parche in (mock.patch.dict(copy_utils._metodos_descartados, clear=True),
+                       mock.patch.object(copy_utils, '_metodos_disponibles', return_value=['bloques'])):
+            parche.start()
+            self.addCleanup(parche.stop)
+
+    def _interrumpir(self, tras_tramos=1):
+        """Copia que falla con EIO después de copiar 'tras_tramos' tramos"""
+        copiados = []
+        bloques = copy_utils._copiar_bloques
+
+        def copiar_y_fallar(fsrc, fdst, inicio, cantidad):
+            if len(copiados) == tras_tramos:
+                # Algo llega al .part sin confirmarse antes del fallo
+                fdst.seek(inicio)
+                fdst.write(b'x' * 1000)
+                raise OSError(errno.EIO, "error de lectura")
+            copiados.append(inicio)
+            bloques(fsrc, fdst, inicio, cantidad)
+
+        with mock.patch.dict(copy_utils._COPIADORES, bloques=copiar_y_fallar):
+            with self.assertRaises(OSError):
+                copiar_archivo(self.src, self.dst)
+
+    def _contenido(self, path):
+        with open(path, "rb") as f:
+            return f.read()
+
+    def test_confirma_cada_tramo_tras_fsync(self):
+        confirmados = []
+        with open(self.dst, "wb"):
+            pass
+        st = os.stat(self.src)
+        copy_utils._copiar_datos(self.src, self.dst, st.st_size, (st.st_dev, st.st_dev),
+                                 tramo=MB, al_confirmar=confirmados.append)
+        self.assertEqual(confirmados, [MB, 2 * MB, 3 * MB])
+        self.assertEqual(self._contenido(self.dst), self.datos)
+
+    def test_continua_desde_offset_y_trunca_lo_no_confirmado(self):
+        with open(self.dst, "wb") as f:
+            f.write(self.datos[:2 * MB] + b'basura sin confirmar')
+        confirmados = []
+        st = os.stat(self.src)
+        copy_utils._copiar_datos(self.src, self.dst, st.st_size, (st.st_dev, st.st_dev),
+                                 desde=2 * MB, tramo=MB, al_confirmar=confirmados.append)
+        self.assertEqual(confirmados, [3 * MB])
+        self.assertEqual(self._contenido(self.dst), self.datos)
+
+    def test_copia_interrumpida_se_reanuda_y_queda_identica(self):
+        self._interrumpir()
+        # El .part se conserva con el avance confirmado (y lo que quedó escrito después)
+        self.assertEqual(copia_pendiente(self.dst)['confirmado'], MB)
+        self.assertGreater(os.path.getsize(self.parcial), MB)
+        self.assertFalse(os.path.exists(self.dst))
+
+        resultado = copiar_archivo(self.src, self.dst)
+        self.assertEqual(resultado['reanudado'], MB)
+        self.assertEqual(resultado['bytes'], len(self.datos) - MB)
+        self.assertEqual(self._contenido(self.dst), self.datos)
+        self.assertIsNone(copia_pendiente(self.dst))
+        self.assertFalse(os.path.exists(self.parcial))
+
+    def test_origen_modificado_desde_el_registro_copia_desde_el_inicio(self):
+        self._interrumpir(tras_tramos=2)
+        self.assertEqual(copia_pendiente(self.dst)['confirmado'], 2 * MB)
+        # Misma longitud y otro contenido: solo cambia el mtime
+        self.datos = os.urandom(len(self.datos))
+        with open(self.src, "wb") as f:
+            f.write(self.datos)
+        os.utime(self.src, ns=(os.stat(self.src).st_mtime_ns + 10 ** 9,) * 2)
+        resultado = copiar_archivo(self.src, self.dst)
+        self.assertEqual(resultado['reanudado'], 0)
+        self.assertEqual(self._contenido(self.dst), self.datos)
+
+    def test_parcial_mas_corto_que_lo_confirmado_copia_desde_el_inicio(self):
+        self._interrumpir()
+        os.truncate(self.parcial, MB // 2)
+        self.assertEqual(copiar_archivo(self.src, self.dst)['reanudado'], 0)
+        self.assertEqual(self._contenido(self.dst), self.datos)
+
+    def test_archivo_sin_tramos_no_registra_avance(self):
+        Config.COPY_CONFIG['COPY_CHECKPOINT_MB'] = 0
+        self._interrumpir(tras_tramos=0)
+        self.assertIsNone(copia_pendiente(self.dst))
+        self.assertFalse(os.path.exists(self.parcial))
+
+    def test_depurar_conserva_solo_las_copias_vigentes(self):
+        self._interrumpir()
+        otro = os.path.join(self.base, 'otro.mp4')
+        with open(otro + SUFIJO_PARCIAL, "wb") as f:
+            f.write(self.datos[:MB])
+        # Registrado con un origen que ya no existe
+        registrar_copia(otro, os.path.join(self.base, 'eliminado.mp4'), os.stat(self.src), MB)
+        self.assertEqual(depurar_copias_interrumpidas(), {self.parcial})
+        self.assertIsNone(copia_pendiente(otro))
+        self.assertFalse(os.path.exists(otro + SUFIJO_PARCIAL))
+        self.assertIsNotNone(copia_pendiente(self.dst))
+
+if __name__ == '__main__':
+    unittest.main()
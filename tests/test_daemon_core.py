@@ -0,0 +1,109 @@
+import os
+import time
+import asyncio
+import unittest
+from unittest import mock
+from tests import entorno_temporal, puerto_libre
+from config import Config
+from benchmark import escribir_mp4_sintetico
+from daemon_core import DaemonMediaSync
+
+FAKE_VLC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'fake_vlc.py')
+
+@unittest.skipUnless(os.access(FAKE_VLC, os.X_OK), "fake_vlc.py debe poder ejecutarse como VLC_EXE")
+class ArranqueRapidoTest(unittest.TestCase):
+    """La pantalla vuelve a reproducir la última playlist publicada antes del primer escaneo"""
+
+    def setUp(self):
+        self.base = entorno_temporal(self)
+        Config.VLC_CONFIG.update(VLC_EXE=FAKE_VLC, VLC_ARGS=[], VLC_HTTP_PORT=puerto_libre())
+        self.video = os.path.join(self.base, 'gen_000001', 'a.mp4')
+        os.makedirs(os.path.dirname(self.video))
+        escribir_mp4_sintetico(self.video, 20000)
+        with open(Config.PATHS['PLAYLIST_PATH'], "w", encoding="utf-8") as pl:
+            pl.write(self.video + "\n")
+        self.pantalla = DaemonMediaSync().pantallas[0]
+        self.addCleanup(self.pantalla.vlc.detener)
+
+    def test_reproduce_la_ultima_playlist_sin_escanear(self):
+        self.pantalla._arranque_rapido()
+        self.assertTrue(self.pantalla._arranque_listo.is_set())
+        self.assertTrue(self.pantalla.vlc.activo())
+        self.assertTrue(os.path.exists(Config.PATHS['FLAG_FILE']))
+        self.assertEqual([os.path.basename(item['uri']) for item in self.pantalla.vlc.obtener_items()], ['a.mp4'])
+
+    def test_playlist_invalida_no_inicia_pero_libera_el_staging(self):
+        os.remove(self.video)
+        self.pantalla._arranque_rapido()
+        self.assertTrue(self.pantalla._arranque_listo.is_set())
+        self.assertFalse(self.pantalla.vlc.activo())
+
+class StagingEstabilidadTest(unittest.TestCase):
+    """Los archivos que el rastreador da por estables entran al manifiesto aunque llegue otro evento"""
+
+    def setUp(self):
+        self.base = entorno_temporal(self)
+        Config.SYNC_CONFIG.update(STABILITY_WINDOW=0.2, STABILITY_POLL_MIN=0.05)
+        self.video_dir = Config.VIDEO_CONFIG['VIDEO_DIR']
+        self.pantalla = DaemonMediaSync().pantallas[0]
+        # Sin VLC: solo interesa qué publica el ciclo de staging
+        self.pantalla.vlc.iniciar = lambda: True
+        self.pantalla.vlc.detener = lambda: None
+        self.pantalla._arranque_listo.set()
+
+    def _video(self, nombre, antiguedad=0):
+        path = os.path.join(self.video_dir, nombre)
+        escribir_mp4_sintetico(path, 20000)
+        if antiguedad:
+            os.utime(path, (time.time() - antiguedad,) * 2)
+
+    def test_archivo_estabilizado_entra_con_evento_de_otro_archivo(self):
+        self._video('a.mp4', antiguedad=60)
+        self._video('b.mp4')
+        self.pantalla._ciclo_staging(None)
+        self.assertEqual(set(self.pantalla.manifiesto), {'a.mp4'})
+
+        time.sleep(0.3)
+        self._video('c.mp4', antiguedad=60)
+        _, publicado = self.pantalla._ciclo_staging({'c.mp4'})
+        self.assertTrue(publicado)
+        self.assertEqual(set(self.pantalla.manifiesto), {'a.mp4', 'b.mp4', 'c.mp4'})
+
+class EstimuloOneDriveTest(unittest.TestCase):
+    """Sin staging reciente, el estímulo de OneDrive usa un escaneo nuevo y no la última lista recibida"""
+
+    def setUp(self):
+        self.base = entorno_temporal(self)
+        Config.SYNC_CONFIG['REFRESH_CYCLE_DELAY'] = 0.1
+        self.video_dir = Config.VIDEO_CONFIG['VIDEO_DIR']
+        for nombre in ('a.mp4', 'b.mp4'):
+            escribir_mp4_sintetico(os.path.join(self.video_dir, nombre), 20000)
+        self.daemon = DaemonMediaSync()
+        self.pantalla = self.daemon.pantallas[0]
+        self.estimulos = []
+
+    def _estimular(self, files, video_dir):
+        self.estimulos.append(list(files))
+        if len(self.estimulos) == 1:
+            # Tras el estímulo del staging se elimina un archivo y se agrega otro
+            os.remove(os.path.join(video_dir, 'a.mp4'))
+            escribir_mp4_sintetico(os.path.join(video_dir, 'c.mp4'), 20000)
+        return True
+
+    async def _correr(self):
+        self.daemon._loop = self.pantalla._loop = asyncio.get_running_loop()
+        self.pantalla.cola_onedrive = asyncio.Queue()
+        await self.pantalla.cola_onedrive.put(['a.mp4', 'b.mp4'])
+        tarea = asyncio.ensure_future(self.pantalla._tarea_onedrive())
+        fin = time.monotonic() + 5
+        while len(self.estimulos) < 2 and time.monotonic() < fin:
+            await asyncio.sleep(0.02)
+        tarea.cancel()
+
+    def test_timeout_vuelve_a_escanear(self):
+        with mock.patch('daemon_core.estimular_onedrive', self._estimular):
+            asyncio.run(self._correr())
+        self.assertEqual(self.estimulos[:2], [['a.mp4', 'b.mp4'], ['b.mp4', 'c.mp4']])
+
+if __name__ == '__main__':
+    unittest.main()
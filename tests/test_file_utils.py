@@ -0,0 +1,88 @@
+import os
+import shutil
+import unittest
+from tests import entorno_temporal
+from config import Config
+from benchmark import escribir_mp4_sintetico
+from file_utils import planificar_delta, iterar_archivos, escanear_videos, hay_video, validar_dir, ultimo_stat
+
+class PlanificarDeltaTest(unittest.TestCase):
+    def setUp(self):
+        self.base = entorno_temporal(self)
+        self.video_dir = Config.VIDEO_CONFIG['VIDEO_DIR']
+        self.staging = os.path.join(self.base, 'staging')
+        os.makedirs(self.staging)
+        for nombre in ('igual.mp4', 'modificado.mp4'):
+            escribir_mp4_sintetico(os.path.join(self.video_dir, nombre), 20000)
+            shutil.copy2(os.path.join(self.video_dir, nombre), self.staging)
+        escribir_mp4_sintetico(os.path.join(self.video_dir, 'nuevo.mp4'), 20000)
+        escribir_mp4_sintetico(os.path.join(self.video_dir, 'modificado.mp4'), 30000)
+        escribir_mp4_sintetico(os.path.join(self.staging, 'obsoleto.mp4'), 20000)
+
+    def test_solo_copia_lo_nuevo_o_modificado(self):
+        plan = planificar_delta(['igual.mp4', 'modificado.mp4', 'nuevo.mp4'], self.video_dir, self.staging)
+        self.assertEqual(plan['sin_cambios'], ['igual.mp4'])
+        self.assertEqual(sorted(plan['copiar']), ['modificado.mp4', 'nuevo.mp4'])
+        self.assertEqual(plan['eliminar'], ['obsoleto.mp4'])
+        self.assertEqual((plan['bytes_copiar'], plan['bytes_omitidos']), (50000, 20000))
+
+class EscanerTest(unittest.TestCase):
+    def setUp(self):
+        self.base = entorno_temporal(self)
+        self.video_dir = Config.VIDEO_CONFIG['VIDEO_DIR']
+        Config.VIDEO_CONFIG['FORMATOS_DE_VIDEO_ADMITIDOS'] = ['.mp4', '.MKV']
+        for nombre in ('b.mp4', 'A.mp4', 'notas.txt', 'Promo/clip.mp4', 'promo/z.mkv', '.oculta/x.mp4'):
+            path = os.path.join(self.video_dir, *nombre.split('/'))
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            escribir_mp4_sintetico(path, 20000)
+
+    def _nombres(self, entradas):
+        return sorted(e.nombre for e in entradas)
+
+    def test_iterar_archivos_no_recursivo(self):
+        self.assertEqual(self._nombres(iterar_archivos(self.video_dir)), ['A.mp4', 'b.mp4', 'notas.txt'])
+
+    def test_iterar_archivos_recursivo_omite_carpetas_ocultas(self):
+        nombres = self._nombres(iterar_archivos(self.video_dir, recursivo=True, extensiones={'.mp4', '.mkv'}))
+        self.assertEqual(nombres, ['A.mp4', 'Promo/clip.mp4', 'b.mp4', 'promo/z.mkv'])
+
+    def test_iterar_archivos_entrega_ruta_y_dir_entry(self):
+        for entrada in iterar_archivos(self.video_dir, recursivo=True):
+            self.assertEqual(entrada.path, os.path.join(self.video_dir, *entrada.nombre.split('/')))
+            self.assertEqual(entrada.dir_entry.stat().st_size, 20000)
+
+    def test_escanear_videos_orden_determinista(self):
+        self.assertEqual([e.nombre for e in escanear_videos(self.video_dir)], ['A.mp4', 'b.mp4'])
+        # Por carpeta y nombre sin distinguir mayúsculas: 'Promo' y 'promo' quedan juntas
+        self.assertEqual([e.nombre for e in escanear_videos(self.video_dir, recursivo=True)],
+                         ['A.mp4', 'b.mp4', 'Promo/clip.mp4', 'promo/z.mkv'])
+
+    def test_hay_video(self):
+        self.assertTrue(hay_video(self.video_dir))
+        solo_texto = os.path.join(self.base, 'solo_texto')
+        os.makedirs(solo_texto)
+        for i in range(3):
+            open(os.path.join(solo_texto, f"{i}.txt"), "w").close()
+        self.assertFalse(hay_video(solo_texto))
+        # Límite alcanzado sin encontrar videos: indeterminado
+        self.assertIsNone(hay_video(solo_texto, max_archivos=2))
+
+    def test_validar_dir_omite_incompletos_y_excedidos(self):
+        Config.VIDEO_CONFIG['RECURSIVE_SCAN'] = True
+        with open(os.path.join(self.video_dir, 'b.mp4'), "r+b") as f:
+            f.truncate(10000)
+        escribir_mp4_sintetico(os.path.join(self.video_dir, 'grande.mp4'), 2 * 1024 * 1024)
+        Config.VIDEO_CONFIG['MAX_FILE_SIZE_MB'] = 1
+        archivos = validar_dir(self.video_dir)
+        self.assertEqual(archivos, ['A.mp4', 'Promo/clip.mp4', 'promo/z.mkv'])
+        self.assertEqual(ultimo_stat(os.path.join(self.video_dir, 'A.mp4')).st_size, 20000)
+        self.assertIsNone(ultimo_stat(os.path.join(self.video_dir, 'b.mp4')))
+
+    def test_validar_dir_con_stats_propios_no_publica(self):
+        propios = {}
+        validar_dir(self.video_dir, propios)
+        self.assertEqual(set(propios), {os.path.join(self.video_dir, 'A.mp4'), os.path.join(self.video_dir, 'b.mp4')})
+        self.assertIsNone(ultimo_stat(os.path.join(self.video_dir, 'A.mp4')))
+
+if __name__ == '__main__':
+    unittest.main()
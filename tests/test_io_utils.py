@@ -0,0 +1,94 @@
+import unittest
+import threading
+from unittest import mock
+from tests import entorno_temporal
+from config import Config
+import io_utils
+from io_utils import limitar, registrar_limitacion, espera_del_hilo, resumen_limitacion
+
+MB = 1024 * 1024
+
+class _Reloj:
+    """Sustituto del módulo time de io_utils: sleep() avanza el reloj sin esperar"""
+
+    def __init__(self):
+        self.ahora = 1000.0
+        self.esperas = []
+
+    def monotonic(self):
+        return self.ahora
+
+    def sleep(self, segundos):
+        self.esperas.append(segundos)
+        self.ahora += segundos
+
+class LimitacionTest(unittest.TestCase):
+    def setUp(self):
+        entorno_temporal(self)
+        Config.COPY_CONFIG['IO_MAX_MB_S'] = 1
+        self.reloj = _Reloj()
+        self.metricas = []
+        for parche in (mock.patch.multiple(io_utils, _tokens=0.0, _ultima_recarga=None, _totales={}),
+                       mock.patch.object(io_utils, 'time', self.reloj),
+                       mock.patch.object(io_utils, 'incrementar',
+                                         lambda nombre, valor, **etiquetas: self.metricas.append((valor, etiquetas)))):
+            parche.start()
+            self.addCleanup(parche.stop)
+
+    def test_sin_limite_no_espera_ni_suma(self):
+        Config.COPY_CONFIG['IO_MAX_MB_S'] = 0
+        limitar(10 * MB, 'copia')
+        self.assertEqual(self.reloj.esperas, [])
+        self.assertEqual(resumen_limitacion(), {})
+
+    def test_rafaga_inicial_y_espera_proporcional(self):
+        limitar(MB, 'copia')
+        self.assertEqual(self.reloj.esperas, [])
+        limitar(MB // 2, 'copia')
+        self.assertEqual(self.reloj.esperas, [0.5])
+
+    def test_la_recarga_se_acota_a_un_segundo_de_rafaga(self):
+        limitar(MB, 'copia')
+        self.reloj.ahora += 10
+        limitar(MB, 'copia')
+        limitar(MB, 'copia')
+        self.assertEqual(self.reloj.esperas, [1.0])
+
+    def test_la_deuda_la_paga_quien_la_pidio(self):
+        limitar(3 * MB, 'copia')
+        self.assertEqual(self.reloj.esperas, [2.0])
+        # Tras pagar la deuda, el siguiente solo espera por sus propios bytes
+        limitar(MB, 'huella')
+        self.assertEqual(self.reloj.esperas, [2.0, 1.0])
+
+    def test_espera_del_hilo_es_por_hilo(self):
+        antes = espera_del_hilo()
+        limitar(2 * MB, 'copia')
+        self.assertEqual(espera_del_hilo() - antes, 1.0)
+        otro = []
+        hilo = threading.Thread(target=lambda: otro.append(espera_del_hilo()))
+        hilo.start()
+        hilo.join()
+        self.assertEqual(otro, [0.0])
+
+    def test_registrar_limitacion_suma_sin_esperar(self):
+        registrar_limitacion(4 * MB, 1.5, 'faststart')
+        registrar_limitacion(MB, 0.0, 'faststart')
+        self.assertEqual(self.reloj.esperas, [])
+        self.assertEqual(resumen_limitacion(), {'faststart': {'bytes': 5 * MB, 'espera': 1.5}})
+        self.assertEqual(self.metricas, [(1.5, {'trabajo': 'faststart'})])
+
+    def test_resumen_por_trabajo(self):
+        # La primera reserva cabe en la ráfaga; las siguientes esperan 1 s cada una
+        limitar(MB, 'copia')
+        limitar(MB, 'huella')
+        limitar(MB, 'copia')
+        resumen = resumen_limitacion()
+        self.assertEqual(resumen, {'copia': {'bytes': 2 * MB, 'espera': 1.0}, 'huella': {'bytes': MB, 'espera': 1.0}})
+        self.assertEqual(self.metricas, [(1.0, {'trabajo': 'huella'}), (1.0, {'trabajo': 'copia'})])
+        # Es una copia: modificarla no altera los totales
+        resumen['copia']['bytes'] = 0
+        self.assertEqual(resumen_limitacion()['copia']['bytes'], 2 * MB)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+import os
+import sqlite3
+import unittest
+from unittest import mock
+from types import SimpleNamespace
+from tests import entorno_temporal
+from config import Config
+import journal_utils
+from journal_utils import (registrar_copia, copia_pendiente, copias_pendientes, finalizar_copia, registrar_intencion,
+                           intencion, cerrar_diario)
+
+ST = SimpleNamespace(st_size=3000, st_mtime_ns=123)
+
+class DiarioTest(unittest.TestCase):
+    def setUp(self):
+        self.base = entorno_temporal(self)
+        self.path = Config.PATHS['JOURNAL_FILE']
+        parche = mock.patch.object(journal_utils, '_deshabilitado', False)
+        parche.start()
+        self.addCleanup(parche.stop)
+
+    def test_copias_sobreviven_al_cierre(self):
+        registrar_copia('destino', 'origen', ST, 1000)
+        registrar_copia('destino', 'origen', ST, 2000)
+        cerrar_diario()
+        self.assertEqual(copia_pendiente('destino'),
+                         {'origen': 'origen', 'tamano': 3000, 'mtime_ns': 123, 'confirmado': 2000})
+        self.assertEqual(list(copias_pendientes()), ['destino'])
+        finalizar_copia('destino')
+        self.assertIsNone(copia_pendiente('destino'))
+
+    def test_intencion_cambia_estado_sin_perder_archivos(self):
+        registrar_intencion('staging', 'gen_000002', 'construyendo', ['b.mp4', 'a.mp4'])
+        registrar_intencion('staging', 'gen_000002', 'activa')
+        self.assertEqual(intencion('staging'), {'generacion': 'gen_000002', 'estado': 'activa',
+                                                'archivos': ['a.mp4', 'b.mp4']})
+
+    def test_diario_corrupto_se_aparta_y_se_empieza_uno_nuevo(self):
+        with open(self.path, "wb") as f:
+            f.write(b'esto no es una base SQLite' * 100)
+        self.assertEqual(copias_pendientes(), {})
+        self.assertTrue(os.path.exists(self.path + ".corrupto"))
+        registrar_copia('destino', 'origen', ST, 1000)
+        self.assertEqual(copia_pendiente('destino')['confirmado'], 1000)
+
+    def test_version_desconocida_se_trata_como_corrupta(self):
+        conexion = sqlite3.connect(self.path)
+        conexion.execute(f"PRAGMA user_version={journal_utils.VERSION_DIARIO + 1}")
+        conexion.close()
+        self.assertIsNone(copia_pendiente('destino'))
+        self.assertTrue(os.path.exists(self.path + ".corrupto"))
+
+    def test_error_de_escritura_deshabilita_el_diario(self):
+        registrar_copia('destino', 'origen', ST, 1000)
+        fallida = mock.Mock(**{'execute.side_effect': sqlite3.OperationalError("disco lleno")})
+        with mock.patch.object(journal_utils, '_conexion', fallida):
+            self.assertEqual(copias_pendientes(), {})
+        self.assertTrue(journal_utils._deshabilitado)
+        # Sin diario las consultas responden vacío en lugar de fallar
+        self.assertIsNone(copia_pendiente('destino'))
+
+if __name__ == '__main__':
+    unittest.main()
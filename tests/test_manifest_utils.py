@@ -0,0 +1,63 @@
+import os
+import json
+import unittest
+from tests import entorno_temporal
+from config import Config
+from benchmark import escribir_mp4_sintetico
+from manifest_utils import (construir_manifiesto, actualizar_manifiesto, guardar_manifiesto, cargar_manifiesto,
+                            hay_cambios, VERSION_MANIFIESTO)
+
+class ManifiestoTest(unittest.TestCase):
+    def setUp(self):
+        entorno_temporal(self)
+        self.video_dir = Config.VIDEO_CONFIG['VIDEO_DIR']
+        for nombre in ('a.mp4', 'b.mp4', 'c.mp4'):
+            self._video(nombre)
+        self.anterior = construir_manifiesto(self.video_dir, huellas=False)
+
+    def _video(self, nombre, size=20000):
+        escribir_mp4_sintetico(os.path.join(self.video_dir, nombre), size)
+
+    def test_entrada_por_archivo(self):
+        self.assertEqual(sorted(self.anterior), ['a.mp4', 'b.mp4', 'c.mp4'])
+        st = os.stat(os.path.join(self.video_dir, 'a.mp4'))
+        self.assertEqual(self.anterior['a.mp4'], {'size': st.st_size, 'mtime_ns': st.st_mtime_ns,
+                                                  'file_id': st.st_ino, 'huella': None})
+
+    def test_diff_completo_de_altas_bajas_y_modificaciones(self):
+        os.remove(os.path.join(self.video_dir, 'b.mp4'))
+        self._video('c.mp4', 30000)
+        self._video('d.mp4')
+        nuevo, diff = actualizar_manifiesto(self.video_dir, self.anterior, huellas=False)
+        self.assertEqual((diff['agregados'], diff['eliminados'], diff['modificados'], diff['sin_cambios']),
+                         (['d.mp4'], ['b.mp4'], ['c.mp4'], 1))
+        self.assertEqual(sorted(nuevo), ['a.mp4', 'c.mp4', 'd.mp4'])
+
+    def test_diff_incremental_solo_revisa_los_nombres_indicados(self):
+        self._video('c.mp4', 30000)
+        self._video('d.mp4')
+        nuevo, diff = actualizar_manifiesto(self.video_dir, self.anterior, cambiados={'d.mp4'}, huellas=False)
+        self.assertEqual(diff['agregados'], ['d.mp4'])
+        self.assertEqual(diff['modificados'], [])
+        # c.mp4 no se reportó: conserva su entrada anterior
+        self.assertEqual(nuevo['c.mp4'], self.anterior['c.mp4'])
+
+    def test_sin_cambios(self):
+        _, diff = actualizar_manifiesto(self.video_dir, self.anterior, huellas=False)
+        self.assertFalse(hay_cambios(diff))
+
+    def test_guardar_y_cargar(self):
+        guardar_manifiesto(self.anterior)
+        self.assertEqual(cargar_manifiesto(), self.anterior)
+        self.assertFalse(os.path.exists(Config.PATHS['MANIFEST_FILE'] + ".tmp"))
+
+    def test_version_distinta_o_ilegible_se_reconstruye(self):
+        with open(Config.PATHS['MANIFEST_FILE'], "w", encoding="utf-8") as f:
+            json.dump({'version': VERSION_MANIFIESTO + 1, 'archivos': self.anterior}, f)
+        self.assertEqual(cargar_manifiesto(), {})
+        with open(Config.PATHS['MANIFEST_FILE'], "w", encoding="utf-8") as f:
+            f.write("{no es json")
+        self.assertEqual(cargar_manifiesto(), {})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,43 @@
+import os
+import unittest
+from unittest import mock
+from tests import entorno_temporal
+from config import Config
+import metrics_utils
+from metrics_utils import publicar_estado, escribir_estado, incrementar, fijar
+
+class PublicarEstadoTest(unittest.TestCase):
+    """El estado local se escribe fuera de la carpeta compartida; la copia compartida solo cuando cambia"""
+
+    def setUp(self):
+        self.base = entorno_temporal(self)
+        self.compartida = Config.LOG_CONFIG['LOG_SHARED_DIR']
+        Config.LOG_CONFIG['LOG_PUSH_INTERVAL'] = 0
+        for nombre, valor in (('_ultima_publicacion_estado', 0.0), ('_ultimo_estado_publicado', None)):
+            parche = mock.patch.object(metrics_utils, nombre, valor)
+            parche.start()
+            self.addCleanup(parche.stop)
+
+    def test_estado_local_fuera_de_la_carpeta_compartida(self):
+        escribir_estado()
+        self.assertTrue(os.path.exists(Config.PATHS['STATUS_FILE']))
+        self.assertEqual(os.listdir(self.compartida), [])
+
+    def test_solo_se_publica_si_las_metricas_cambian(self):
+        fijar('ultima_sincronizacion_timestamp_segundos', 1.0, pantalla='prueba')
+        destino = publicar_estado()
+        self.assertEqual(os.path.dirname(destino), self.compartida)
+        # El tiempo desde la última sincronización avanza solo: no cuenta como cambio
+        self.assertIsNone(publicar_estado())
+        incrementar('ciclos_total', resultado='publicado', pantalla='prueba')
+        self.assertEqual(publicar_estado(), destino)
+
+    def test_como_maximo_una_vez_por_intervalo(self):
+        Config.LOG_CONFIG['LOG_PUSH_INTERVAL'] = 3600
+        self.assertIsNotNone(publicar_estado())
+        incrementar('ciclos_total', resultado='publicado', pantalla='prueba')
+        self.assertIsNone(publicar_estado())
+        self.assertIsNotNone(publicar_estado(forzar=True))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,119 @@
+import io
+import os
+import struct
+import unittest
+from tests import entorno_temporal
+from config import Config
+import mp4_utils
+from mp4_utils import reubicar_moov, optimizar_inicio, detener_faststart, recorrer_cajas, validar_estructura_mp4
+from io_utils import resumen_limitacion
+
+def _caja(tipo, contenido):
+    return struct.pack('>I4s', 8 + len(contenido), tipo) + contenido
+
+def _tabla(tipo, offsets):
+    formato = 'I' if tipo == b'stco' else 'Q'
+    return _caja(tipo, bytes(4) + struct.pack(f'>I{len(offsets)}{formato}', len(offsets), *offsets))
+
+def _pista(tipo, offsets):
+    stbl = _caja(b'stbl', _caja(b'stsd', bytes(8)) + _tabla(tipo, offsets))
+    return _caja(b'trak', _caja(b'tkhd', bytes(84)) + _caja(b'mdia', _caja(b'minf', stbl)))
+
+def _moov(offsets_stco, offsets_co64, tamano_cero=False):
+    moov = _caja(b'moov', _caja(b'mvhd', bytes(100)) + _pista(b'stco', offsets_stco) + _pista(b'co64', offsets_co64))
+    # Tamaño 0: la caja llega hasta el final del archivo
+    return bytes(4) + moov[4:] if tamano_cero else moov
+
+def _offsets(path):
+    """Offsets de chunks de cada tabla stco/co64 y el orden de las cajas de nivel superior"""
+    with open(path, "rb") as f:
+        datos = f.read()
+    cajas = list(recorrer_cajas(io.BytesIO(datos), 0, len(datos)))
+    _, inicio, tamano, encabezado = next(c for c in cajas if c[0] == 'moov')
+    moov = datos[inicio:inicio + tamano]
+    tablas = []
+    for tipo, offset, _, enc in mp4_utils._tablas_chunks(io.BytesIO(moov), encabezado, len(moov)):
+        cantidad = struct.unpack_from('>I', moov, offset + enc + 4)[0]
+        tablas.append(list(struct.unpack_from(f">{cantidad}{'I' if tipo == 'stco' else 'Q'}", moov, offset + enc + 8)))
+    return [c[0] for c in cajas], tablas, datos
+
+class _ConClip(unittest.TestCase):
+    """MP4 sintético con 'moov' al final: chunks de datos conocidos en el primer 'mdat'"""
+
+    def setUp(self):
+        self.base = entorno_temporal(self)
+        self.path = os.path.join(self.base, 'clip.mp4')
+        self.ftyp = _caja(b'ftyp', b'isom' + struct.pack('>I', 512) + b'isomiso2mp41')
+        self.chunks = [os.urandom(1000) for _ in range(6)]
+        self.mdat = _caja(b'mdat', b''.join(self.chunks))
+        inicio = len(self.ftyp) + 8
+        self.offsets = [inicio + i * 1000 for i in range(6)]
+
+    def _escribir(self, moov, despues=b''):
+        with open(self.path, "wb") as f:
+            f.write(self.ftyp + self.mdat + _caja(b'free', bytes(50)) + moov + despues)
+        os.utime(self.path, ns=(1, 123456789000))
+
+    def _comprobar_chunks(self, antes, tablas_antes):
+        tipos, tablas, datos = _offsets(self.path)
+        self.assertEqual(tipos[:2], ['ftyp', 'moov'])
+        self.assertEqual(len(datos), len(antes))
+        self.assertEqual(os.stat(self.path).st_mtime_ns, 123456789000)
+        self.assertEqual(validar_estructura_mp4(self.path), (True, None))
+        # Cada offset corregido apunta a los mismos bytes que antes de mover 'moov'
+        for offsets_antes, offsets_despues in zip(tablas_antes, tablas):
+            for a, d in zip(offsets_antes, offsets_despues):
+                self.assertEqual(datos[d:d + 1000], antes[a:a + 1000])
+        return tablas
+
+class ReubicarMoovTest(_ConClip):
+    def test_corrige_offsets_stco_y_co64(self):
+        moov = _moov(self.offsets[:3], self.offsets[3:])
+        self._escribir(moov)
+        antes = open(self.path, "rb").read()
+        self.assertEqual(reubicar_moov(self.path, 700), 'reubicado')
+        tablas = self._comprobar_chunks(antes, [self.offsets[:3], self.offsets[3:]])
+        self.assertEqual(tablas, [[o + len(moov) for o in self.offsets[:3]], [o + len(moov) for o in self.offsets[3:]]])
+        self.assertEqual(reubicar_moov(self.path), 'ya_optimizado')
+
+    def test_moov_con_tamano_cero(self):
+        self._escribir(_moov(self.offsets[:3], self.offsets[3:], tamano_cero=True))
+        antes = open(self.path, "rb").read()
+        self.assertEqual(reubicar_moov(self.path, 700), 'reubicado')
+        self._comprobar_chunks(antes, [self.offsets[:3], self.offsets[3:]])
+
+    def test_offsets_despues_de_moov_no_se_mueven(self):
+        # Un segundo 'mdat' después de 'moov': sus chunks no cambian de posición
+        previo = len(self.ftyp) + len(self.mdat) + 58
+        largo_moov = len(_moov(self.offsets[:3], [0]))
+        tardio = previo + largo_moov + 8
+        self._escribir(_moov(self.offsets[:3], [tardio]), _caja(b'mdat', os.urandom(1000)))
+        antes = open(self.path, "rb").read()
+        self.assertEqual(reubicar_moov(self.path, 700), 'reubicado')
+        tablas = self._comprobar_chunks(antes, [self.offsets[:3], [tardio]])
+        self.assertEqual(tablas[1], [tardio])
+
+    def test_cada_bloque_cuenta_para_el_limite_de_es(self):
+        Config.COPY_CONFIG['IO_MAX_MB_S'] = 1000
+        self._escribir(_moov(self.offsets[:3], self.offsets[3:]))
+        previo = resumen_limitacion().get('faststart', {'bytes': 0})['bytes']
+        reubicar_moov(self.path, 700)
+        moov = len(_moov(self.offsets[:3], self.offsets[3:]))
+        self.assertEqual(resumen_limitacion()['faststart']['bytes'] - previo, os.path.getsize(self.path) - moov)
+
+class OptimizarInicioTest(_ConClip):
+    """Reescritura en el pool de procesos: la limitación de cada proceso se suma a los totales del daemon"""
+
+    def test_pool_reubica_y_reporta_la_limitacion(self):
+        self.addCleanup(detener_faststart)
+        Config.VIDEO_CONFIG.update(MP4_FASTSTART=True, MP4_FASTSTART_WORKERS=1)
+        Config.COPY_CONFIG['IO_MAX_MB_S'] = 1000
+        self._escribir(_moov(self.offsets[:3], self.offsets[3:]))
+        antes = open(self.path, "rb").read()
+        previo = resumen_limitacion().get('faststart', {'bytes': 0})['bytes']
+        self.assertEqual(optimizar_inicio([self.path]), {self.path: 'reubicado'})
+        self._comprobar_chunks(antes, [self.offsets[:3], self.offsets[3:]])
+        self.assertEqual(resumen_limitacion()['faststart']['bytes'] - previo, len(antes))
+
+if __name__ == '__main__':
+    unittest.main()
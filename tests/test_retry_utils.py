@@ -0,0 +1,48 @@
+import random
+import unittest
+from tests import entorno_temporal
+from retry_utils import PlanificadorReintentos, CERRADO, ABIERTO
+
+class PlanificadorReintentosTest(unittest.TestCase):
+    def setUp(self):
+        entorno_temporal(self)
+
+    def _planificador(self, jitter=0.0, aleatorio=None):
+        return PlanificadorReintentos('prueba', base=1, maximo=60, jitter=jitter, umbral=3,
+                                      aleatorio=aleatorio or random.Random(0))
+
+    def test_backoff_exponencial_con_tope(self):
+        reintentos = self._planificador()
+        self.assertEqual([reintentos.registrar_fallo() for _ in range(8)], [1, 2, 4, 8, 16, 32, 60, 60])
+
+    def test_muchos_fallos_no_desbordan_el_exponente(self):
+        reintentos = self._planificador()
+        reintentos.maximo = float('inf')
+        reintentos.fallos = 10 ** 6
+        self.assertEqual(reintentos.registrar_fallo(), 2 ** 32)
+
+    def test_jitter_resta_hasta_su_fraccion(self):
+        reintentos = self._planificador(jitter=0.5, aleatorio=random.Random(7))
+        esperado = random.Random(7)
+        for fallo in range(1, 6):
+            self.assertAlmostEqual(reintentos.registrar_fallo(), 2 ** (fallo - 1) * (1 - 0.5 * esperado.random()))
+
+    def test_circuito_se_abre_en_el_umbral_y_cierra_con_un_exito(self):
+        reintentos = self._planificador()
+        estados = []
+        for _ in range(4):
+            reintentos.registrar_fallo('sin contenido')
+            estados.append(reintentos.estado_circuito)
+        self.assertEqual(estados, [CERRADO, CERRADO, ABIERTO, ABIERTO])
+        self.assertTrue(reintentos.abierto)
+        self.assertEqual(reintentos.estado()['ultimo_error'], 'sin contenido')
+
+        reintentos.registrar_exito()
+        estado = reintentos.estado()
+        self.assertEqual((estado['estado'], estado['fallos_consecutivos'], estado['espera']), (CERRADO, 0, 0.0))
+        self.assertIsNone(estado['proximo_intento'])
+        # Tras cerrarse, el backoff vuelve a empezar desde la base
+        self.assertEqual(reintentos.registrar_fallo(), 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+import os
+import unittest
+from unittest import mock
+from tests import entorno_temporal
+from config import Config
+from benchmark import escribir_mp4_sintetico
+from staging_utils import (construir_generacion, activar_generacion, revertir_generacion, podar_generaciones,
+                           generacion_activa, listar_generaciones, validar_generacion, ARCHIVO_ACTIVA)
+
+class GeneracionesTest(unittest.TestCase):
+    def setUp(self):
+        self.base = entorno_temporal(self)
+        self.video_dir = Config.VIDEO_CONFIG['VIDEO_DIR']
+        self.staging = Config.PATHS['TEMP_VIDEO_DIR']
+        self.playlist = Config.PATHS['PLAYLIST_PATH']
+        Config.SYNC_CONFIG['STAGING_GENERATIONS_KEEP'] = 2
+        for nombre in ('a.mp4', 'b.mp4'):
+            escribir_mp4_sintetico(os.path.join(self.video_dir, nombre), 20000)
+
+    def _construir(self, activar=True):
+        generacion = construir_generacion(sorted(os.listdir(self.video_dir)), self.video_dir)
+        self.assertTrue(validar_generacion(generacion))
+        if activar:
+            activar_generacion(generacion['nombre'])
+        return generacion
+
+    def _playlist(self):
+        with open(self.playlist, encoding="utf-8") as f:
+            return [os.path.relpath(linea, self.staging) for linea in f.read().split()]
+
+    def test_solo_copia_lo_modificado_y_enlaza_el_resto(self):
+        primera = self._construir()
+        self.assertEqual(primera['copiados'], ['a.mp4', 'b.mp4'])
+        escribir_mp4_sintetico(os.path.join(self.video_dir, 'b.mp4'), 30000)
+        segunda = self._construir(activar=False)
+        self.assertEqual((segunda['enlazados'], segunda['copiados']), (['a.mp4'], ['b.mp4']))
+        self.assertTrue(os.path.samefile(os.path.join(primera['dir'], 'a.mp4'), os.path.join(segunda['dir'], 'a.mp4')))
+        # Construir no cambia lo que se reproduce
+        self.assertEqual(generacion_activa(), primera['nombre'])
+
+    def test_activar_cambia_playlist_y_puntero(self):
+        self._construir()
+        segunda = self._construir()
+        self.assertEqual(generacion_activa(), segunda['nombre'])
+        self.assertEqual(self._playlist(), [segunda['nombre'] + '/a.mp4', segunda['nombre'] + '/b.mp4'])
+        self.assertFalse([n for n in os.listdir(self.staging) if n.endswith('.tmp')])
+
+    def test_activacion_interrumpida_conserva_el_puntero_anterior(self):
+        primera = self._construir()
+        segunda = self._construir(activar=False)
+        reemplazar = os.replace
+
+        def fallar_en_puntero(origen, destino):
+            if destino.endswith(ARCHIVO_ACTIVA):
+                raise OSError("disco lleno")
+            reemplazar(origen, destino)
+
+        with mock.patch('os.replace', fallar_en_puntero):
+            with self.assertRaises(OSError):
+                activar_generacion(segunda['nombre'])
+        # El puntero nunca queda a medias: sigue indicando la generación anterior
+        self.assertEqual(generacion_activa(), primera['nombre'])
+        with open(os.path.join(self.staging, ARCHIVO_ACTIVA), encoding="utf-8") as f:
+            self.assertEqual(f.read(), primera['nombre'])
+
+    def test_revertir_restaura_la_generacion_anterior(self):
+        primera = self._construir()
+        os.remove(os.path.join(self.video_dir, 'b.mp4'))
+        segunda = self._construir()
+        self.assertEqual(self._playlist(), [segunda['nombre'] + '/a.mp4'])
+        self.assertEqual(revertir_generacion(), primera['nombre'])
+        self.assertEqual(generacion_activa(), primera['nombre'])
+        self.assertEqual(self._playlist(), [primera['nombre'] + '/a.mp4', primera['nombre'] + '/b.mp4'])
+
+    def test_revertir_sin_anterior(self):
+        primera = self._construir()
+        self.assertIsNone(revertir_generacion())
+        self.assertEqual(generacion_activa(), primera['nombre'])
+
+    def test_poda_conserva_las_recientes_y_elimina_las_no_activadas(self):
+        generaciones = [self._construir()['nombre'] for _ in range(4)]
+        interrumpida = self._construir(activar=False)['nombre']
+        # Resto del formato plano anterior del staging
+        open(os.path.join(self.staging, 'viejo.mp4'), "w").close()
+        podar_generaciones()
+        self.assertEqual(listar_generaciones(), generaciones[-2:])
+        self.assertNotIn(interrumpida, listar_generaciones())
+        self.assertEqual(sorted(os.listdir(self.staging)),
+                         sorted([ARCHIVO_ACTIVA] + generaciones[-2:] + [g + '.m3u' for g in generaciones[-2:]]))
+
+    def test_con_una_generacion_conservada_no_hay_rollback(self):
+        Config.SYNC_CONFIG['STAGING_GENERATIONS_KEEP'] = 1
+        self._construir()
+        segunda = self._construir()
+        self.assertEqual(listar_generaciones(), [segunda['nombre']])
+        self.assertIsNone(revertir_generacion())
+
+if __name__ == '__main__':
+    unittest.main()
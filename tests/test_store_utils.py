@@ -0,0 +1,142 @@
+import os
+import time
+import threading
+import unittest
+from unittest import mock
+from tests import entorno_temporal
+from config import Config
+from benchmark import escribir_mp4_sintetico
+import store_utils
+from store_utils import incorporar_archivos
+
+class IncorporarArchivosTest(unittest.TestCase):
+    def setUp(self):
+        self.base = entorno_temporal(self)
+        self.video_dir = Config.VIDEO_CONFIG['VIDEO_DIR']
+        self.store_dir = Config.PATHS['STORE_DIR']
+        self.gen_dir = os.path.join(self.base, 'gen_000001')
+        os.makedirs(self.gen_dir)
+        for nombre in ('a.mp4', 'b.mp4'):
+            escribir_mp4_sintetico(os.path.join(self.video_dir, nombre), 20000)
+        parche = mock.patch.dict(store_utils._enlaces_admitidos, clear=True)
+        parche.start()
+        self.addCleanup(parche.stop)
+
+    def test_con_hardlinks_la_generacion_enlaza_el_almacen(self):
+        resumen = incorporar_archivos(['a.mp4', 'b.mp4'], self.video_dir, self.gen_dir)
+        self.assertEqual(resumen['fallidos'], {})
+        self.assertEqual(len(store_utils._objetos(self.store_dir)), 2)
+        self.assertEqual(os.stat(os.path.join(self.gen_dir, 'a.mp4')).st_nlink, 2)
+
+    def test_sin_hardlinks_no_copia_al_almacen(self):
+        with mock.patch('store_utils.os.link', side_effect=OSError("sin hardlinks")):
+            resumen = incorporar_archivos(['a.mp4', 'b.mp4'], self.video_dir, self.gen_dir)
+        self.assertEqual(resumen['fallidos'], {})
+        self.assertEqual(sorted(r['archivo'] for r in resumen['resultados']), ['a.mp4', 'b.mp4'])
+        self.assertEqual(store_utils._objetos(self.store_dir), {})
+        self.assertEqual(sorted(os.listdir(self.gen_dir)), ['a.mp4', 'b.mp4'])
+
+class DesalojoTest(unittest.TestCase):
+    """El número de enlaces de un objeto es su contador de referencias"""
+
+    def setUp(self):
+        self.base = entorno_temporal(self)
+        self.store_dir = Config.PATHS['STORE_DIR']
+        self.objetos = {}
+        for nombre in ('en_uso', 'retenido'):
+            self.objetos[nombre] = os.path.join(self.store_dir, 'blake2b', 'ab', nombre + '.mp4')
+            os.makedirs(os.path.dirname(self.objetos[nombre]), exist_ok=True)
+            escribir_mp4_sintetico(self.objetos[nombre], 2 * 1024 * 1024)
+        os.link(self.objetos['en_uso'], os.path.join(self.base, 'en_uso.mp4'))
+        parche = mock.patch.dict(store_utils._indices, clear=True)
+        parche.start()
+        self.addCleanup(parche.stop)
+
+    def test_objeto_enlazado_nunca_se_desaloja(self):
+        # Retención vencida y cuota por debajo de lo que ocupa el almacén
+        Config.SYNC_CONFIG.update(STORE_RETENTION_HOURS=0, STORE_MAX_SIZE_MB=1)
+        store_utils.limpiar_almacen()
+        self.assertTrue(os.path.exists(self.objetos['en_uso']))
+        self.assertFalse(os.path.exists(self.objetos['retenido']))
+
+    def test_enlace_posterior_al_listado_protege_el_objeto(self):
+        Config.SYNC_CONFIG.update(STORE_RETENTION_HOURS=0, STORE_MAX_SIZE_MB=0)
+        objetos = store_utils._objetos(self.store_dir)
+        os.link(self.objetos['retenido'], os.path.join(self.base, 'retenido.mp4'))
+        indice = store_utils._indice(self.store_dir)
+        self.assertEqual(store_utils._desalojar(self.store_dir, objetos, indice), 0)
+        self.assertTrue(os.path.exists(self.objetos['retenido']))
+        self.assertNotIn(os.path.relpath(self.objetos['retenido'], self.store_dir), indice['liberados'])
+
+    def test_cuota_desaloja_primero_lo_liberado_hace_mas_tiempo(self):
+        Config.SYNC_CONFIG.update(STORE_RETENTION_HOURS=72, STORE_MAX_SIZE_MB=5)
+        os.remove(os.path.join(self.base, 'en_uso.mp4'))
+        self.objetos['nuevo'] = os.path.join(self.store_dir, 'blake2b', 'ab', 'nuevo.mp4')
+        escribir_mp4_sintetico(self.objetos['nuevo'], 2 * 1024 * 1024)
+        indice = store_utils._indice(self.store_dir)
+        ahora = time.time()
+        # 'en_uso' se liberó después que 'retenido' aunque ninguno se haya reproducido desde entonces
+        for nombre, hace in (('retenido', 3600), ('en_uso', 60), ('nuevo', 0)):
+            indice['liberados'][os.path.relpath(self.objetos[nombre], self.store_dir)] = ahora - hace
+        objetos = store_utils._objetos(self.store_dir)
+        liberado = store_utils._desalojar(self.store_dir, objetos, indice)
+        self.assertEqual(liberado, 2 * 1024 * 1024)
+        self.assertFalse(os.path.exists(self.objetos['retenido']))
+        self.assertTrue(os.path.exists(self.objetos['en_uso']))
+        self.assertTrue(os.path.exists(self.objetos['nuevo']))
+
+class ReescrituraConcurrenteTest(unittest.TestCase):
+    """Dos pantallas incorporan el mismo origen mientras el faststart reescribe el objeto nuevo"""
+
+    def setUp(self):
+        self.base = entorno_temporal(self)
+        self.video_dir = Config.VIDEO_CONFIG['VIDEO_DIR']
+        escribir_mp4_sintetico(os.path.join(self.video_dir, 'a.mp4'), 20000)
+        self.reescribiendo = threading.Event()
+        self.continuar = threading.Event()
+        self.addCleanup(self.continuar.set)
+        for parche in (mock.patch.dict(store_utils._enlaces_admitidos, clear=True),
+                       mock.patch.dict(store_utils._indices, clear=True),
+                       mock.patch.object(store_utils, 'optimizar_inicio', self._reescribir)):
+            parche.start()
+            self.addCleanup(parche.stop)
+
+    def _reescribir(self, paths, nombres=None):
+        """Como el faststart: el objeto se reemplaza por un archivo nuevo (otro inode) con os.replace"""
+        if not paths:
+            return
+        self.reescribiendo.set()
+        self.continuar.wait(5)
+        for path in paths:
+            escribir_mp4_sintetico(path + '.faststart', 20000)
+            os.replace(path + '.faststart', path)
+
+    def _incorporar(self, pantalla, resultados):
+        gen_dir = os.path.join(self.base, pantalla, 'gen_000001')
+        os.makedirs(gen_dir)
+        resultados[pantalla] = incorporar_archivos(['a.mp4'], self.video_dir, gen_dir)
+
+    def test_la_segunda_pantalla_enlaza_el_objeto_reescrito(self):
+        resultados = {}
+        primera = threading.Thread(target=self._incorporar, args=('recepcion', resultados))
+        primera.start()
+        self.assertTrue(self.reescribiendo.wait(5))
+        segunda = threading.Thread(target=self._incorporar, args=('comedor', resultados))
+        segunda.start()
+        # Mientras dura la reescritura la segunda pantalla no enlaza la versión anterior
+        time.sleep(0.3)
+        self.assertFalse(os.path.exists(os.path.join(self.base, 'comedor', 'gen_000001', 'a.mp4')))
+        self.continuar.set()
+        primera.join(5)
+        segunda.join(5)
+
+        self.assertEqual(resultados['recepcion']['fallidos'], {})
+        self.assertEqual(resultados['comedor']['reutilizados'], ['a.mp4'])
+        (objeto,) = store_utils._objetos(Config.PATHS['STORE_DIR'])
+        objeto = os.path.join(Config.PATHS['STORE_DIR'], objeto)
+        for pantalla in ('recepcion', 'comedor'):
+            self.assertTrue(os.path.samefile(os.path.join(self.base, pantalla, 'gen_000001', 'a.mp4'), objeto))
+        self.assertEqual(os.stat(objeto).st_nlink, 3)
+
+if __name__ == '__main__':
+    unittest.main()
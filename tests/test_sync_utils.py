@@ -0,0 +1,57 @@
+import os
+import struct
+import unittest
+from tests import entorno_temporal
+from config import Config
+from benchmark import escribir_mp4_sintetico
+from sync_utils import verificar_archivo, _finales_en_ceros
+
+def _caja(tipo, contenido):
+    return struct.pack('>I4s', 8 + len(contenido), tipo) + contenido
+
+class FinalEnCerosTest(unittest.TestCase):
+    def setUp(self):
+        self.base = entorno_temporal(self)
+        self.addCleanup(_finales_en_ceros.clear)
+        self.bloque = Config.SYNC_CONFIG['FILE_CHECK_BLOCK_SIZE']
+
+    def _mp4_con_relleno(self, nombre, datos=64 * 1024):
+        """MP4 terminado cuya última caja es un 'free' en ceros más grande que el bloque final"""
+        path = os.path.join(self.base, nombre)
+        with open(path, "wb") as f:
+            f.write(_caja(b'ftyp', b'isom' + struct.pack('>I', 512) + b'isomiso2mp41'))
+            f.write(_caja(b'moov', _caja(b'mvhd', bytes(100))))
+            f.write(_caja(b'mdat', os.urandom(datos)))
+            f.write(_caja(b'free', bytes(2 * self.bloque)))
+        return path
+
+    def test_relleno_final_estable_se_acepta(self):
+        path = self._mp4_con_relleno('relleno.mp4')
+        self.assertFalse(verificar_archivo(path))
+        self.assertTrue(verificar_archivo(path))
+        self.assertNotIn(path, _finales_en_ceros)
+
+    def test_final_en_ceros_que_sigue_cambiando_queda_pendiente(self):
+        path = self._mp4_con_relleno('descargando.mp4')
+        self.assertFalse(verificar_archivo(path))
+        st = os.stat(path)
+        os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+        self.assertFalse(verificar_archivo(path))
+
+    def test_preasignado_con_estructura_incompleta_queda_pendiente(self):
+        path = os.path.join(self.base, 'preasignado.mp4')
+        escribir_mp4_sintetico(path, 64 * 1024)
+        # El mdat declara más bytes de los que tiene el archivo y el final sigue en ceros
+        with open(path, "r+b") as f:
+            f.seek(-self.bloque, 2)
+            f.write(bytes(self.bloque))
+            f.truncate(48 * 1024)
+            f.seek(-self.bloque, 2)
+            f.write(bytes(self.bloque))
+        for _ in range(3):
+            self.assertFalse(verificar_archivo(path))
+
+    def test_final_con_datos_se_acepta_a_la_primera(self):
+        path = os.path.join(self.base, 'completo.mp4')
+        escribir_mp4_sintetico(path, 64 * 1024)
+        self.assertTrue(verificar_archivo(path))
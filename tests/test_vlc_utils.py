@@ -0,0 +1,262 @@
+import os
+import sys
+import time
+import unittest
+import subprocess
+from tests import entorno_temporal, puerto_libre
+from config import Config
+from benchmark import escribir_mp4_sintetico
+from vlc_utils import ReproductorVLC, SondaReproduccion, SupervisorVLC, _esperar_proceso, _terminar_proceso
+from fake_vlc import FakeVLC
+
+def _escribir_generacion(base, nombre, archivos, almacen):
+    """Generación con hardlinks al almacén (como construir_generacion) y su playlist"""
+    gen_dir = os.path.join(base, nombre)
+    os.makedirs(gen_dir)
+    rutas = []
+    for f in archivos:
+        objeto = os.path.join(almacen, f)
+        if not os.path.exists(objeto):
+            escribir_mp4_sintetico(objeto, 20000)
+        os.link(objeto, os.path.join(gen_dir, f))
+        rutas.append(os.path.join(gen_dir, f))
+    playlist = os.path.join(base, nombre + ".m3u")
+    with open(playlist, "w", encoding="utf-8") as pl:
+        pl.write("\n".join(rutas) + "\n")
+    return playlist
+
+class _ConFakeVLC(unittest.TestCase):
+    def setUp(self):
+        self.base = entorno_temporal(self)
+        self.fake = FakeVLC(puerto=puerto_libre()).iniciar()
+        self.addCleanup(self.fake.detener)
+        # Un 'colgado' no debe dejar solicitudes esperando al detener el servidor
+        self.addCleanup(self.fake.reproductor.congelar, None)
+        Config.VLC_CONFIG.update(VLC_HTTP_PORT=self.fake.puerto, VLC_HTTP_TIMEOUT=0.5)
+        self.vlc = ReproductorVLC('prueba', os.path.join(self.base, 'playlist.m3u'),
+                                  os.path.join(self.base, 'flag'), self.fake.puerto)
+
+    def _uris(self):
+        return [item['uri'] for item in self.vlc.obtener_items()]
+
+class PlaylistEnCalienteTest(_ConFakeVLC):
+    def setUp(self):
+        super().setUp()
+        self.almacen = os.path.join(self.base, 'almacen')
+        os.makedirs(self.almacen)
+
+    def test_sin_cambios_no_reencola_aunque_cambie_la_generacion(self):
+        self.fake.cargar_playlist(_escribir_generacion(self.base, 'gen_000001', ['a.mp4', 'b.mp4'], self.almacen))
+        antes = self.vlc.obtener_items()
+        self.assertTrue(self.vlc.actualizar_playlist_en_caliente(
+            _escribir_generacion(self.base, 'gen_000002', ['a.mp4', 'b.mp4'], self.almacen)))
+        self.assertEqual(self.vlc.obtener_items(), antes)
+
+    def test_encola_lo_nuevo_y_retira_lo_eliminado(self):
+        self.fake.cargar_playlist(_escribir_generacion(self.base, 'gen_000001', ['a.mp4', 'b.mp4'], self.almacen))
+        self.vlc.actualizar_playlist_en_caliente(
+            _escribir_generacion(self.base, 'gen_000002', ['a.mp4', 'c.mp4'], self.almacen))
+        self.assertEqual([os.path.relpath(u[len('file://'):], self.base) for u in self._uris()],
+                         ['gen_000001/a.mp4', 'gen_000002/c.mp4'])
+
+    def test_no_retira_el_elemento_en_reproduccion(self):
+        self.fake.cargar_playlist(_escribir_generacion(self.base, 'gen_000001', ['a.mp4', 'b.mp4'], self.almacen))
+        self.vlc.actualizar_playlist_en_caliente(
+            _escribir_generacion(self.base, 'gen_000002', ['b.mp4'], self.almacen))
+        self.assertEqual([os.path.basename(u) for u in self._uris()], ['a.mp4', 'b.mp4'])
+
+    def test_contenido_repetido_con_dos_nombres_son_dos_elementos(self):
+        self.fake.cargar_playlist(_escribir_generacion(self.base, 'gen_000001', ['a.mp4'], self.almacen))
+        gen_dir = os.path.join(self.base, 'gen_000002')
+        playlist = _escribir_generacion(self.base, 'gen_000002', ['a.mp4'], self.almacen)
+        os.link(os.path.join(gen_dir, 'a.mp4'), os.path.join(gen_dir, 'copia_de_a.mp4'))
+        with open(playlist, "a", encoding="utf-8") as pl:
+            pl.write(os.path.join(gen_dir, 'copia_de_a.mp4') + "\n")
+        self.vlc.actualizar_playlist_en_caliente(playlist)
+        self.assertEqual([os.path.basename(u) for u in self._uris()], ['a.mp4', 'copia_de_a.mp4'])
+
+class SondaReproduccionTest(_ConFakeVLC):
+    def setUp(self):
+        super().setUp()
+        Config.VLC_CONFIG.update(VLC_HEALTH_INTERVAL=0.05, VLC_STALL_TIMEOUT=0.3, VLC_KILL_TIMEOUT=2,
+                                 VLC_HTTP_TIMEOUT=0.1)
+        almacen = os.path.join(self.base, 'almacen')
+        os.makedirs(almacen)
+        self.fake.cargar_playlist(_escribir_generacion(self.base, 'gen_000001', ['a.mp4', 'b.mp4'], almacen))
+        # Proceso que representa a VLC: la sonda lo termina al reiniciar
+        self.vlc.proceso = subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(60)'])
+        self.addCleanup(self.vlc.proceso.kill)
+        self.sonda = SondaReproduccion(self.vlc)
+
+    def _revisar_hasta(self, esperados, limite=3):
+        """Resultados de revisar() hasta el primero que esté en esperados"""
+        resultados = []
+        fin = time.monotonic() + limite
+        while time.monotonic() < fin:
+            resultados.append(self.sonda.revisar())
+            if resultados[-1] in esperados:
+                return resultados
+            time.sleep(Config.VLC_CONFIG['VLC_HEALTH_INTERVAL'])
+        self.fail(f"Sin {esperados} tras {limite} s: {resultados}")
+
+    def test_reproduccion_normal_no_actua(self):
+        for _ in range(10):
+            self.assertEqual(self.sonda.revisar(), 'reproduciendo')
+            time.sleep(0.05)
+        self.assertIsNone(self.vlc.proceso.poll())
+
+    def test_elemento_congelado_se_salta(self):
+        self.fake.reproductor.congelar('item')
+        resultados = self._revisar_hasta({'saltar', 'reiniciar'})
+        self.assertEqual(resultados[-1], 'saltar')
+        self.assertIn('sin_avance', resultados)
+        self.assertEqual(self._revisar_hasta({'reproduciendo', 'reiniciar'})[-1], 'reproduciendo')
+        self.assertIsNone(self.vlc.proceso.poll())
+
+    def test_imagen_congelada_escala_de_saltar_a_reiniciar(self):
+        self.fake.reproductor.congelar('imagen')
+        self.assertEqual(self._revisar_hasta({'saltar', 'reiniciar'})[-1], 'saltar')
+        self.assertEqual(self._revisar_hasta({'reproduciendo', 'reiniciar'})[-1], 'reiniciar')
+        self.assertIsNotNone(self.vlc.proceso.poll())
+        self.assertEqual(self.sonda.reinicios, 1)
+
+    def test_reproduccion_detenida_se_reanuda(self):
+        self.fake.reproductor.congelar('detenido')
+        self.assertEqual(self._revisar_hasta({'reanudar', 'saltar', 'reiniciar'})[-1], 'reanudar')
+        self.assertEqual(self._revisar_hasta({'reproduciendo', 'reiniciar'})[-1], 'reproduciendo')
+
+    def test_interfaz_colgada_reinicia(self):
+        self.fake.reproductor.congelar('colgado')
+        resultados = self._revisar_hasta({'saltar', 'reanudar', 'reiniciar'})
+        self.assertEqual(resultados[-1], 'reiniciar')
+        self.assertIn('sin_respuesta', resultados)
+        self.assertIsNotNone(self.vlc.proceso.poll())
+
+    def test_cola_vacia_reinicia(self):
+        self.fake.reproductor.congelar('vacio')
+        self.assertEqual(self._revisar_hasta({'saltar', 'reanudar', 'reiniciar'})[-1], 'reiniciar')
+
+class ProcesoPropioTest(unittest.TestCase):
+    """Un VLC lanzado por el daemon (Popen) se espera y se termina sin recurrir a psutil"""
+
+    def setUp(self):
+        self.proceso = subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(60)'])
+        self.addCleanup(self.proceso.wait)
+        self.addCleanup(self.proceso.kill)
+
+    def test_espera_con_timeout(self):
+        self.assertFalse(_esperar_proceso(self.proceso, 0.05))
+        self.proceso.kill()
+        self.assertTrue(_esperar_proceso(self.proceso, 5))
+
+    def test_terminar(self):
+        self.assertTrue(_terminar_proceso(self.proceso, 5))
+        self.assertIsNotNone(self.proceso.poll())
+        # Ya terminado: no falla
+        self.assertTrue(_terminar_proceso(self.proceso, 5))
+
+class SupervisorVLCTest(unittest.TestCase):
+    """El supervisor espera la salida del proceso gestionado (sin psutil) y lo relanza con backoff"""
+
+    def setUp(self):
+        self.base = entorno_temporal(self)
+        Config.VLC_CONFIG.update(VLC_RESTART_BACKOFF_MIN=0.05, VLC_RESTART_BACKOFF_MAX=0.2,
+                                 VLC_RESTART_STABLE=30, VLC_KILL_TIMEOUT=2)
+        self.vlc = ReproductorVLC('prueba', os.path.join(self.base, 'playlist.m3u'),
+                                  os.path.join(self.base, 'flag'), puerto_libre())
+        self.procesos = []
+        # Inicios fallidos antes de que iniciar() vuelva a lanzar el proceso
+        self.fallos = 0
+        self.intentos = []
+        self.vlc.iniciar = self._iniciar
+        self.supervisor = SupervisorVLC(self.vlc)
+        self.addCleanup(self._limpiar)
+
+    def _iniciar(self):
+        """Sustituto de ReproductorVLC.iniciar: un proceso dormido hace de VLC"""
+        with self.vlc.lock:
+            self.intentos.append(time.monotonic())
+            if self.fallos:
+                self.fallos -= 1
+                return False
+            proceso = subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(60)'])
+            self.procesos.append(proceso)
+            self.vlc._registrar_proceso(proceso)
+            return True
+
+    def _limpiar(self):
+        # El hilo del supervisor queda bloqueado en la espera del proceso hasta que este termina
+        self.supervisor.detener()
+        for proceso in self.procesos:
+            proceso.kill()
+            proceso.wait()
+        if self.supervisor._hilo:
+            self.supervisor._hilo.join(5)
+
+    def _esperar(self, condicion, limite=5):
+        fin = time.monotonic() + limite
+        while time.monotonic() < fin:
+            if condicion():
+                return
+            time.sleep(0.01)
+        self.fail("La condición no se cumplió a tiempo")
+
+    def test_salida_inesperada_relanza_de_inmediato(self):
+        self.vlc.iniciar()
+        self.supervisor.iniciar()
+        caido = self.procesos[0]
+        caido.kill()
+        self._esperar(lambda: self.supervisor.reinicios == 1)
+        self.assertIsNot(self.vlc.proceso, caido)
+        self.assertTrue(self.vlc.activo())
+        # El primer reinicio no espera backoff
+        self.assertEqual(self.supervisor._backoff, Config.VLC_CONFIG['VLC_RESTART_BACKOFF_MIN'])
+
+    def test_detener_no_relanza(self):
+        self.vlc.iniciar()
+        self.supervisor.iniciar()
+        self.assertTrue(self.vlc.detener())
+        self.assertIsNotNone(self.procesos[0].poll())
+        time.sleep(0.3)
+        self.assertEqual(self.supervisor.reinicios, 0)
+        self.assertEqual(len(self.procesos), 1)
+        self.assertIsNone(self.vlc.proceso)
+
+    def test_inicios_fallidos_duplican_el_backoff_hasta_el_maximo(self):
+        self.vlc.iniciar()
+        self.supervisor.iniciar()
+        self.fallos = 4
+        self.procesos[0].kill()
+        self._esperar(lambda: self.supervisor.reinicios == 1)
+        esperas = [b - a for a, b in zip(self.intentos[1:], self.intentos[2:])]
+        self.assertEqual(len(esperas), 4)
+        # Inmediato, luego 0.05, 0.1, 0.2 y 0.2 (tope)
+        for espera, minimo in zip(esperas, (0.05, 0.1, 0.2, 0.2)):
+            self.assertGreaterEqual(espera, minimo * 0.9)
+        self.assertEqual(self.supervisor._backoff, 0.2)
+
+    def test_ejecucion_estable_reinicia_el_backoff(self):
+        Config.VLC_CONFIG['VLC_RESTART_STABLE'] = 0
+        self.supervisor._backoff = 0.2
+        self.vlc.iniciar()
+        self.supervisor.iniciar()
+        inicio = time.monotonic()
+        self.procesos[0].kill()
+        self._esperar(lambda: self.supervisor.reinicios == 1)
+        self.assertLess(time.monotonic() - inicio, 0.2)
+
+    def test_no_relanza_si_otro_ya_lo_inicio(self):
+        self.supervisor._backoff = 0.3
+        Config.VLC_CONFIG['VLC_RESTART_STABLE'] = 30
+        self.vlc.iniciar()
+        self.supervisor.iniciar()
+        self.procesos[0].kill()
+        # Durante el backoff el bucle principal inicia VLC por su cuenta
+        self._esperar(lambda: self.vlc.proceso is None)
+        self.vlc.iniciar()
+        time.sleep(0.5)
+        self.assertEqual(self.supervisor.reinicios, 0)
+        self.assertEqual(len(self.procesos), 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import os
+import sys
+import time
+import threading
+import unittest
+from tests import entorno_temporal
+from config import Config
+from watcher_utils import VigilanteContenido
+
+class DebounceTest(unittest.TestCase):
+    """Una ráfaga de eventos se entrega como un solo cambio cuando pasa WATCHER_DEBOUNCE sin eventos"""
+
+    def setUp(self):
+        entorno_temporal(self)
+        self.vigilante = VigilanteContenido(Config.VIDEO_CONFIG['VIDEO_DIR'], backend='sondeo', debounce=0.2)
+
+    def _rafaga(self, nombres, intervalo=0.05):
+        def emitir():
+            for nombre in nombres:
+                self.vigilante._notificar(nombre)
+                time.sleep(intervalo)
+        hilo = threading.Thread(target=emitir)
+        hilo.start()
+        self.addCleanup(hilo.join)
+
+    def test_rafaga_se_agrupa_en_un_cambio(self):
+        inicio = time.monotonic()
+        self._rafaga(['a.mp4', 'b.mp4', 'a.mp4', 'MediaSync.log', 'b.mp4'])
+        self.assertTrue(self.vigilante.esperar_cambio(3))
+        # Último evento a los ~0.2 s, más 0.2 s de silencio
+        self.assertGreaterEqual(time.monotonic() - inicio, 0.4)
+        self.assertEqual(self.vigilante.obtener_cambios(), {'a.mp4', 'b.mp4'})
+        self.assertFalse(self.vigilante.esperar_cambio(0.3))
+        self.assertEqual(self.vigilante.obtener_cambios(), set())
+
+    def test_evento_sin_detalle_pide_revision_completa(self):
+        self._rafaga(['a.mp4', None, 'b.mp4'], intervalo=0)
+        self.assertTrue(self.vigilante.esperar_cambio(3))
+        self.assertIsNone(self.vigilante.obtener_cambios())
+
+    def test_timeout_sin_eventos(self):
+        self.assertFalse(self.vigilante.esperar_cambio(0.1))
+
+class TamanoWatchdogTest(unittest.TestCase):
+    """El respaldo de watchdog descarta los 'modified' que solo cambian mtime o atributos"""
+
+    def setUp(self):
+        entorno_temporal(self)
+        self.path = os.path.join(Config.VIDEO_CONFIG['VIDEO_DIR'], 'a.mp4')
+        with open(self.path, "wb") as f:
+            f.write(bytes(100))
+        self.vigilante = VigilanteContenido(Config.VIDEO_CONFIG['VIDEO_DIR'], backend='sondeo')
+        self.vigilante._cambio_de_tamano(self.path)
+
+    def test_toque_no_es_cambio(self):
+        os.utime(self.path, (time.time() + 60,) * 2)
+        self.assertFalse(self.vigilante._cambio_de_tamano(self.path))
+
+    def test_escritura_es_cambio(self):
+        with open(self.path, "ab") as f:
+            f.write(bytes(10))
+        self.assertTrue(self.vigilante._cambio_de_tamano(self.path))
+        self.assertFalse(self.vigilante._cambio_de_tamano(self.path))
+
+@unittest.skipUnless(sys.platform.startswith('linux'), "inotify solo existe en Linux")
+class InotifyTest(unittest.TestCase):
+    def setUp(self):
+        entorno_temporal(self)
+        self.video_dir = Config.VIDEO_CONFIG['VIDEO_DIR']
+        with open(os.path.join(self.video_dir, 'a.mp4'), "wb") as f:
+            f.write(bytes(100))
+        self.vigilante = VigilanteContenido(self.video_dir, backend='inotify', debounce=0.1)
+        self.vigilante.iniciar()
+        self.addCleanup(self.vigilante.detener)
+
+    def test_toque_de_onedrive_no_dispara_y_archivo_nuevo_si(self):
+        os.utime(os.path.join(self.video_dir, 'a.mp4'), (time.time() + 60,) * 2)
+        self.assertFalse(self.vigilante.esperar_cambio(0.5))
+        for _ in range(3):
+            with open(os.path.join(self.video_dir, 'b.mp4'), "ab") as f:
+                f.write(bytes(1000))
+        self.assertTrue(self.vigilante.esperar_cambio(3))
+        self.assertEqual(self.vigilante.obtener_cambios(), {'b.mp4'})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,29 +1,150 @@
 import subprocess
-import psutil
 import os
 import time
+import json
+import base64
+import pathlib
+import urllib.parse
+import urllib.request
+import threading
+from collections import Counter
 from logging_utils import log
 from config import Config
+from mp4_utils import es_mp4_completo
+from metrics_utils import incrementar, observar, fijar
+from journal_utils import registrar_reproduccion, reproduccion, finalizar_reproduccion
 
-flag_file = Config.PATHS['FLAG_FILE']
+# psutil se importa al primer uso (_psutil), no al importar el módulo: el arranque llega antes
+# a la primera pantalla y validar_playlist (benchmark, staging) no lo carga
+_modulo_psutil = None
+
+# Reproductor de la pantalla única (modo clásico); se crea al primer uso con la configuración vigente
+_reproductor_por_defecto = None
 
 # ============================================================================
 # FUNCIONES HELPER PRIVADAS
 # ============================================================================
 
+def _psutil():
+    global _modulo_psutil
+    if _modulo_psutil is None:
+        import psutil
+        _modulo_psutil = psutil
+    return _modulo_psutil
+
+def _errores_psutil(*nombres):
+    """
+    Excepciones de psutil para una cláusula except. Sin psutil instalado no hay ninguna: un Popen
+    propio nunca las lanza y el except no debe fallar al importarlo.
+    """
+    try:
+        modulo = _psutil()
+    except ImportError:
+        return ()
+    return tuple(getattr(modulo, nombre) for nombre in nombres)
+
 def _obtener_procesos_vlc():
-    """Obtiene lista de PIDs de procesos VLC activos"""
+    """
+    Obtiene lista de PIDs de procesos VLC activos recorriendo todos los procesos del sistema.
+    Es costoso y solo se usa una vez al arranque (adoptar_vlc_huerfano).
+    """
     procesos = []
-    for proc in psutil.process_iter(['pid', 'name']):
+    for proc in _psutil().process_iter(['pid', 'name']):
         if proc.info['name'] and 'vlc' in proc.info['name'].lower():
             procesos.append(proc.info['pid'])
     return procesos
 
+def _proceso_activo(proceso):
+    """True si el proceso (Popen o psutil.Process) sigue en ejecución"""
+    if proceso is None:
+        return False
+    if isinstance(proceso, subprocess.Popen):
+        return proceso.poll() is None
+    try:
+        return proceso.is_running() and proceso.status() != _psutil().STATUS_ZOMBIE
+    except _psutil().NoSuchProcess:
+        return False
+
+def _esperar_proceso(proceso, timeout=None):
+    """
+    Bloquea hasta que el proceso termine o venza el timeout, sin sondeo activo:
+    Popen.wait usa waitpid en Linux y WaitForSingleObject en Windows.
+    Returns:
+        bool: True si el proceso terminó
+    """
+    try:
+        proceso.wait(timeout)
+        return True
+    except (subprocess.TimeoutExpired, *_errores_psutil('TimeoutExpired')):
+        return False
+    except _errores_psutil('NoSuchProcess'):
+        return True
+
+def _codigo_salida(proceso):
+    return proceso.returncode if isinstance(proceso, subprocess.Popen) else None
+
+def _terminar_proceso(proceso, timeout=None):
+    """Termina un proceso, forzando el cierre si no termina en VLC_KILL_TIMEOUT. Retorna True si cerró"""
+    if timeout is None:
+        timeout = Config.VLC_CONFIG['VLC_KILL_TIMEOUT']
+    try:
+        proceso.terminate()
+        if _esperar_proceso(proceso, timeout):
+            return True
+        proceso.kill()
+        return _esperar_proceso(proceso, timeout)
+    except (ProcessLookupError, *_errores_psutil('NoSuchProcess')):
+        return True
+
+def _linea_de_comandos(pid):
+    try:
+        return _psutil().Process(pid).cmdline()
+    except Exception:
+        return None
+
 # todo: acoplar a extensiones definidas en el config
 def _verificar_archivo_existe_y_es_mp4(ruta_archivo):
-    """Verifica que un archivo exista y sea mp4"""
-    return (os.path.exists(ruta_archivo) and 
-            ruta_archivo.lower().endswith('.mp4'))
+    """Verifica que un archivo exista, sea mp4 y tenga estructura completa"""
+    return (os.path.exists(ruta_archivo) and
+            ruta_archivo.lower().endswith('.mp4') and
+            es_mp4_completo(ruta_archivo))
+
+def _ruta_a_uri(ruta):
+    return pathlib.Path(os.path.abspath(ruta)).as_uri()
+
+def _normalizar_uri(uri):
+    """VLC y pathlib no codifican igual los caracteres especiales; se comparan decodificados"""
+    uri = urllib.parse.unquote(uri)
+    return uri.lower() if os.name == 'nt' else uri
+
+def _clave_contenido(uri):
+    """
+    Identidad del archivo al que apunta un URI: el mismo clip enlazado (hardlink) desde otra generación
+    comparte inode con el del almacén, así un elemento de VLC de una generación anterior no se vuelve
+    a encolar en cada publicación. Sin inode (copia directa) se compara nombre, tamaño y mtime.
+    Un archivo que ya no existe se compara por su URI.
+    """
+    partes = urllib.parse.urlsplit(uri)
+    if partes.scheme == 'file':
+        ruta = urllib.request.url2pathname((f"//{partes.netloc}" if partes.netloc else '') + partes.path)
+        try:
+            st = os.stat(ruta)
+            if st.st_ino:
+                return ('inode', st.st_dev, st.st_ino)
+            return ('archivo', os.path.basename(ruta).lower(), st.st_size, st.st_mtime_ns)
+        except OSError:
+            pass
+    return ('uri', _normalizar_uri(uri))
+
+def _leer_playlist(playlist_path):
+    with open(playlist_path, "r", encoding=Config.LOG_CONFIG['LOG_ENCODING']) as pl:
+        return [linea.strip() for linea in pl if linea.strip()]
+
+def _reproductor():
+    global _reproductor_por_defecto
+    if _reproductor_por_defecto is None:
+        _reproductor_por_defecto = ReproductorVLC()
+    return _reproductor_por_defecto
 
 # ============================================================================
 # FUNCIONES PRINCIPALES
@@ -35,158 +156,573 @@ def validar_playlist(playlist_path):
         if not os.path.exists(playlist_path) or os.path.getsize(playlist_path) == 0:
             log("ERROR: Playlist no existe o está vacía")
             return False
-            
+
         with open(playlist_path, "r", encoding=Config.LOG_CONFIG['LOG_ENCODING']) as pl:
-            archivos_validos = sum(1 for linea in pl 
+            archivos_validos = sum(1 for linea in pl
                                  if _verificar_archivo_existe_y_es_mp4(linea.strip()))
-                        
+
         if archivos_validos >= 1:
             return True
         else:
             log("ERROR: Playlist no contiene archivos mp4 válidos")
             return False
-            
+
     except Exception as e:
         log(f"ERROR validando playlist: {e}")
         return False
 
-def validar_ejecucion_vlc(proceso_vlc):
-    """Valida que VLC se haya ejecutado correctamente"""
-    try:
-        # Esperar a que VLC inicie completamente
-        time.sleep(2)
-        
-        # Verificar si el proceso sigue corriendo
-        if proceso_vlc.poll() is not None:
-            log(f"ERROR: VLC terminó prematuramente (código: {proceso_vlc.poll()})")
-            return False
-            
-        # Verificar con psutil que VLC esté realmente ejecutándose
+def adoptar_vlc_huerfano(reproductores=None):
+    """
+    Única exploración completa de procesos, al arranque del daemon.
+    Cada reproductor adopta el VLC que lanzó una instancia anterior del daemon para su pantalla
+    (reconocido por --http-port en la línea de comandos; si no se puede leer, por el PID que
+    registró el diario de estado o por ser el único VLC) si responde en su interfaz HTTP;
+    cualquier otro VLC se termina.
+    Returns:
+        bool: True si se adoptó al menos un VLC en reproducción
+    """
+    reproductores = reproductores or [_reproductor()]
+    pids = _obtener_procesos_vlc()
+    adoptados = {}
+    for reproductor in reproductores:
+        if not reproductor.control_http_disponible():
+            continue
+        marca = f"--http-port={reproductor.http_port}"
+        anterior = reproduccion(reproductor.nombre)
+        pid_anterior = anterior['pid'] if anterior and anterior['http_port'] == reproductor.http_port else None
+        for pid in pids:
+            if pid in adoptados.values():
+                continue
+            cmdline = _linea_de_comandos(pid)
+            if cmdline is not None:
+                propio = marca in cmdline
+            else:
+                propio = pid == pid_anterior or len(pids) == 1
+            if propio:
+                adoptados[reproductor.nombre] = pid
+                break
+
+    for pid in pids:
+        if pid in adoptados.values():
+            continue
         try:
-            proceso_psutil = psutil.Process(proceso_vlc.pid)
-            if not (proceso_psutil.is_running() and 'vlc' in proceso_psutil.name().lower()):
-                log(f"ERROR: Proceso VLC no válido (PID: {proceso_vlc.pid})")
-                return False
-        except psutil.NoSuchProcess:
-            log("ERROR: Proceso VLC no encontrado")
-            return False
-            
-        return True
-            
-    except Exception as e:
-        log(f"ERROR validando ejecución de VLC: {e}")
-        return False
+            log(f"Terminando proceso VLC huérfano (PID: {pid})")
+            if not _terminar_proceso(_psutil().Process(pid)):
+                log(f"WARNING: VLC huérfano (PID: {pid}) puede no haberse cerrado completamente")
+        except _psutil().NoSuchProcess:
+            pass
+
+    for reproductor in reproductores:
+        pid = adoptados.get(reproductor.nombre)
+        if pid is None:
+            reproductor._eliminar_flag()
+            continue
+        try:
+            reproductor.adoptar(_psutil().Process(pid))
+        except _psutil().NoSuchProcess:
+            reproductor._eliminar_flag()
+            adoptados.pop(reproductor.nombre)
+    return bool(adoptados)
+
+# Interfaz de la pantalla única: delegan en el reproductor por defecto
 
 def iniciar_vlc():
-    """Inicia VLC con validaciones y crea FLAG solo si todo es exitoso"""
-    vlc_exe = Config.VLC_CONFIG['VLC_EXE']
-    vlc_args = Config.VLC_CONFIG['VLC_ARGS']
-    playlist_path = Config.PATHS['PLAYLIST_PATH']
-    
-    try:
-        # 1. Validar playlist antes de iniciar VLC
-        if not validar_playlist(playlist_path):
-            log("ERROR: No se puede iniciar VLC - playlist inválida")
-            return False
-            
-        # 2. Ejecutar VLC
-        args = [vlc_exe, playlist_path] + vlc_args
-        proceso_vlc = subprocess.Popen(args)
-        
-        # 3. Validar ejecución correcta
-        if not validar_ejecucion_vlc(proceso_vlc):
-            log("ERROR: VLC no se ejecutó correctamente")
-            # Limpiar: terminar proceso fallido
+    return _reproductor().iniciar()
+
+def detener_vlc():
+    return _reproductor().detener()
+
+def vlc_esta_activo():
+    return _reproductor().activo()
+
+def control_http_disponible():
+    return _reproductor().control_http_disponible()
+
+def actualizar_playlist_en_caliente(playlist_path):
+    return _reproductor().actualizar_playlist_en_caliente(playlist_path)
+
+def validar_ejecucion_vlc(proceso_vlc):
+    return _reproductor().validar_ejecucion(proceso_vlc)
+
+def _obtener_items_vlc():
+    return _reproductor().obtener_items()
+
+# ============================================================================
+# REPRODUCTOR VLC DE UNA PANTALLA
+# ============================================================================
+
+class ReproductorVLC:
+    """
+    Un VLC gestionado por el daemon: su playlist, su FLAG y su puerto de la interfaz HTTP.
+    En modo multipantalla hay uno por perfil; cada uno serializa su propio inicio y detención.
+    """
+
+    def __init__(self, nombre='principal', playlist_path=None, flag_file=None, http_port=None, args_extra=None):
+        self.nombre = nombre
+        self.playlist_path = playlist_path or Config.PATHS['PLAYLIST_PATH']
+        self.flag_file = flag_file or Config.PATHS['FLAG_FILE']
+        self.http_port = http_port or Config.VLC_CONFIG['VLC_HTTP_PORT']
+        self.args_extra = list(args_extra or [])
+        # Proceso VLC gestionado: subprocess.Popen si lo lanzamos nosotros,
+        # psutil.Process si se adoptó al arranque. None si no hay VLC gestionado.
+        self.proceso = None
+        # Serializa inicio/detención entre el bucle principal y el supervisor
+        self.lock = threading.RLock()
+        # Notifica al supervisor cuando cambia el proceso gestionado
+        self.cambio_proceso = threading.Condition(self.lock)
+
+    @classmethod
+    def desde_perfil(cls, perfil):
+        return cls(perfil['NOMBRE'], perfil['PLAYLIST_PATH'], perfil['FLAG_FILE'],
+                   perfil['VLC_HTTP_PORT'], perfil['VLC_ARGS'])
+
+    # ------------------------------------------------------------------------
+    # ESTADO DEL PROCESO
+    # ------------------------------------------------------------------------
+
+    def _registrar_proceso(self, proceso):
+        """Cambia el proceso gestionado, lo registra en el diario de estado y despierta al supervisor"""
+        with self.cambio_proceso:
+            self.proceso = proceso
+            if proceso is None:
+                finalizar_reproduccion(self.nombre)
+            else:
+                registrar_reproduccion(self.nombre, proceso.pid, self.http_port, self.playlist_path)
+            self.cambio_proceso.notify_all()
+
+    def _eliminar_flag(self):
+        """Elimina el FLAG file si existe"""
+        try:
+            if os.path.exists(self.flag_file):
+                os.remove(self.flag_file)
+        except Exception as e:
+            log(f"ERROR eliminando FLAG: {e}")
+
+    def activo(self):
+        """Verifica si el VLC gestionado por el daemon sigue en ejecución"""
+        return _proceso_activo(self.proceso)
+
+    def adoptar(self, proceso):
+        with self.lock:
             try:
-                proceso_vlc.terminate()
-            except:
-                pass
+                open(self.flag_file, "w").close()
+            except Exception as e:
+                log(f"ERROR creando FLAG: {e}")
+            self._registrar_proceso(proceso)
+        log(f"VLC huérfano adoptado (PID: {proceso.pid}, pantalla {self.nombre}), la reproducción continúa")
+
+    # ------------------------------------------------------------------------
+    # INTERFAZ HTTP
+    # ------------------------------------------------------------------------
+
+    def _argumentos_http(self):
+        """Argumentos para habilitar la interfaz HTTP de control de VLC"""
+        if not Config.VLC_CONFIG['VLC_HTTP_ENABLED']:
+            return []
+        return [
+            '--extraintf=http',
+            f"--http-host={Config.VLC_CONFIG['VLC_HTTP_HOST']}",
+            f"--http-port={self.http_port}",
+            f"--http-password={Config.VLC_CONFIG['VLC_HTTP_PASSWORD']}"
+        ]
+
+    def solicitud_http(self, recurso, **params):
+        """
+        Envía una solicitud a la interfaz HTTP de VLC y retorna el JSON de respuesta.
+        Lanza excepción si VLC no responde.
+        """
+        url = f"http://{Config.VLC_CONFIG['VLC_HTTP_HOST']}:{self.http_port}/requests/{recurso}"
+        if params:
+            url += "?" + urllib.parse.urlencode(params, quote_via=urllib.parse.quote)
+        # VLC usa autenticación básica con usuario vacío
+        credenciales = base64.b64encode(f":{Config.VLC_CONFIG['VLC_HTTP_PASSWORD']}".encode()).decode()
+        solicitud = urllib.request.Request(url, headers={'Authorization': f"Basic {credenciales}"})
+        with urllib.request.urlopen(solicitud, timeout=Config.VLC_CONFIG['VLC_HTTP_TIMEOUT']) as respuesta:
+            return json.loads(respuesta.read().decode('utf-8'))
+
+    def obtener_items(self):
+        """Retorna los elementos de la playlist de VLC como lista de dicts con 'id' y 'uri'"""
+        arbol = self.solicitud_http('playlist.json')
+        # El primer nodo hijo es la playlist (el segundo es la biblioteca); su nombre depende del idioma de VLC
+        nodo_playlist = arbol.get('children', [{}])[0]
+        return [{'id': item['id'], 'uri': item.get('uri', '')}
+                for item in nodo_playlist.get('children', []) if item.get('type') == 'leaf']
+
+    def control_http_disponible(self):
+        """Verifica si la interfaz HTTP de control de VLC responde"""
+        if not Config.VLC_CONFIG['VLC_HTTP_ENABLED']:
+            return False
+        try:
+            self.solicitud_http('status.json')
+            return True
+        except Exception:
             return False
-        log("VLC iniciado exitosamente.")
 
-            
-        # 4. Crear FLAG solo si todo fue exitoso
+    def actualizar_playlist_en_caliente(self, playlist_path=None):
+        """
+        Sincroniza la playlist de VLC en ejecución con playlist_path sin detener la reproducción.
+        Encola los elementos nuevos y elimina los que ya no están. El elemento en reproducción
+        nunca se elimina aunque haya desaparecido: se quita en la siguiente actualización.
+        Returns:
+            bool: True si VLC quedó actualizado, False si no se pudo (usar reinicio como respaldo)
+        """
         try:
-            open(flag_file, "w").close()
-            log(f"Flag creada. {flag_file}")
+            deseados = [_ruta_a_uri(ruta) for ruta in _leer_playlist(playlist_path or self.playlist_path)]
+            claves_deseadas = [_clave_contenido(uri) for uri in deseados]
+
+            estado = self.solicitud_http('status.json')
+            actual = str(estado.get('currentplid', ''))
+            items = self.obtener_items()
+            # Por contenido, no por URI: cada publicación cambia de directorio de generación.
+            # Se cuentan las repeticiones: dos nombres con el mismo contenido son dos elementos
+            disponibles = Counter(_clave_contenido(item['uri']) for item in items)
+
+            # 1. Encolar nuevos en el orden de la playlist
+            nuevos = []
+            for uri, clave in zip(deseados, claves_deseadas):
+                if disponibles[clave] > 0:
+                    disponibles[clave] -= 1
+                else:
+                    nuevos.append(uri)
+            for uri in nuevos:
+                self.solicitud_http('status.json', command='in_enqueue', input=uri)
+
+            # 2. Quitar los que ya no están, excepto el que se está reproduciendo
+            retirados = 0
+            conservar = Counter(claves_deseadas)
+            for item in items:
+                clave = _clave_contenido(item['uri'])
+                if conservar[clave] > 0:
+                    conservar[clave] -= 1
+                    continue
+                if str(item['id']) == actual and estado.get('state') == 'playing':
+                    continue
+                self.solicitud_http('status.json', command='pl_delete', id=item['id'])
+                retirados += 1
+
+            # 3. Si VLC estaba detenido (playlist vacía) retomar la reproducción
+            if estado.get('state') != 'playing' and deseados:
+                self.solicitud_http('status.json', command='pl_play')
+
+            log(f"Playlist de VLC actualizada en caliente: {len(nuevos)} agregados, {retirados} retirados")
             return True
+
         except Exception as e:
-            log(f"ERROR creando FLAG: {e}")
-            # Limpiar: terminar VLC si no se puede crear FLAG
-            try:
-                proceso_vlc.terminate()
-            except:
-                pass
+            log(f"WARNING: No se pudo actualizar la playlist de VLC en caliente: {e}")
             return False
-            
-    except Exception as e:
-        log(f"ERROR al iniciar VLC: {e}")
-        return False
 
-def detener_vlc():
-    """Detiene VLC, confirma cierre y elimina FLAG"""
-    try:
-        # 1. Obtener procesos VLC activos
-        procesos_vlc = _obtener_procesos_vlc()
-        
-        if not procesos_vlc:
-            # No hay VLC corriendo, solo eliminar FLAG si existe
-            _eliminar_flag()
-            return True
-            
-        # 2. Terminar VLC usando taskkill
-        log(f"Terminando {len(procesos_vlc)} proceso(s) VLC")
-        subprocess.call(["taskkill", "/IM", "vlc.exe", "/F"], stdout=subprocess.DEVNULL)
-        
-        # 3. Confirmar cierre con timeout configurado
-        vlc_cerrado = _esperar_cierre_vlc(procesos_vlc)
-        
-        if not vlc_cerrado:
-            log("WARNING: VLC puede no haberse cerrado completamente")
-        
-        # 4. Eliminar FLAG independientemente del resultado
-        _eliminar_flag()
-        
-        log("VLC detenido")
-        return vlc_cerrado
-        
-    except Exception as e:
-        log(f"ERROR al detener VLC: {e}")
-        return False
+    # ------------------------------------------------------------------------
+    # INICIO Y DETENCIÓN
+    # ------------------------------------------------------------------------
 
-def _esperar_cierre_vlc(procesos_vlc, timeout=None):
-    """Espera a que los procesos VLC se cierren completamente"""
-    # Usar configuración si no se especifica timeout
-    if timeout is None:
-        timeout = Config.VLC_CONFIG['VLC_KILL_TIMEOUT']
-        
-    for intento in range(timeout):
-        time.sleep(1)
-        procesos_restantes = []
-        
-        for pid in procesos_vlc:
+    def validar_ejecucion(self, proceso_vlc):
+        """Valida que VLC se haya ejecutado correctamente"""
+        try:
+            # Esperar a que VLC inicie: si la interfaz HTTP está habilitada termina en cuanto responde,
+            # si no, se espera VLC_START_TIMEOUT completo
+            limite = time.monotonic() + Config.VLC_CONFIG['VLC_START_TIMEOUT']
+            while time.monotonic() < limite:
+                if proceso_vlc.poll() is not None:
+                    break
+                if Config.VLC_CONFIG['VLC_HTTP_ENABLED'] and self.control_http_disponible():
+                    break
+                time.sleep(0.2)
+
+            # Verificar si el proceso sigue corriendo
+            if proceso_vlc.poll() is not None:
+                log(f"ERROR: VLC terminó prematuramente (código: {proceso_vlc.poll()})")
+                return False
+
+            # Verificar con psutil que VLC esté realmente ejecutándose. Sin psutil basta el Popen:
+            # el proceso lo lanzamos nosotros y poll() ya confirmó que sigue en ejecución
+            try:
+                psutil = _psutil()
+            except ImportError:
+                return True
             try:
-                proceso = psutil.Process(pid)
-                if proceso.is_running():
-                    procesos_restantes.append(pid)
+                proceso_psutil = psutil.Process(proceso_vlc.pid)
+                if not (proceso_psutil.is_running() and 'vlc' in proceso_psutil.name().lower()):
+                    log(f"ERROR: Proceso VLC no válido (PID: {proceso_vlc.pid})")
+                    return False
             except psutil.NoSuchProcess:
-                # Proceso cerrado correctamente
-                pass
-        
-        if not procesos_restantes:
+                log("ERROR: Proceso VLC no encontrado")
+                return False
+
             return True
-            
-    return False
 
-def _eliminar_flag():
-    """Elimina el FLAG file si existe"""
-    try:
-        if os.path.exists(flag_file):
-            os.remove(flag_file)
-    except Exception as e:
-        log(f"ERROR eliminando FLAG: {e}")
+        except Exception as e:
+            log(f"ERROR validando ejecución de VLC: {e}")
+            return False
 
-def vlc_esta_activo():
-    """Verifica si hay procesos VLC ejecutándose"""
-    return len(_obtener_procesos_vlc()) > 0
+    def iniciar(self):
+        """Inicia VLC con validaciones y crea FLAG solo si todo es exitoso"""
+        with self.lock:
+            vlc_exe = Config.VLC_CONFIG['VLC_EXE']
+            vlc_args = Config.VLC_CONFIG['VLC_ARGS'] + self.args_extra
+
+            try:
+                # 1. Validar playlist antes de iniciar VLC
+                if not validar_playlist(self.playlist_path):
+                    log("ERROR: No se puede iniciar VLC - playlist inválida")
+                    return False
+
+                # 2. Ejecutar VLC
+                args = [vlc_exe, self.playlist_path] + vlc_args + self._argumentos_http()
+                lanzado = time.perf_counter()
+                proceso_vlc = subprocess.Popen(args)
+                log(f"VLC lanzado (PID: {proceso_vlc.pid})")
+
+                # 3. Validar ejecución correcta
+                if not self.validar_ejecucion(proceso_vlc):
+                    incrementar('vlc_inicios_total', resultado='error', pantalla=self.nombre)
+                    log("ERROR: VLC no se ejecutó correctamente")
+                    # Limpiar: terminar proceso fallido
+                    try:
+                        proceso_vlc.terminate()
+                    except:
+                        pass
+                    return False
+                observar('vlc_inicio_segundos', time.perf_counter() - lanzado, pantalla=self.nombre)
+                incrementar('vlc_inicios_total', resultado='ok', pantalla=self.nombre)
+                log("VLC iniciado exitosamente.")
+
+
+                # 4. Crear FLAG solo si todo fue exitoso y registrar el proceso para el supervisor
+                try:
+                    open(self.flag_file, "w").close()
+                    log(f"Flag creada. {self.flag_file}")
+                    self._registrar_proceso(proceso_vlc)
+                    return True
+                except Exception as e:
+                    log(f"ERROR creando FLAG: {e}")
+                    # Limpiar: terminar VLC si no se puede crear FLAG
+                    try:
+                        proceso_vlc.terminate()
+                    except:
+                        pass
+                    return False
+
+            except Exception as e:
+                log(f"ERROR al iniciar VLC: {e}")
+                return False
+
+    def detener(self):
+        """Detiene el VLC gestionado, confirma cierre y elimina FLAG"""
+        with self.lock:
+            try:
+                # 1. Obtener el proceso gestionado (sin recorrer todos los procesos del sistema)
+                proceso = self.proceso
 
+                # 2. Dejar de gestionarlo ANTES de terminarlo: así el supervisor sabe que
+                #    la salida es intencional y no lo relanza
+                self._registrar_proceso(None)
+
+                if not _proceso_activo(proceso):
+                    # No hay VLC corriendo, solo eliminar FLAG si existe
+                    self._eliminar_flag()
+                    return True
+
+                # 3. Terminar VLC y confirmar cierre con timeout configurado
+                log(f"Terminando proceso VLC (PID: {proceso.pid})")
+                vlc_cerrado = _terminar_proceso(proceso)
+
+                if not vlc_cerrado:
+                    log("WARNING: VLC puede no haberse cerrado completamente")
+
+                # 4. Eliminar FLAG independientemente del resultado
+                self._eliminar_flag()
+
+                log("VLC detenido")
+                return vlc_cerrado
+
+            except Exception as e:
+                log(f"ERROR al detener VLC: {e}")
+                return False
+
+# ============================================================================
+# SUPERVISOR DE VLC
+# ============================================================================
+
+class SupervisorVLC:
+    """
+    Vigila el VLC gestionado esperando directamente su salida (sin recorrer procesos)
+    y lo relanza en cuanto termina inesperadamente.
+
+    Los reinicios usan backoff exponencial: el primero es inmediato y los siguientes
+    esperan VLC_RESTART_BACKOFF_MIN, el doble, ... hasta VLC_RESTART_BACKOFF_MAX.
+    Si VLC se mantiene en ejecución VLC_RESTART_STABLE segundos, el backoff se reinicia.
+    """
+
+    def __init__(self, reproductor=None):
+        self.reproductor = reproductor or _reproductor()
+        self._detener = threading.Event()
+        self._hilo = None
+        self._backoff = 0
+        self.reinicios = 0
+
+    def iniciar(self):
+        self._hilo = threading.Thread(target=self._vigilar, name=f"supervisor-vlc-{self.reproductor.nombre}",
+                                      daemon=True)
+        self._hilo.start()
+        log(f"Supervisor de VLC iniciado (pantalla {self.reproductor.nombre})")
+
+    def detener(self):
+        self._detener.set()
+        with self.reproductor.cambio_proceso:
+            self.reproductor.cambio_proceso.notify_all()
+
+    def _vigilar(self):
+        reproductor = self.reproductor
+        while not self._detener.is_set():
+            # 1. Esperar a que haya un VLC gestionado
+            with reproductor.cambio_proceso:
+                while reproductor.proceso is None and not self._detener.is_set():
+                    reproductor.cambio_proceso.wait()
+                proceso = reproductor.proceso
+            if self._detener.is_set():
+                break
+
+            # 2. Bloquear hasta que termine (waitpid / WaitForSingleObject)
+            inicio = time.monotonic()
+            _esperar_proceso(proceso)
+            if self._detener.is_set():
+                break
+
+            # 3. Si el proceso ya no es el gestionado, la salida fue intencional (detener_vlc)
+            with reproductor.lock:
+                if proceso is not reproductor.proceso:
+                    continue
+                reproductor._registrar_proceso(None)
+
+            duracion = time.monotonic() - inicio
+            log(f"WARNING: VLC terminó inesperadamente (PID: {proceso.pid}, código: {_codigo_salida(proceso)}, "
+                f"tras {duracion:.0f} s) - posible crash o fue cerrado accidentalmente")
+            if duracion >= Config.VLC_CONFIG['VLC_RESTART_STABLE']:
+                self._backoff = 0
+            self._relanzar()
+
+    def _relanzar(self):
+        """Relanza VLC con backoff hasta lograrlo o hasta que alguien más lo inicie"""
+        while not self._detener.is_set():
+            if self._backoff:
+                log(f"Reiniciando VLC en {self._backoff} segundos...")
+                if self._detener.wait(self._backoff):
+                    return
+            self._backoff = min(max(self._backoff * 2, Config.VLC_CONFIG['VLC_RESTART_BACKOFF_MIN']),
+                                Config.VLC_CONFIG['VLC_RESTART_BACKOFF_MAX'])
+
+            with self.reproductor.lock:
+                if self.reproductor.activo():
+                    return
+                if self.reproductor.iniciar():
+                    self.reinicios += 1
+                    log(f"INFO: VLC reiniciado por el supervisor (reinicio #{self.reinicios})")
+                    return
+            log("ERROR: No se pudo reiniciar VLC, se reintentará")
+
+# ============================================================================
+# SONDA DE REPRODUCCIÓN
+# ============================================================================
+
+# Comando de status.json con el que se intenta recuperar la reproducción dentro de VLC
+_RECUPERACION = {
+    'playing': ('saltar', 'pl_next'),            # Posición detenida: el elemento no avanza
+    'paused': ('reanudar', 'pl_forceresume'),
+    'stopped': ('reanudar', 'pl_play'),
+}
+
+class SondaReproduccion:
+    """
+    Salud de la reproducción, no solo del proceso: una consulta a status.json por
+    VLC_HEALTH_INTERVAL sigue el elemento, el estado y la posición de VLC.
+
+    Si la posición no avanza durante VLC_STALL_TIMEOUT (imagen congelada, diálogo de error,
+    VLC detenido o en pausa) se intenta recuperar dentro de VLC: saltar el elemento o reanudar.
+    Si tras otro VLC_STALL_TIMEOUT sigue sin avanzar, si la cola está vacía o si la interfaz
+    no responde, se termina el proceso y el SupervisorVLC lo relanza con su backoff.
+    Sin interfaz HTTP no hay sonda: queda solo la vigilancia del proceso.
+    """
+
+    def __init__(self, reproductor=None):
+        self.reproductor = reproductor or _reproductor()
+        # Proceso al que corresponde el seguimiento; uno nuevo reinicia el plazo
+        self._proceso = None
+        # (currentplid, position, time) de referencia y desde cuándo (monotonic) no cambia
+        self._muestra = None
+        self._desde = time.monotonic()
+        # Recuperación ya intentada sobre esta detención ('saltar' / 'reanudar'), o None
+        self._accion = None
+        self.reinicios = 0
+
+    def _seguir(self, proceso, muestra=None, accion=None):
+        self._proceso = proceso
+        self._muestra = muestra
+        self._desde = time.monotonic()
+        self._accion = accion
+
+    def _reiniciar(self, proceso, motivo):
+        """Termina el VLC que no se recupera; el supervisor lo detecta como salida inesperada y lo relanza"""
+        reproductor = self.reproductor
+        with reproductor.lock:
+            if reproductor.proceso is not proceso:
+                # Otro hilo (staging, supervisor) ya lo cambió
+                return 'sin_vlc'
+            log(f"ERROR: VLC de la pantalla {reproductor.nombre} {motivo}; se reinicia el reproductor "
+                f"(PID: {proceso.pid})")
+            _terminar_proceso(proceso)
+        self.reinicios += 1
+        incrementar('vlc_salud_acciones_total', accion='reiniciar', pantalla=reproductor.nombre)
+        self._seguir(None)
+        return 'reiniciar'
+
+    def revisar(self):
+        """
+        Toma una muestra y, si la reproducción lleva VLC_STALL_TIMEOUT sin avanzar, escala.
+        Returns:
+            str: 'sin_vlc', 'reproduciendo', 'sin_avance', 'sin_respuesta', 'saltar', 'reanudar' o 'reiniciar'
+        """
+        reproductor = self.reproductor
+        proceso = reproductor.proceso
+        if proceso is None or not Config.VLC_CONFIG['VLC_HTTP_ENABLED']:
+            self._seguir(None)
+            return 'sin_vlc'
+        if proceso is not self._proceso:
+            # VLC recién lanzado, adoptado o relanzado: tiene VLC_STALL_TIMEOUT para empezar a reproducir
+            self._seguir(proceso)
+
+        try:
+            estado = reproductor.solicitud_http('status.json')
+        except Exception:
+            estado = None
+        muestra = None if estado is None else (estado.get('currentplid'), estado.get('position'), estado.get('time'))
+
+        if estado is not None and estado.get('state') == 'playing' and muestra != self._muestra:
+            if self._accion:
+                log(f"INFO: Reproducción recuperada en la pantalla {reproductor.nombre} ({self._accion})")
+            self._seguir(proceso, muestra)
+            fijar('vlc_sin_avance_segundos', 0, pantalla=reproductor.nombre)
+            return 'reproduciendo'
+
+        detenido = time.monotonic() - self._desde
+        fijar('vlc_sin_avance_segundos', round(detenido, 1), pantalla=reproductor.nombre)
+        if detenido < Config.VLC_CONFIG['VLC_STALL_TIMEOUT']:
+            return 'sin_respuesta' if estado is None else 'sin_avance'
+
+        # 1. Sin respuesta o ya se intentó recuperar dentro de VLC: reiniciar
+        if estado is None:
+            return self._reiniciar(proceso, f"no responde hace {detenido:.0f} s")
+        if self._accion is not None:
+            return self._reiniciar(proceso, f"sigue sin avanzar tras {self._accion} ({detenido:.0f} s)")
+        accion, comando = _RECUPERACION.get(estado.get('state'), _RECUPERACION['stopped'])
+        try:
+            if not self.reproductor.obtener_items():
+                return self._reiniciar(proceso, "tiene la cola vacía")
+            # 2. Recuperar dentro de VLC; la nueva referencia es la muestra justo después del comando
+            log(f"WARNING: Reproducción sin avanzar {detenido:.0f} s en la pantalla {reproductor.nombre} "
+                f"(estado {estado.get('state')}, elemento {estado.get('currentplid')}): {accion}")
+            nuevo = reproductor.solicitud_http('status.json', command=comando)
+        except Exception:
+            return self._reiniciar(proceso, "no responde a los comandos")
+        incrementar('vlc_salud_acciones_total', accion=accion, pantalla=reproductor.nombre)
+        self._seguir(proceso, (nuevo.get('currentplid'), nuevo.get('position'), nuevo.get('time')), accion)
+        return accion
@@ -0,0 +1,395 @@
+import os
+import sys
+import struct
+import threading
+import time
+from logging_utils import log
+from config import Config
+from file_utils import es_video_admitido
+
+# ============================================================================
+# CONSTANTES DE LOS BACKENDS NATIVOS
+# ============================================================================
+
+# inotify (Linux). Solo eventos de nombre y de contenido escrito:
+# IN_ATTRIB se excluye a propósito porque estimular_onedrive() cambia los timestamps
+# de los archivos y eso provocaría un ciclo de refresco en cada estimulación.
+_IN_MODIFY = 0x00000002
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_FROM = 0x00000040
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_DELETE = 0x00000200
+_IN_DELETE_SELF = 0x00000400
+_IN_MOVE_SELF = 0x00000800
+_IN_Q_OVERFLOW = 0x00004000
+_IN_IGNORED = 0x00008000
+_IN_ISDIR = 0x40000000
+_IN_MASCARA = (_IN_MODIFY | _IN_CLOSE_WRITE | _IN_MOVED_FROM | _IN_MOVED_TO |
+               _IN_CREATE | _IN_DELETE | _IN_DELETE_SELF | _IN_MOVE_SELF)
+_IN_EVENTO = struct.Struct('iIII')
+
+# ReadDirectoryChangesW (Windows). Igual que en Linux no se usa LAST_WRITE
+# para no reaccionar a los 'toques' de estimular_onedrive().
+_FILE_LIST_DIRECTORY = 0x0001
+_FILE_SHARE_TODOS = 0x00000001 | 0x00000002 | 0x00000004
+_OPEN_EXISTING = 3
+_FILE_FLAG_BACKUP_SEMANTICS = 0x02000000
+_FILE_NOTIFY_CHANGE_FILE_NAME = 0x00000001
+_FILE_NOTIFY_CHANGE_DIR_NAME = 0x00000002
+_FILE_NOTIFY_CHANGE_SIZE = 0x00000008
+_WIN_FILTRO = _FILE_NOTIFY_CHANGE_FILE_NAME | _FILE_NOTIFY_CHANGE_DIR_NAME | _FILE_NOTIFY_CHANGE_SIZE
+_FILE_NOTIFY_INFORMATION = struct.Struct('<III')
+
+BACKENDS = ('auto', 'inotify', 'windows', 'watchdog', 'sondeo')
+
+class VigilanteContenido:
+    """
+    Vigila VIDEO_DIR y agrupa los eventos en una sola señal de "contenido cambiado".
+
+    Backends disponibles:
+        - 'inotify': Linux, vía ctypes (sin dependencias)
+        - 'windows': ReadDirectoryChangesW vía ctypes (sin dependencias)
+        - 'watchdog': librería watchdog si está instalada
+        - 'sondeo': compara calcular_hash() cada WATCHER_POLL_INTERVAL segundos (respaldo)
+
+    Los eventos se "rebotan" (debounce): la señal solo se entrega cuando han pasado
+    WATCHER_DEBOUNCE segundos sin eventos nuevos, para que una descarga de OneDrive
+    que genera decenas de eventos produzca un único ciclo de refresco.
+
+    Con RECURSIVE_SCAN también se vigilan las subcarpetas y los nombres se reportan
+    relativos a VIDEO_DIR con '/' ('promo/clip.mp4'), igual que validar_dir().
+    Los cambios de carpetas completas se reportan como "cambio sin detalle".
+    """
+
+    def __init__(self, video_dir, backend=None, debounce=None, intervalo_sondeo=None):
+        self.video_dir = video_dir
+        self.backend_solicitado = backend or Config.SYNC_CONFIG['WATCHER_BACKEND']
+        self.debounce = Config.SYNC_CONFIG['WATCHER_DEBOUNCE'] if debounce is None else debounce
+        self.intervalo_sondeo = (Config.SYNC_CONFIG['WATCHER_POLL_INTERVAL']
+                                 if intervalo_sondeo is None else intervalo_sondeo)
+        self.recursivo = Config.VIDEO_CONFIG['RECURSIVE_SCAN']
+        self.backend = None
+
+        self._lock = threading.Lock()
+        self._evento = threading.Event()
+        self._detener = threading.Event()
+        self._ultimo_evento = 0.0
+        # None = hubo cambios pero no se sabe cuáles (sondeo, desbordamiento de cola)
+        self._cambiados = set()
+        self._hilo = None
+        self._observer = None
+        self._handle_win = None
+        # watchdog: tamaño conocido de cada archivo, para descartar 'modified' sin cambio de tamaño
+        self._tamanos = {}
+
+    # ------------------------------------------------------------------------
+    # CICLO DE VIDA
+    # ------------------------------------------------------------------------
+
+    def iniciar(self):
+        """Arranca el backend solicitado o el mejor disponible, con sondeo como respaldo"""
+        for backend in self._candidatos():
+            try:
+                getattr(self, f"_preparar_{backend}")()
+                self.backend = backend
+                break
+            except Exception as e:
+                log(f"WARNING: Backend de vigilancia '{backend}' no disponible: {e}")
+
+        if self.backend != 'watchdog':
+            self._hilo = threading.Thread(target=getattr(self, f"_ejecutar_{self.backend}"),
+                                          name=f"vigilante-{self.backend}", daemon=True)
+            self._hilo.start()
+        log(f"Vigilancia de contenido iniciada en {self.video_dir} (backend: {self.backend})")
+
+    def detener(self):
+        """Detiene el backend y libera sus recursos"""
+        self._detener.set()
+        if self._observer is not None:
+            self._observer.stop()
+        if self._handle_win is not None:
+            # Desbloquea ReadDirectoryChangesW en el hilo vigilante
+            self._kernel32.CancelIoEx(self._handle_win, None)
+        if self._hilo is not None:
+            self._hilo.join(timeout=2)
+
+    def _candidatos(self):
+        if self.backend_solicitado not in BACKENDS:
+            log(f"WARNING: WATCHER_BACKEND desconocido '{self.backend_solicitado}', se usa 'auto'")
+            self.backend_solicitado = 'auto'
+        if self.backend_solicitado != 'auto':
+            return [self.backend_solicitado, 'sondeo']
+        if sys.platform.startswith('linux'):
+            return ['inotify', 'watchdog', 'sondeo']
+        if os.name == 'nt':
+            return ['windows', 'watchdog', 'sondeo']
+        return ['watchdog', 'sondeo']
+
+    # ------------------------------------------------------------------------
+    # API PARA EL BUCLE PRINCIPAL
+    # ------------------------------------------------------------------------
+
+    def esperar_cambio(self, timeout):
+        """
+        Bloquea hasta que haya un cambio ya rebotado o venza el timeout.
+        Returns:
+            bool: True si hubo cambios en el contenido, False si venció el timeout
+        """
+        limite = time.monotonic() + timeout
+        while True:
+            restante = limite - time.monotonic()
+            if restante <= 0 or not self._evento.wait(restante):
+                return False
+
+            # Esperar a que se calme la ráfaga de eventos
+            with self._lock:
+                silencio = time.monotonic() - self._ultimo_evento
+            if silencio >= self.debounce:
+                self._evento.clear()
+                return True
+            time.sleep(min(self.debounce - silencio, max(limite - time.monotonic(), 0)))
+
+    def obtener_cambios(self):
+        """
+        Retorna y reinicia los nombres de archivo cambiados desde la última llamada.
+        Returns:
+            set | None: Nombres cambiados, o None si el backend no puede saberlo
+        """
+        with self._lock:
+            cambiados, self._cambiados = self._cambiados, set()
+        return cambiados
+
+    def _notificar(self, nombre=None):
+        """Registra un evento; nombre=None indica 'algo cambió' sin detalle"""
+        if nombre is not None:
+            nombre = nombre.replace('\\', '/')
+            if not self._es_relevante(nombre):
+                # En modo recursivo un nombre sin extensión suele ser una carpeta movida o borrada
+                # con videos dentro: se pide una revisión completa
+                if not (self.recursivo and not os.path.splitext(nombre)[1]):
+                    return
+                nombre = None
+        with self._lock:
+            self._ultimo_evento = time.monotonic()
+            if nombre is None or self._cambiados is None:
+                self._cambiados = None
+            else:
+                self._cambiados.add(nombre)
+        self._evento.set()
+
+    def _es_relevante(self, nombre):
+        """Ignora el log y cualquier archivo que no sea un formato de video admitido"""
+        return es_video_admitido(nombre)
+
+    # ------------------------------------------------------------------------
+    # BACKEND: INOTIFY (LINUX)
+    # ------------------------------------------------------------------------
+
+    def _preparar_inotify(self):
+        import ctypes
+        import ctypes.util
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        fd = libc.inotify_init1(os.O_CLOEXEC | os.O_NONBLOCK)
+        if fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 falló")
+        self._libc = libc
+        self._fd_inotify = fd
+        # Descriptor de vigilancia -> prefijo relativo de su carpeta ('' para VIDEO_DIR)
+        self._prefijos_inotify = {}
+        try:
+            self._vigilar_carpeta_inotify(self.video_dir, '')
+        except OSError:
+            os.close(fd)
+            raise
+
+    def _vigilar_carpeta_inotify(self, ruta, prefijo):
+        """Agrega un watch a la carpeta y, en modo recursivo, a sus subcarpetas no ocultas"""
+        import ctypes
+        wd = self._libc.inotify_add_watch(self._fd_inotify, os.fsencode(ruta), _IN_MASCARA)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f"inotify_add_watch falló en {ruta}")
+        self._prefijos_inotify[wd] = prefijo
+        if not self.recursivo:
+            return
+        with os.scandir(ruta) as entradas:
+            for entrada in entradas:
+                if entrada.is_dir(follow_symlinks=False) and not entrada.name.startswith('.'):
+                    self._vigilar_carpeta_inotify(entrada.path, prefijo + entrada.name + '/')
+
+    def _ejecutar_inotify(self):
+        import select
+        try:
+            while not self._detener.is_set():
+                # Timeout corto solo para poder atender detener()
+                listos, _, _ = select.select([self._fd_inotify], [], [], 1.0)
+                if not listos:
+                    continue
+                try:
+                    datos = os.read(self._fd_inotify, 64 * 1024)
+                except BlockingIOError:
+                    continue
+                offset = 0
+                while offset + _IN_EVENTO.size <= len(datos):
+                    wd, mascara, _, longitud = _IN_EVENTO.unpack_from(datos, offset)
+                    inicio = offset + _IN_EVENTO.size
+                    nombre = datos[inicio:inicio + longitud].rstrip(b'\0')
+                    offset = inicio + longitud
+                    prefijo = self._prefijos_inotify.get(wd, '')
+                    if mascara & _IN_IGNORED:
+                        self._prefijos_inotify.pop(wd, None)
+                    elif mascara & (_IN_Q_OVERFLOW | _IN_DELETE_SELF | _IN_MOVE_SELF):
+                        self._notificar(None)
+                    elif mascara & _IN_ISDIR:
+                        # Carpeta creada, movida o borrada: vigilarla si es nueva y revisar todo
+                        if self.recursivo and mascara & (_IN_CREATE | _IN_MOVED_TO):
+                            nombre = os.fsdecode(nombre)
+                            if not nombre.startswith('.'):
+                                try:
+                                    self._vigilar_carpeta_inotify(
+                                        os.path.join(self.video_dir, prefijo + nombre), prefijo + nombre + '/')
+                                except OSError as e:
+                                    log(f"WARNING: No se puede vigilar la carpeta {prefijo + nombre}: {e}")
+                        if self.recursivo:
+                            self._notificar(None)
+                    elif nombre:
+                        self._notificar(prefijo + os.fsdecode(nombre))
+        except Exception as e:
+            log(f"ERROR en vigilancia inotify, se continúa por sondeo: {e}")
+            self.backend = 'sondeo'
+            self._ejecutar_sondeo()
+        finally:
+            os.close(self._fd_inotify)
+
+    # ------------------------------------------------------------------------
+    # BACKEND: READDIRECTORYCHANGESW (WINDOWS)
+    # ------------------------------------------------------------------------
+
+    def _preparar_windows(self):
+        import ctypes
+        from ctypes import wintypes
+        kernel32 = ctypes.WinDLL('kernel32', use_last_error=True)
+        kernel32.CreateFileW.restype = wintypes.HANDLE
+        kernel32.CreateFileW.argtypes = [wintypes.LPCWSTR, wintypes.DWORD, wintypes.DWORD, ctypes.c_void_p,
+                                         wintypes.DWORD, wintypes.DWORD, wintypes.HANDLE]
+        kernel32.ReadDirectoryChangesW.argtypes = [wintypes.HANDLE, ctypes.c_void_p, wintypes.DWORD, wintypes.BOOL,
+                                                   wintypes.DWORD, ctypes.POINTER(wintypes.DWORD),
+                                                   ctypes.c_void_p, ctypes.c_void_p]
+        kernel32.CancelIoEx.argtypes = [wintypes.HANDLE, ctypes.c_void_p]
+        kernel32.CloseHandle.argtypes = [wintypes.HANDLE]
+        handle = kernel32.CreateFileW(self.video_dir, _FILE_LIST_DIRECTORY, _FILE_SHARE_TODOS, None,
+                                      _OPEN_EXISTING, _FILE_FLAG_BACKUP_SEMANTICS, None)
+        if handle in (None, wintypes.HANDLE(-1).value):
+            raise ctypes.WinError(ctypes.get_last_error())
+        self._kernel32 = kernel32
+        self._handle_win = handle
+
+    def _ejecutar_windows(self):
+        import ctypes
+        from ctypes import wintypes
+        buffer = ctypes.create_string_buffer(64 * 1024)
+        leidos = wintypes.DWORD()
+        try:
+            while not self._detener.is_set():
+                # Llamada síncrona: bloquea sin consumir CPU hasta que haya cambios
+                ok = self._kernel32.ReadDirectoryChangesW(self._handle_win, buffer, len(buffer), self.recursivo,
+                                                          _WIN_FILTRO, ctypes.byref(leidos), None, None)
+                if not ok:
+                    if self._detener.is_set():
+                        break
+                    raise ctypes.WinError(ctypes.get_last_error())
+                if leidos.value == 0:
+                    # Desbordamiento del buffer: se perdieron eventos
+                    self._notificar(None)
+                    continue
+                offset = 0
+                while True:
+                    siguiente, _, longitud = _FILE_NOTIFY_INFORMATION.unpack_from(buffer, offset)
+                    inicio = offset + _FILE_NOTIFY_INFORMATION.size
+                    self._notificar(buffer.raw[inicio:inicio + longitud].decode('utf-16-le'))
+                    if siguiente == 0:
+                        break
+                    offset += siguiente
+        except Exception as e:
+            log(f"ERROR en vigilancia ReadDirectoryChangesW, se continúa por sondeo: {e}")
+            self.backend = 'sondeo'
+            self._ejecutar_sondeo()
+        finally:
+            self._kernel32.CloseHandle(self._handle_win)
+            self._handle_win = None
+
+    # ------------------------------------------------------------------------
+    # BACKEND: WATCHDOG (OPCIONAL)
+    # ------------------------------------------------------------------------
+
+    def _cambio_de_tamano(self, ruta):
+        """
+        True si el tamaño del archivo cambió desde el último evento. watchdog reporta 'modified'
+        también por un cambio de mtime o de atributos (los 'toques' de estimular_onedrive()), que
+        inotify y ReadDirectoryChangesW ya excluyen.
+        """
+        try:
+            tamano = os.stat(ruta).st_size
+        except OSError:
+            tamano = None
+        with self._lock:
+            anterior = self._tamanos.get(ruta)
+            self._tamanos[ruta] = tamano
+        return anterior != tamano
+
+    def _preparar_watchdog(self):
+        from watchdog.observers import Observer
+        from watchdog.events import FileSystemEventHandler
+        from file_utils import iterar_archivos
+
+        vigilante = self
+        # Tamaños de partida: el primer toque de un archivo ya existente tampoco es un cambio
+        for entrada in iterar_archivos(self.video_dir, recursivo=self.recursivo):
+            self._cambio_de_tamano(entrada.path)
+
+        class _Manejador(FileSystemEventHandler):
+            def on_any_event(self, event):
+                if event.event_type not in ('created', 'deleted', 'moved', 'modified', 'closed'):
+                    return
+                if event.is_directory and event.event_type == 'modified':
+                    # Cualquier escritura dentro de la carpeta (incluido el log) la "modifica"
+                    return
+                rutas = [os.fsdecode(r) for r in (event.src_path, getattr(event, 'dest_path', '')) if r]
+                if event.event_type == 'modified' and not vigilante._cambio_de_tamano(rutas[0]):
+                    return
+                for ruta in rutas:
+                    if event.event_type != 'modified':
+                        vigilante._cambio_de_tamano(ruta)
+                    vigilante._notificar(os.path.relpath(ruta, vigilante.video_dir))
+
+        self._observer = Observer()
+        self._observer.schedule(_Manejador(), self.video_dir, recursive=self.recursivo)
+        self._observer.daemon = True
+        self._observer.start()
+
+    # ------------------------------------------------------------------------
+    # BACKEND: SONDEO (RESPALDO)
+    # ------------------------------------------------------------------------
+
+    def _preparar_sondeo(self):
+        pass
+
+    def _ejecutar_sondeo(self):
+        # Import local para evitar dependencia circular en el arranque
+        from file_utils import validar_dir, calcular_hash
+        # Stats propios del sondeo (otro hilo): no reemplazan los del escaneo que usa el staging
+        stats_sondeo = {}
+
+        def _hash_actual():
+            try:
+                return calcular_hash(validar_dir(self.video_dir, stats_sondeo), self.video_dir)
+            except OSError as e:
+                log(f"WARNING: Sondeo de {self.video_dir} falló: {e}")
+                return None
+
+        anterior = _hash_actual()
+        while not self._detener.wait(self.intervalo_sondeo):
+            actual = _hash_actual()
+            if actual != anterior:
+                anterior = actual
+                self._notificar(None)